@@ -1,15 +1,36 @@
 import os
+from html import escape
 from fastapi import FastAPI, Depends, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from starlette.middleware.sessions import SessionMiddleware
 from api.config import settings
+from common.api_client import ApiClient
+import asyncio
+import logging
 import secrets
-import httpx
+import time
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+
+API_BASE_URL = os.getenv("API_BASE_URL", "http://api:8000")
+# Строк на одной странице таблицы и строк в одном запросе к API (столько держим в памяти)
+PAGE_ROWS = int(os.getenv("ADMIN_PAGE_ROWS", 2000))
+API_CHUNK = int(os.getenv("ADMIN_API_CHUNK", 500))
+# Сколько секунд главная и аналитика показывают данные из кэша, не обращаясь к API
+DASHBOARD_TTL = float(os.getenv("ADMIN_DASHBOARD_TTL", 10))
 
 app = FastAPI(title="Loyalty Admin Panel", docs_url=None, redoc_url=None)
 app.add_middleware(SessionMiddleware, secret_key=settings.SECRET_KEY)
 
+# Один клиент API на процесс с keep-alive пулом соединений
+api = ApiClient(API_BASE_URL)
+
+@app.on_event("shutdown")
+async def close_api_client():
+    await api.close()
+
 security = HTTPBasic()
 
 def verify_login(credentials: HTTPBasicCredentials):
@@ -23,6 +44,12 @@ def check_auth(request: Request):
         return RedirectResponse("/", status_code=302)
     return None
 
+def next_page_link(path, cursor):
+    """Ссылка на следующую страницу списка (курсор из next_cursor API)"""
+    if not cursor:
+        return ""
+    return f'<p><a href="{path}?cursor={quote(cursor)}">Следующая страница →</a></p>'
+
 @app.get("/", response_class=HTMLResponse)
 def login_form():
     return """
@@ -71,8 +98,7 @@ async def login(request: Request, username: str = Form(...), password: str = For
     </html>
     """)
 
-def get_base_html(title, content):
-    return f"""
+PAGE_HEAD = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -109,44 +135,188 @@ def get_base_html(title, content):
             <a href="/logout">Выйти</a>
         </div>
         <div class="content">
-            {content}
+"""
+
+PAGE_TAIL = """
         </div>
     </body>
     </html>
+"""
+
+def get_base_html(title, content):
+    return PAGE_HEAD.format(title=title) + content + PAGE_TAIL
+
+class Table:
+    """Таблица админки с шаблоном строки, собранным один раз при импорте.
+
+    columns - [(заголовок, функция: элемент API -> значение ячейки)]; значения
+    экранируются, поэтому текст отзывов и имена клиентов не ломают разметку.
+    """
+
+    def __init__(self, page_title, title, columns):
+        self.getters = [getter for _, getter in columns]
+        self.title = title
+        self.header = "<tr>" + "".join(f"<th>{header}</th>" for header, _ in columns) + "</tr>\n"
+        self.head = PAGE_HEAD.format(title=page_title) + f'<div class="card"><h3>{title}</h3><table>' + self.header
+        self.row = "<tr>" + "".join(f"<td>{{{i}}}</td>" for i in range(len(columns))) + "</tr>\n"
+        self.tail = "</table>"
+
+    def render(self, items):
+        row = self.row
+        return "".join(
+            row.format(*[escape(str(value)) for value in (get(item) for get in self.getters)]) for item in items
+        )
+
+    def card(self, items, title=None):
+        """Таблица целиком (без страницы) - для блоков главной"""
+        return (f'<div class="card"><h3>{title or self.title}</h3><table>' + self.header
+                + self.render(items) + self.tail + "</div>")
+
+def shorten(text, length):
+    text = text or ""
+    return text[:length] + ("..." if len(text) > length else "")
+
+async def stream_table(table, fetch, path, cursor=None):
+    """HTML-страница таблицы, отдаваемая по мере загрузки.
+
+    Строки запрашиваются у API пачками по API_CHUNK по курсору и сразу уходят клиенту,
+    в памяти не больше одной пачки. После PAGE_ROWS строк - ссылка на следующую страницу.
+    """
+    yield table.head
+    shown = 0
+    while True:
+        page, status = await fetch(cursor=cursor, limit=min(API_CHUNK, PAGE_ROWS - shown))
+        if page is None:
+            yield f'<tr><td colspan="{len(table.getters)}">Ошибка API: {status}</td></tr>'
+            cursor = None
+            break
+        yield table.render(page["items"])
+        shown += len(page["items"])
+        cursor = page.get("next_cursor")
+        if not cursor or shown >= PAGE_ROWS:
+            break
+    yield table.tail + next_page_link(path, cursor) + "</div>" + PAGE_TAIL
+
+USERS_TABLE = Table("Пользователи", "Пользователи системы", [
+    ("ID", lambda u: u["id"]),
+    ("Имя", lambda u: f"{u.get('first_name') or ''} {u.get('last_name') or ''}"),
+    ("Телефон", lambda u: u.get("phone") or ""),
+    ("Уровень", lambda u: u["loyalty_status"]),
+    ("Баллы", lambda u: u["points"]),
+    ("Напитков", lambda u: u["drinks_count"]),
+    ("Сэндвичей", lambda u: u["sandwiches_count"]),
+    ("Статус", lambda u: "Активен" if u.get("is_active") else "Неактивен"),
+])
+
+ORDERS_TABLE = Table("Заказы", "Заказы", [
+    ("ID", lambda o: o["id"]),
+    ("Пользователь", lambda o: f"ID: {o['user_id']}"),
+    ("Чек", lambda o: o["receipt_number"]),
+    ("Сумма", lambda o: o["total_sum"]),
+    ("Напитков", lambda o: o["drinks_count"]),
+    ("Сэндвичей", lambda o: o["sandwiches_count"]),
+    ("Списано баллов", lambda o: o["used_points_amount"] if o.get("use_points") else 0),
+    ("Дата", lambda o: o["date_created"]),
+])
+
+GIFTS_TABLE = Table("Подарки", "Подарки", [
+    ("ID", lambda g: g["id"]),
+    ("Пользователь", lambda g: f"ID: {g['user_id']}"),
+    ("Тип", lambda g: g["type"]),
+    ("Количество", lambda g: g["amount"]),
+    ("Статус", lambda g: "Списан" if g.get("is_written_off") else "Активен"),
+    ("Дата", lambda g: g["date_created"]),
+])
+
+FEEDBACKS_TABLE = Table("Отзывы", "Отзывы клиентов", [
+    ("ID", lambda f: f["id"]),
+    ("Пользователь", lambda f: f"ID: {f['user_id']}"),
+    ("Оценка", lambda f: f"{f['score']}/10"),
+    ("Текст", lambda f: shorten(f.get("text"), 100)),
+    ("Дата", lambda f: f["created_at"]),
+])
+
+IDEAS_TABLE = Table("Идеи", "Идеи от клиентов", [
+    ("ID", lambda i: i["id"]),
+    ("Пользователь", lambda i: f"ID: {i['user_id']}"),
+    ("Идея", lambda i: shorten(i.get("text"), 200)),
+    ("Дата", lambda i: i["created_at"]),
+])
+
+def table_response(request: Request, table, fetch, path, cursor):
+    auth_check = check_auth(request)
+    if auth_check:
+        return auth_check
+    return StreamingResponse(stream_table(table, fetch, path, cursor), media_type="text/html; charset=utf-8")
+
+@app.get("/users")
+async def users(request: Request, cursor: str = None):
+    return table_response(request, USERS_TABLE, api.list_users, "/users", cursor)
+
+@app.get("/orders")
+async def orders(request: Request, cursor: str = None):
+    return table_response(request, ORDERS_TABLE, api.list_orders, "/orders", cursor)
+
+@app.get("/gifts")
+async def gifts(request: Request, cursor: str = None):
+    return table_response(request, GIFTS_TABLE, api.list_gifts, "/gifts", cursor)
+
+@app.get("/feedbacks")
+async def feedbacks(request: Request, cursor: str = None):
+    return table_response(request, FEEDBACKS_TABLE, api.list_feedbacks, "/feedbacks", cursor)
+
+@app.get("/ideas")
+async def ideas(request: Request, cursor: str = None):
+    return table_response(request, IDEAS_TABLE, api.list_ideas, "/ideas", cursor)
+
+_dashboard_cache = {"data": None, "expires": 0.0}
+_dashboard_lock = asyncio.Lock()
+
+async def dashboard_data():
+    """(данные /analytics/dashboard, статус), не чаще раза в DASHBOARD_TTL секунд.
+
+    Одновременные загрузки страниц ждут один запрос к API, а не делают каждая свой.
+    Ошибка API не кэшируется: (None, статус), следующая загрузка страницы спросит снова.
     """
+    async with _dashboard_lock:
+        if _dashboard_cache["data"] is None or time.monotonic() >= _dashboard_cache["expires"]:
+            data, status = await api.analytics_dashboard()
+            if data is None:
+                logger.error(f"Не удалось получить данные главной из API: {status}")
+                return None, status
+            _dashboard_cache.update(data=data, expires=time.monotonic() + DASHBOARD_TTL)
+        return _dashboard_cache["data"], 200
+
+def unavailable_html(status):
+    """Вместо нулей в карточках - явное сообщение, что данных нет"""
+    return (f'<div class="card"><h3>Данные недоступны</h3>'
+            f'<p>Ошибка API: {status}. Обновите страницу позже.</p></div>')
+
+def stats_html(summary):
+    cards = [
+        ("total_orders", "Всего заказов"),
+        ("total_gifts", "Подарков выдано"),
+        ("total_drinks", "Напитков продано"),
+        ("total_sandwiches", "Сэндвичей продано"),
+    ]
+    return '<div class="stats">' + "".join(
+        f'<div class="stat-card"><div class="stat-number">{summary.get(key, 0)}</div><div>{label}</div></div>'
+        for key, label in cards
+    ) + "</div>"
+
+LEVELS_TABLE = Table("Аналитика", "Клиенты по уровням", [
+    ("Уровень", lambda item: item[0]),
+    ("Клиентов", lambda item: item[1]),
+])
 
 @app.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(request: Request):
     auth_check = check_auth(request)
     if auth_check:
         return auth_check
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            analytics = await client.get("http://api:8000/analytics/summary")
-            stats = analytics.json() if analytics.status_code == 200 else {}
-        except:
-            stats = {}
-    
-    stats_html = f"""
-    <div class="stats">
-        <div class="stat-card">
-            <div class="stat-number">{stats.get('total_orders', 0)}</div>
-            <div>Всего заказов</div>
-        </div>
-        <div class="stat-card">
-            <div class="stat-number">{stats.get('total_gifts', 0)}</div>
-            <div>Подарков выдано</div>
-        </div>
-        <div class="stat-card">
-            <div class="stat-number">{stats.get('total_drinks', 0)}</div>
-            <div>Напитков продано</div>
-        </div>
-        <div class="stat-card">
-            <div class="stat-number">{stats.get('total_sandwiches', 0)}</div>
-            <div>Сэндвичей продано</div>
-        </div>
-    </div>
+
+    data, status = await dashboard_data()
+    content = (stats_html(data.get("summary", {})) if data is not None else unavailable_html(status)) + """
     <div class="card">
         <h3>Добро пожаловать в админ-панель!</h3>
         <p>Здесь вы можете управлять системой лояльности:</p>
@@ -160,204 +330,23 @@ async def dashboard(request: Request):
         </ul>
     </div>
     """
-    
-    return get_base_html("Главная", stats_html)
-
-@app.get("/users", response_class=HTMLResponse)
-async def users(request: Request):
-    auth_check = check_auth(request)
-    if auth_check:
-        return auth_check
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            r = await client.get("http://api:8000/users/")
-            users_data = r.json() if r.status_code == 200 else []
-        except:
-            users_data = []
-    
-    users_table = """
-    <div class="card">
-        <h3>Пользователи системы</h3>
-        <table>
-            <tr>
-                <th>ID</th>
-                <th>Имя</th>
-                <th>Телефон</th>
-                <th>Уровень</th>
-                <th>Баллы</th>
-                <th>Напитков</th>
-                <th>Сэндвичей</th>
-                <th>Статус</th>
-            </tr>
-    """
-    
-    for user in users_data:
-        status = "Активен" if user.get('is_active') else "Неактивен"
-        users_table += f"""
-            <tr>
-                <td>{user.get('id', '')}</td>
-                <td>{user.get('first_name', '')} {user.get('last_name', '')}</td>
-                <td>{user.get('phone', '')}</td>
-                <td>{user.get('loyalty_status', '')}</td>
-                <td>{user.get('points', 0)}</td>
-                <td>{user.get('drinks_count', 0)}</td>
-                <td>{user.get('sandwiches_count', 0)}</td>
-                <td>{status}</td>
-            </tr>
-        """
-    
-    users_table += "</table></div>"
-    return get_base_html("Пользователи", users_table)
-
-@app.get("/orders", response_class=HTMLResponse)
-async def orders(request: Request):
-    auth_check = check_auth(request)
-    if auth_check:
-        return auth_check
-    
-    # Здесь нужно было бы добавить API endpoint для получения всех заказов
-    # Пока показываем заглушку
-    content = """
-    <div class="card">
-        <h3>Заказы</h3>
-        <p>Для отображения заказов необходимо добавить соответствующий API endpoint.</p>
-        <p>Пример: GET /api/orders/ - получить все заказы</p>
-    </div>
-    """
-    return get_base_html("Заказы", content)
-
-@app.get("/gifts", response_class=HTMLResponse)
-async def gifts(request: Request):
-    auth_check = check_auth(request)
-    if auth_check:
-        return auth_check
-    
-    content = """
-    <div class="card">
-        <h3>Подарки</h3>
-        <p>Для отображения подарков необходимо добавить соответствующий API endpoint.</p>
-        <p>Пример: GET /api/gifts/ - получить все подарки</p>
-    </div>
-    """
-    return get_base_html("Подарки", content)
-
-@app.get("/feedbacks", response_class=HTMLResponse)
-async def feedbacks(request: Request):
-    auth_check = check_auth(request)
-    if auth_check:
-        return auth_check
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            r = await client.get("http://api:8000/feedback/")
-            feedbacks_data = r.json() if r.status_code == 200 else []
-        except:
-            feedbacks_data = []
-    
-    feedback_table = """
-    <div class="card">
-        <h3>Отзывы клиентов</h3>
-        <table>
-            <tr>
-                <th>ID</th>
-                <th>Пользователь</th>
-                <th>Оценка</th>
-                <th>Текст</th>
-                <th>Дата</th>
-            </tr>
-    """
-    
-    for feedback in feedbacks_data:
-        feedback_table += f"""
-            <tr>
-                <td>{feedback.get('id', '')}</td>
-                <td>ID: {feedback.get('user_id', '')}</td>
-                <td>{feedback.get('score', '')}/10</td>
-                <td>{feedback.get('text', '')[:100]}{'...' if len(str(feedback.get('text', ''))) > 100 else ''}</td>
-                <td>{feedback.get('created_at', '')}</td>
-            </tr>
-        """
-    
-    feedback_table += "</table></div>"
-    return get_base_html("Отзывы", feedback_table)
-
-@app.get("/ideas", response_class=HTMLResponse)
-async def ideas(request: Request):
-    auth_check = check_auth(request)
-    if auth_check:
-        return auth_check
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            r = await client.get("http://api:8000/feedback/ideas")
-            ideas_data = r.json() if r.status_code == 200 else []
-        except:
-            ideas_data = []
-    
-    ideas_table = """
-    <div class="card">
-        <h3>Идеи от клиентов</h3>
-        <table>
-            <tr>
-                <th>ID</th>
-                <th>Пользователь</th>
-                <th>Идея</th>
-                <th>Дата</th>
-            </tr>
-    """
-    
-    for idea in ideas_data:
-        ideas_table += f"""
-            <tr>
-                <td>{idea.get('id', '')}</td>
-                <td>ID: {idea.get('user_id', '')}</td>
-                <td>{idea.get('text', '')[:200]}{'...' if len(str(idea.get('text', ''))) > 200 else ''}</td>
-                <td>{idea.get('created_at', '')}</td>
-            </tr>
-        """
-    
-    ideas_table += "</table></div>"
-    return get_base_html("Идеи", ideas_table)
+    if data is not None:
+        content += ORDERS_TABLE.card(data.get("recent_orders", []), "Последние заказы")
+        content += FEEDBACKS_TABLE.card(data.get("recent_feedbacks", []), "Последние отзывы")
+    return get_base_html("Главная", content)
 
 @app.get("/analytics", response_class=HTMLResponse)
 async def analytics(request: Request):
     auth_check = check_auth(request)
     if auth_check:
         return auth_check
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            r = await client.get("http://api:8000/analytics/summary")
-            analytics_data = r.json() if r.status_code == 200 else {}
-        except:
-            analytics_data = {}
-    
-    analytics_content = f"""
-    <div class="card">
-        <h3>Аналитика системы</h3>
-        <div class="stats">
-            <div class="stat-card">
-                <div class="stat-number">{analytics_data.get('total_orders', 0)}</div>
-                <div>Всего заказов</div>
-            </div>
-            <div class="stat-card">
-                <div class="stat-number">{analytics_data.get('total_gifts', 0)}</div>
-                <div>Подарков выдано</div>
-            </div>
-            <div class="stat-card">
-                <div class="stat-number">{analytics_data.get('total_drinks', 0)}</div>
-                <div>Напитков продано</div>
-            </div>
-            <div class="stat-card">
-                <div class="stat-number">{analytics_data.get('total_sandwiches', 0)}</div>
-                <div>Сэндвичей продано</div>
-            </div>
-        </div>
-    </div>
-    """
-    
-    return get_base_html("Аналитика", analytics_content)
+
+    data, status = await dashboard_data()
+    if data is None:
+        return get_base_html("Аналитика", unavailable_html(status))
+    content = ('<div class="card"><h3>Аналитика системы</h3>' + stats_html(data.get("summary", {})) + "</div>"
+               + LEVELS_TABLE.card(data.get("loyalty_levels", {}).items()))
+    return get_base_html("Аналитика", content)
 
 @app.get("/logout")
 def logout(request: Request):
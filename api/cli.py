@@ -0,0 +1,105 @@
+"""Служебные команды API.
+
+Запуск: python -m api.cli <команда>, например `python -m api.cli reap-codes`.
+"""
+import argparse
+import asyncio
+from datetime import date, datetime, timezone
+
+from api.deps import AsyncSessionLocal, engine
+from common import crud
+
+
+async def reap_codes(args):
+    async with AsyncSessionLocal() as session:
+        reaped, _ = await crud.reap_codes(session, batch_size=args.batch_size)
+    print(f"Удалено кодов: {reaped}")
+
+
+async def reconcile_analytics(args):
+    async with AsyncSessionLocal() as session:
+        before = await crud.get_analytics_summary(session)
+        after = await crud.rebuild_analytics_counters(session)
+    for name, value in after.items():
+        drift = value - before[name]
+        print(f"{name}: {value}" + (f" (расхождение {drift:+d})" if drift else ""))
+
+
+async def backfill_rollups(args):
+    since = datetime.strptime(args.since, "%Y-%m-%d").replace(tzinfo=timezone.utc) if args.since else None
+    async with AsyncSessionLocal() as session:
+        rows = await crud.backfill_rollups(session, since)
+    print(f"Записано строк срезов: {rows}")
+
+
+async def recompute_levels(args):
+    async with AsyncSessionLocal() as session:
+        moves = await crud.recompute_loyalty_levels(session, chunk_size=args.chunk_size)
+    for (old, new), count in sorted(moves.items(), key=lambda item: -item[1]):
+        print(f"{old.value} -> {new.value}: {count}")
+    print(f"Уровень сменили: {sum(moves.values())}")
+
+
+async def birthday_gifts(args):
+    today = datetime.strptime(args.date, "%Y-%m-%d").date() if args.date else date.today()
+    async with AsyncSessionLocal() as session:
+        given = await crud.give_birthday_gifts(session, today)
+    print(f"Выдано подарков на ДР: {given}")
+
+
+async def broadcast(args):
+    from api.tasks import create_broadcast_dispatcher
+    dispatcher = create_broadcast_dispatcher()
+    try:
+        while True:
+            delivery = await dispatcher.run_next(args.notification_id)
+            if delivery is None:
+                break
+            print(f"Рассылка {delivery.notification_id}: отправлено {delivery.sent}, "
+                  f"заблокировали бота {delivery.blocked}, ошибок {delivery.failed}")
+            if args.notification_id is not None:
+                break
+    finally:
+        await dispatcher.sender.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cmd = commands.add_parser("reap-codes", help="удалить истекшие коды без заказов")
+    cmd.add_argument("--batch-size", type=int, default=1000)
+    cmd.set_defaults(handler=reap_codes)
+
+    cmd = commands.add_parser("reconcile-analytics", help="пересчитать счетчики /analytics/summary по заказам и подаркам")
+    cmd.set_defaults(handler=reconcile_analytics)
+
+    cmd = commands.add_parser("backfill-rollups", help="пересчитать почасовые и дневные срезы по истории заказов")
+    cmd.add_argument("--since", help="дата YYYY-MM-DD, по умолчанию - вся история")
+    cmd.set_defaults(handler=backfill_rollups)
+
+    cmd = commands.add_parser("recompute-levels", help="пересчитать уровни лояльности всех клиентов по LOYALTY_LEVELS")
+    cmd.add_argument("--chunk-size", type=int, default=50000, help="пользователей на запрос, 0 - одним запросом")
+    cmd.set_defaults(handler=recompute_levels)
+
+    cmd = commands.add_parser("birthday-gifts", help="выдать подарки именинникам дня (повторный запуск ничего не выдает)")
+    cmd.add_argument("--date", help="дата YYYY-MM-DD, по умолчанию - сегодня")
+    cmd.set_defaults(handler=birthday_gifts)
+
+    cmd = commands.add_parser("broadcast", help="отправить ожидающие (или зависшие) рассылки уведомлений")
+    cmd.add_argument("--notification-id", type=int, default=None)
+    cmd.set_defaults(handler=broadcast)
+
+    args = parser.parse_args()
+
+    async def run():
+        try:
+            await args.handler(args)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,39 @@ class Settings:
         f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
     )
 
+    # Индекс живых кодов для погашения: пусто - выключен, memory:// - в процессе
+    # (только при одном процессе API), redis://... - общий для всех процессов
+    CODE_INDEX_URL: str = os.getenv("CODE_INDEX_URL", "")
+    # Фоновая очистка истекших кодов: период в секундах (0 - выключена) и размер пачки
+    CODE_REAPER_INTERVAL: int = int(os.getenv("CODE_REAPER_INTERVAL", 3600))
+    CODE_REAPER_BATCH: int = int(os.getenv("CODE_REAPER_BATCH", 1000))
+
+    # Кэш профилей для GET /users/{telegram_id}: профилей в памяти процесса (0 - выключен),
+    # сколько секунд живет профиль в общем уровне и в памяти процесса и общий уровень
+    # (redis://...). Кэш включается явно, PROFILE_CACHE_SIZE > 0. Без общего уровня сбросы не
+    # видны другим процессам: тогда кэш работает, только если WEB_CONCURRENCY = 1, и включать
+    # его можно, лишь когда API действительно запущен одним процессом (без uvicorn --workers N,
+    # gunicorn -w N), иначе воркеры до PROFILE_CACHE_TTL отдают старые баллы и уровни
+    PROFILE_CACHE_SIZE: int = int(os.getenv("PROFILE_CACHE_SIZE", 0))
+    PROFILE_CACHE_TTL: float = float(os.getenv("PROFILE_CACHE_TTL", 30))
+    PROFILE_CACHE_LOCAL_TTL: float = float(os.getenv("PROFILE_CACHE_LOCAL_TTL", 5))
+    PROFILE_CACHE_URL: str = os.getenv("PROFILE_CACHE_URL", "")
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", 1))
+
+    # Рассылка уведомлений всем клиентам от имени клиентского бота: период проверки
+    # очереди в секундах (0 - выключена), общий лимит сообщений в секунду и лимит на чат
+    TELEGRAM_TOKEN_CLIENT: str = os.getenv("TELEGRAM_TOKEN_CLIENT", "")
+    TELEGRAM_API_URL: str = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+    BROADCAST_INTERVAL: int = int(os.getenv("BROADCAST_INTERVAL", 30))
+    BROADCAST_RATE: float = float(os.getenv("BROADCAST_RATE", 25))
+    BROADCAST_CHAT_RATE: float = float(os.getenv("BROADCAST_CHAT_RATE", 1))
+
+    # Ежедневная выдача подарков на ДР: час запуска по локальному времени (-1 - выключена)
+    BIRTHDAY_GIFTS_HOUR: int = int(os.getenv("BIRTHDAY_GIFTS_HOUR", 0))
+
+    # Лимиты slowapi на роутах (false - выключены, например для нагрузочного теста с одного адреса)
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() != "false"
+
     SECRET_KEY: str = os.getenv("SECRET_KEY", "supersecretkey")
     ADMIN_LOGIN: str = os.getenv("ADMIN_LOGIN", "admin")
     ADMIN_PASSWORD: str = os.getenv("ADMIN_PASSWORD", "admin123")
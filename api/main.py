@@ -1,15 +1,23 @@
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
 from api.config import settings
+from api.deps import AsyncSessionLocal
+from api.metrics import MetricsMiddleware, router as metrics_router
+from api.tasks import start_background_tasks, stop_background_tasks
+from common import crud
+from common.kv import create_kv
+from common.pagination import InvalidCursor
+from common.profile_cache import ProfileCache
 
-from api.routes import users, orders, codes, feedback, gifts, analytics, notifications
+from api.routes import users, orders, codes, feedback, gifts, analytics, notifications, export
 
 # Создаем limiter для rate limiting
-limiter = Limiter(key_func=get_remote_address)
+limiter = Limiter(key_func=get_remote_address, enabled=settings.RATE_LIMIT_ENABLED)
 
 app = FastAPI(
     title="Loyalty System API",
@@ -23,6 +31,10 @@ app = FastAPI(
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return JSONResponse(status_code=400, content={"detail": "Некорректный курсор страницы"})
+
 # CORS настройки в зависимости от окружения
 cors_origins = ["*"] if settings.DEBUG else [
     "http://localhost:3000",
@@ -37,6 +49,8 @@ app.add_middleware(
     allow_methods=["GET", "POST", "PUT", "DELETE"],
     allow_headers=["*"],
 )
+# Снаружи остальных middleware: в задержку входит вся обработка запроса
+app.add_middleware(MetricsMiddleware)
 
 # Роуты
 app.include_router(users.router, prefix="/users", tags=["users"])
@@ -46,3 +60,24 @@ app.include_router(feedback.router, prefix="/feedback", tags=["feedback"])
 app.include_router(gifts.router, prefix="/gifts", tags=["gifts"])
 app.include_router(analytics.router, prefix="/analytics", tags=["analytics"])
 app.include_router(notifications.router, prefix="/notifications", tags=["notifications"])
+app.include_router(export.router, prefix="/export", tags=["export"])
+app.include_router(metrics_router)
+
+@app.on_event("startup")
+async def startup():
+    kv = create_kv(settings.CODE_INDEX_URL)
+    if kv is not None:
+        async with AsyncSessionLocal() as session:
+            await crud.set_active_code_index(session, kv)
+    # Сбросы профилей между процессами идут только через общий KV (не memory://)
+    shared = settings.PROFILE_CACHE_URL and not settings.PROFILE_CACHE_URL.startswith("memory://")
+    if settings.PROFILE_CACHE_SIZE > 0 and (shared or settings.WEB_CONCURRENCY == 1):
+        crud.set_profile_cache(ProfileCache(
+            settings.PROFILE_CACHE_SIZE, settings.PROFILE_CACHE_TTL, kv=create_kv(settings.PROFILE_CACHE_URL),
+            local_ttl=settings.PROFILE_CACHE_LOCAL_TTL,
+        ))
+    start_background_tasks()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await stop_background_tasks()
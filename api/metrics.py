@@ -0,0 +1,80 @@
+"""Метрики API: запросы по роутам, задержки, запросы в работе, пул БД и кэш профилей.
+
+Роут в метках - шаблон пути (/users/{telegram_id}), а не сам путь, иначе число рядов
+росло бы с числом пользователей. Запросы мимо роутов считаются под UNMATCHED.
+"""
+import time
+
+from fastapi import APIRouter, Response
+
+from api.deps import engine
+from common import crud
+from common.metrics import CONTENT_TYPE, REGISTRY, counter, gauge, histogram
+
+UNMATCHED = "<unmatched>"
+
+REQUESTS = counter("http_requests_total", "Запросы к API", ("method", "route", "status"))
+LATENCY = histogram("http_request_duration_seconds", "Время обработки запроса, с", ("method", "route"))
+IN_FLIGHT = gauge("http_requests_in_flight", "Запросы в работе")
+
+
+def _pool(attribute):
+    return lambda: getattr(engine.pool, attribute)()
+
+
+def _profile_cache(key):
+    return lambda: crud.profile_cache.stats()[key] if crud.profile_cache is not None else None
+
+
+gauge("db_pool_size", "Соединений в пуле БД", function=_pool("size"))
+gauge("db_pool_checked_out", "Соединений БД выдано", function=_pool("checkedout"))
+# overflow() у QueuePool - выдано сверх size, отрицательное, пока пул не исчерпан
+gauge("db_pool_overflow", "Соединений БД сверх размера пула", function=lambda: max(0, engine.pool.overflow()))
+gauge("profile_cache_size", "Профилей в локальном кэше", function=_profile_cache("size"))
+gauge("profile_cache_hit_ratio", "Доля попаданий в кэш профилей", function=_profile_cache("hit_ratio"))
+# Кэш сам ведет накопленные итоги - отдаем их счетчиками, чтобы в Prometheus работал rate()
+counter("profile_cache_hits_total", "Попаданий в локальный кэш профилей", function=_profile_cache("hits"))
+counter("profile_cache_kv_hits_total", "Попаданий в общий уровень кэша профилей", function=_profile_cache("kv_hits"))
+counter("profile_cache_misses_total", "Промахов кэша профилей", function=_profile_cache("misses"))
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: счетчик и гистограмма по (метод, шаблон роута), запросы в работе.
+
+    Шаблон берется из scope["route"], который роутер FastAPI записывает в тот же scope.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500  # если приложение упало, не начав ответ
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.dec()
+            route = scope.get("route")
+            path = route.path if route is not None else UNMATCHED
+            LATENCY.observe(elapsed, scope["method"], path)
+            REQUESTS.inc(scope["method"], path, str(status))
+
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
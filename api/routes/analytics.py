@@ -1,20 +1,76 @@
-from fastapi import APIRouter, Depends
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import func, select
-from api.deps import get_session
-from common.models import Order, Gift
+from api.deps import AsyncSessionLocal, get_session
+from common import crud
+from common.schemas import (
+    AnalyticsSummaryOut, DashboardOut, FeedbackOut, OrderOut, TimeseriesOut, TimeseriesPoint
+)
 
 router = APIRouter()
 
-@router.get("/summary")
+STEPS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+DEFAULT_RANGE = {"hour": timedelta(days=7), "day": timedelta(days=365)}
+MAX_POINTS = 3000
+
+def _summary_out(totals):
+    return AnalyticsSummaryOut(
+        total_orders=totals["orders"],
+        total_gifts=totals["gifts"],
+        total_drinks=totals["drinks"],
+        total_sandwiches=totals["sandwiches"],
+    )
+
+async def _in_session(query, *args):
+    async with AsyncSessionLocal() as session:
+        return await query(session, *args)
+
+@router.get("/summary", response_model=AnalyticsSummaryOut)
 async def analytics_summary(session: AsyncSession = Depends(get_session)):
-    total_orders = (await session.execute(select(func.count(Order.id)))).scalar()
-    total_gifts = (await session.execute(select(func.count(Gift.id)))).scalar()
-    total_drinks = (await session.execute(select(func.sum(Order.drinks_count)))).scalar()
-    total_sandwiches = (await session.execute(select(func.sum(Order.sandwiches_count)))).scalar()
-    return {
-        "total_orders": total_orders,
-        "total_gifts": total_gifts,
-        "total_drinks": total_drinks or 0,
-        "total_sandwiches": total_sandwiches or 0,
-    }
+    # Счетчики ведутся в транзакциях заказов и подарков (crud.bump_analytics)
+    return _summary_out(await crud.get_analytics_summary(session))
+
+@router.get("/dashboard", response_model=DashboardOut)
+async def analytics_dashboard(limit: int = Query(10, ge=1, le=100)):
+    """Данные главной админки одним ответом: итоги, уровни клиентов, последние заказы и отзывы.
+
+    Запросы выполняются параллельно, каждый в своей сессии (одна сессия не выполняет
+    запросы одновременно).
+    """
+    totals, levels, orders, (feedbacks, _) = await asyncio.gather(
+        _in_session(crud.get_analytics_summary),
+        _in_session(crud.get_loyalty_distribution),
+        _in_session(crud.get_recent_orders, limit),
+        _in_session(crud.get_feedbacks, limit),
+    )
+    return DashboardOut(
+        summary=_summary_out(totals),
+        loyalty_levels=levels,
+        recent_orders=[OrderOut.model_validate(order) for order in orders],
+        recent_feedbacks=[FeedbackOut.model_validate(feedback) for feedback in feedbacks],
+    )
+
+@router.get("/timeseries", response_model=TimeseriesOut)
+async def analytics_timeseries(
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    session: AsyncSession = Depends(get_session),
+):
+    """Заказы, выручка, напитки, сэндвичи, баллы и подарки по часам или дням за [start, end).
+
+    По умолчанию - последние 7 дней по часам или 365 дней по дням. Время без часового
+    пояса считается UTC. Данные - из analytics_rollups (crud.bump_analytics).
+    """
+    end = end or datetime.now(timezone.utc)
+    start = start or end - DEFAULT_RANGE[granularity]
+    start, end = (t if t.tzinfo else t.replace(tzinfo=timezone.utc) for t in (start, end))
+    if start >= end:
+        raise HTTPException(400, "Начало диапазона должно быть раньше конца")
+    if (end - start) / STEPS[granularity] > MAX_POINTS:
+        raise HTTPException(400, f"Слишком большой диапазон: не больше {MAX_POINTS} точек")
+    points = await crud.get_analytics_timeseries(session, granularity, start, end)
+    return TimeseriesOut(granularity=granularity, start=start, end=end,
+                         points=[TimeseriesPoint(**point) for point in points])
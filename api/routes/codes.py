@@ -9,6 +9,8 @@ router = APIRouter()
 @router.post("/generate", response_model=CodeOut)
 async def generate_code(user_id: int, session: AsyncSession = Depends(get_session)):
     code = await crud.generate_code(session, user_id)
+    if not code:
+        raise HTTPException(503, "Нет свободных кодов, попробуйте через минуту")
     return CodeOut.model_validate(code)
 
 @router.post("/use", response_model=CodeOut)
@@ -0,0 +1,67 @@
+import csv
+import enum
+import io
+import json
+from datetime import date, datetime, timezone
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from api.deps import AsyncSessionLocal
+from common import crud
+
+router = APIRouter()
+
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "jsonl": "application/x-ndjson"}
+
+def _plain(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+def _csv_chunk(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([[_plain(value) for value in row] for row in rows])
+    return buffer.getvalue()
+
+def _jsonl_chunk(names, rows):
+    return "".join(
+        json.dumps({name: _plain(value) for name, value in zip(names, row)}, ensure_ascii=False) + "\n"
+        for row in rows
+    )
+
+async def _export_rows(kind: str, fmt: str, start: Optional[datetime], end: Optional[datetime]):
+    """Тело ответа: пачка строк из курсора -> кусок CSV/JSONL -> клиенту.
+
+    Сессия открывается здесь, а не через Depends: она нужна, пока отдается тело ответа.
+    """
+    names = [column.key for column in crud.EXPORTS[kind][0]]
+    if fmt == "csv":
+        yield _csv_chunk([names])
+    async with AsyncSessionLocal() as session:
+        async for rows in crud.stream_export(session, kind, start, end):
+            yield _csv_chunk(rows) if fmt == "csv" else _jsonl_chunk(names, rows)
+
+@router.get("/{kind}")
+async def export(
+    kind: str,
+    format: str = Query("csv", pattern="^(csv|jsonl)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    """Выгрузка orders, users, gifts или feedback в CSV или JSONL за [start, end).
+
+    Строки читаются серверным курсором и отдаются по мере чтения, память не зависит от
+    размера выгрузки. Время без часового пояса считается UTC; у users фильтра по дате нет.
+    """
+    if kind not in crud.EXPORTS:
+        raise HTTPException(404, "Неизвестная выгрузка")
+    if (start or end) and crud.EXPORTS[kind][1] is None:
+        raise HTTPException(400, "Для этой выгрузки фильтр по дате недоступен")
+    start, end = (t.replace(tzinfo=timezone.utc) if t and not t.tzinfo else t for t in (start, end))
+    return StreamingResponse(
+        _export_rows(kind, format, start, end),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{kind}.{format}"'},
+    )
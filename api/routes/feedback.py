@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
-from common.schemas import FeedbackOut, FeedbackCreate, IdeaOut, IdeaCreate
+from typing import Optional
+from common.schemas import FeedbackOut, FeedbackCreate, IdeaOut, IdeaCreate, Page
 from common import crud
+from common.pagination import MAX_PAGE_SIZE
 from api.deps import get_session
+from api.serialization import page_response
 
 router = APIRouter()
 
@@ -12,19 +14,21 @@ async def create_feedback(feedback: FeedbackCreate, session: AsyncSession = Depe
     feedback_obj = await crud.create_feedback(session, **feedback.model_dump())
     return FeedbackOut.model_validate(feedback_obj)
 
-@router.get("/", response_model=List[FeedbackOut])
-async def list_feedbacks(session: AsyncSession = Depends(get_session), limit: int = 100, offset: int = 0):
-    """Получить список всех отзывов (для админки)"""
-    feedbacks = await crud.get_feedbacks(session, limit, offset)
-    return [FeedbackOut.model_validate(f) for f in feedbacks]
+@router.get("/", response_model=Page[FeedbackOut])
+async def list_feedbacks(session: AsyncSession = Depends(get_session),
+                         limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    """Получить список всех отзывов (для админки), страницами по курсору"""
+    feedbacks, next_cursor = await crud.get_feedbacks(session, limit, cursor)
+    return page_response(FeedbackOut, feedbacks, next_cursor)
 
 @router.post("/idea", response_model=IdeaOut)
 async def create_idea(idea: IdeaCreate, session: AsyncSession = Depends(get_session)):
     idea_obj = await crud.create_idea(session, **idea.model_dump())
     return IdeaOut.model_validate(idea_obj)
 
-@router.get("/ideas", response_model=List[IdeaOut])
-async def list_ideas(session: AsyncSession = Depends(get_session), limit: int = 100, offset: int = 0):
-    """Получить список всех идей (для админки)"""
-    ideas = await crud.get_ideas(session, limit, offset)
-    return [IdeaOut.model_validate(i) for i in ideas]
+@router.get("/ideas", response_model=Page[IdeaOut])
+async def list_ideas(session: AsyncSession = Depends(get_session),
+                     limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    """Получить список всех идей (для админки), страницами по курсору"""
+    ideas, next_cursor = await crud.get_ideas(session, limit, cursor)
+    return page_response(IdeaOut, ideas, next_cursor)
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
-from common.schemas import GiftOut, GiftCreate
+from typing import List, Optional
+from common.schemas import GiftOut, GiftCreate, Page
 from common import crud
+from common.pagination import MAX_PAGE_SIZE
 from api.deps import get_session
+from api.serialization import list_response, page_response
 
 router = APIRouter()
 
@@ -15,13 +17,8 @@ async def create_gift(gift: GiftCreate, session: AsyncSession = Depends(get_sess
     if not user:
         raise HTTPException(404, "Пользователь не найден")
     
-    gift_obj = await crud.create_gift(session, **gift.model_dump())
-    
-    # Обновляем счетчики подарков у пользователя
-    if gift.type == "drink":
-        await crud.update_user(session, gift.user_id, gift_drinks=user.gift_drinks + gift.amount)
-    elif gift.type == "sandwich":
-        await crud.update_user(session, gift.user_id, gift_sandwiches=user.gift_sandwiches + gift.amount)
+    # Подарок и счетчики подарков у пользователя - атомарно, одной транзакцией
+    gift_obj = await crud.issue_gift(session, gift.user_id, gift.type, gift.amount, gift.created_by)
     
     return GiftOut.model_validate(gift_obj)
 
@@ -29,7 +26,7 @@ async def create_gift(gift: GiftCreate, session: AsyncSession = Depends(get_sess
 async def get_user_gifts(user_id: int, session: AsyncSession = Depends(get_session), active_only: bool = True):
     """Получить подарки пользователя"""
     gifts = await crud.get_gifts_by_user(session, user_id, active_only)
-    return [GiftOut.model_validate(g) for g in gifts]
+    return list_response(GiftOut, gifts)
 
 @router.post("/{gift_id}/writeoff", response_model=GiftOut)
 async def writeoff_gift(gift_id: int, session: AsyncSession = Depends(get_session)):
@@ -39,8 +36,9 @@ async def writeoff_gift(gift_id: int, session: AsyncSession = Depends(get_sessio
         raise HTTPException(404, "Подарок не найден или уже списан")
     return GiftOut.model_validate(gift)
 
-@router.get("/", response_model=List[GiftOut])
-async def list_all_gifts(session: AsyncSession = Depends(get_session), limit: int = 100, offset: int = 0):
-    """Получить все подарки (для админки)"""
-    gifts = await crud.get_all_gifts(session, limit, offset)
-    return [GiftOut.model_validate(g) for g in gifts]
+@router.get("/", response_model=Page[GiftOut])
+async def list_all_gifts(session: AsyncSession = Depends(get_session),
+                         limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    """Получить все подарки (для админки), страницами по курсору"""
+    gifts, next_cursor = await crud.get_all_gifts(session, limit, cursor)
+    return page_response(GiftOut, gifts, next_cursor)
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from common.schemas import NotificationCreate, NotificationOut
+from common.schemas import (
+    NotificationCreate, NotificationOut, NotificationDeliveryOut, InboxOut, UnreadCountOut
+)
 from common import crud
 from api.deps import get_session
+from api.serialization import json_response
 
 router = APIRouter()
 
@@ -10,3 +13,27 @@ router = APIRouter()
 async def send_notification(notification: NotificationCreate, session: AsyncSession = Depends(get_session)):
     note = await crud.create_notification(session, notification.text, notification.sent_by, notification.user_id)
     return NotificationOut.model_validate(note)
+
+@router.get("/{notification_id}/delivery", response_model=NotificationDeliveryOut)
+async def notification_delivery(notification_id: int, session: AsyncSession = Depends(get_session)):
+    delivery = await crud.get_notification_delivery(session, notification_id)
+    if not delivery:
+        raise HTTPException(404, "Рассылка не найдена")
+    return NotificationDeliveryOut.model_validate(delivery)
+
+@router.get("/user/{user_id}", response_model=InboxOut)
+async def user_inbox(user_id: int, limit: int = 10, offset: int = 0, session: AsyncSession = Depends(get_session)):
+    items, unread = await crud.get_inbox(session, user_id, limit, offset)
+    return json_response(InboxOut, {"unread": unread, "items": [
+        {"id": n.id, "text": n.text, "date_sent": n.date_sent, "is_broadcast": n.user_id is None, "is_read": is_read}
+        for n, is_read in items
+    ]})
+
+@router.get("/user/{user_id}/unread", response_model=UnreadCountOut)
+async def user_unread_count(user_id: int, session: AsyncSession = Depends(get_session)):
+    return UnreadCountOut(unread=await crud.get_unread_count(session, user_id))
+
+@router.post("/user/{user_id}/read", response_model=UnreadCountOut)
+async def mark_user_notifications_read(user_id: int, session: AsyncSession = Depends(get_session)):
+    """Отмечает всю ленту прочитанной; возвращает, сколько было непрочитанных"""
+    return UnreadCountOut(unread=await crud.mark_notifications_read(session, user_id))
@@ -1,40 +1,71 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
-from common.schemas import OrderCreate, OrderOut
+from typing import Any, List, Optional
+from pydantic import ValidationError
+from common.schemas import OrderCreate, OrderOut, OrderBatchOut, OrderBatchItemResult, Page
 from common import crud
+from common.pagination import MAX_PAGE_SIZE
 from api.deps import get_session
+from api.serialization import list_response, page_response
 
 router = APIRouter()
 
+MAX_BATCH_SIZE = 1000
+
 @router.post("/", response_model=OrderOut)
 async def create_order(order: OrderCreate, session: AsyncSession = Depends(get_session)):
-    # Проверяем существование пользователя
-    user = await crud.get_user_by_id(session, order.user_id)
-    if not user:
+    # Заказ и статистика пользователя - одной транзакцией (подарки на ДР - ежедневной задачей)
+    order_obj, _ = await crud.process_order(session, **order.model_dump())
+    if not order_obj:
         raise HTTPException(404, "Пользователь не найден")
-    
-    # Создаем заказ
-    order_obj = await crud.create_order(session, **order.model_dump())
-    
-    # Обновляем статистику пользователя
-    await crud.update_user_stats_after_order(session, order.user_id, order.drinks_count, order.sandwiches_count, order.total_sum, order.use_points, order.used_points_amount)
-    
     return OrderOut.model_validate(order_obj)
 
-@router.get("/user/{user_id}", response_model=List[OrderOut])
-async def get_user_orders(user_id: int, session: AsyncSession = Depends(get_session), limit: int = 10, offset: int = 0):
-    orders = await crud.get_orders_by_user(session, user_id, limit, offset)
-    return [OrderOut.model_validate(o) for o in orders]
+@router.post("/batch", response_model=OrderBatchOut)
+async def create_orders_batch(orders: List[Any], session: AsyncSession = Depends(get_session)):
+    """Пакетная загрузка заказов (импорт из кассы). Ошибка в одной строке не отменяет остальные.
+
+    Элементы проверяются по одному: даже не-объект в списке - ошибка своего индекса, а не 422.
+    """
+    if len(orders) > MAX_BATCH_SIZE:
+        raise HTTPException(413, f"Не больше {MAX_BATCH_SIZE} заказов за запрос")
+
+    results = [None] * len(orders)
+    valid_indexes, valid_orders = [], []
+    for index, payload in enumerate(orders):
+        try:
+            valid_orders.append(OrderCreate.model_validate(payload).model_dump())
+            valid_indexes.append(index)
+        except ValidationError as e:
+            results[index] = OrderBatchItemResult(index=index, ok=False, error="; ".join(
+                f"{'.'.join(map(str, err['loc']))}: {err['msg']}" if err["loc"] else err["msg"]
+                for err in e.errors()
+            ))
+
+    if valid_orders:
+        created = await crud.create_orders_batch(session, valid_orders)
+        for index, (order_obj, error) in zip(valid_indexes, created):
+            results[index] = OrderBatchItemResult(
+                index=index, ok=order_obj is not None, order_id=order_obj.id if order_obj else None, error=error
+            )
+
+    created_count = sum(1 for r in results if r.ok)
+    return OrderBatchOut(created=created_count, failed=len(results) - created_count, results=results)
+
+@router.get("/user/{user_id}", response_model=Page[OrderOut])
+async def get_user_orders(user_id: int, session: AsyncSession = Depends(get_session),
+                          limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    orders, next_cursor = await crud.get_orders_by_user(session, user_id, limit, cursor)
+    return page_response(OrderOut, orders, next_cursor)
 
-@router.get("/", response_model=List[OrderOut])
-async def list_all_orders(session: AsyncSession = Depends(get_session), limit: int = 100, offset: int = 0):
-    """Получить все заказы (для админки)"""
-    orders = await crud.get_all_orders(session, limit, offset)
-    return [OrderOut.model_validate(o) for o in orders]
+@router.get("/", response_model=Page[OrderOut])
+async def list_all_orders(session: AsyncSession = Depends(get_session),
+                          limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    """Получить все заказы (для админки), страницами по курсору"""
+    orders, next_cursor = await crud.get_all_orders(session, limit, cursor)
+    return page_response(OrderOut, orders, next_cursor)
 
 @router.get("/recent", response_model=List[OrderOut])
 async def get_recent_orders(session: AsyncSession = Depends(get_session), limit: int = 10):
     """Получить последние заказы"""
     orders = await crud.get_recent_orders(session, limit)
-    return [OrderOut.model_validate(o) for o in orders]
+    return list_response(OrderOut, orders)
@@ -1,16 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List
+from typing import Optional
 from slowapi import Limiter
 from slowapi.util import get_remote_address
-from common.schemas import UserOut, UserCreate
+from common.schemas import UserOut, UserCreate, Page
 from common import crud
-from common.models import User
+from common.pagination import MAX_PAGE_SIZE
+from api.config import settings
 from api.deps import get_session
+from api.serialization import page_response
 
 router = APIRouter()
-limiter = Limiter(key_func=get_remote_address)
+limiter = Limiter(key_func=get_remote_address, enabled=settings.RATE_LIMIT_ENABLED)
 
 @router.post("/", response_model=UserOut)
 @limiter.limit("5/minute")
@@ -22,19 +23,24 @@ async def register_user(request: Request, user: UserCreate, session: AsyncSessio
         first_name=user.first_name, last_name=user.last_name, birth_date=user.birth_date)
     return UserOut.model_validate(user_obj)
 
-@router.get("/", response_model=List[UserOut])
-@limiter.limit("10/minute")
-async def list_users(request: Request, session: AsyncSession = Depends(get_session), limit: int = 100, offset: int = 0):
-    """Получить список всех пользователей (для админки)"""
-    stmt = select(User).order_by(User.id.desc()).offset(offset).limit(limit)
-    result = await session.execute(stmt)
-    users = result.scalars().all()
-    return [UserOut.model_validate(user) for user in users]
+@router.get("/", response_model=Page[UserOut])
+@limiter.limit("60/minute")
+async def list_users(request: Request, session: AsyncSession = Depends(get_session),
+                     limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    """Получить список всех пользователей (для админки), страницами по курсору"""
+    users, next_cursor = await crud.get_users(session, limit, cursor)
+    return page_response(UserOut, users, next_cursor)
+
+@router.get("/cache/stats")
+async def profile_cache_stats():
+    """Попадания и промахи кэша профилей (пусто, если кэш выключен)"""
+    return crud.profile_cache.stats() if crud.profile_cache is not None else {}
 
 @router.get("/{telegram_id}", response_model=UserOut)
 @limiter.limit("30/minute")
 async def get_user(request: Request, telegram_id: str, session: AsyncSession = Depends(get_session)):
-    user = await crud.get_user_by_telegram(session, telegram_id)
+    # Профиль из кэша (crud.get_profile), записи в crud сбрасывают его после commit
+    user = await crud.get_profile(session, telegram_id=telegram_id)
     if not user:
         raise HTTPException(404, "Пользователь не найден")
     return UserOut.model_validate(user)
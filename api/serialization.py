@@ -0,0 +1,53 @@
+"""Быстрый путь JSON для списков.
+
+Обычный путь FastAPI для списка: model_validate на каждую строку (атрибуты ORM-объекта
+читаются через дескрипторы SQLAlchemy), затем повторная валидация результата по
+response_model, jsonable_encoder и json.dumps. Здесь список проверяется одним вызовом
+TypeAdapter по уже загруженным значениям столбцов (__dict__ экземпляра) и кодируется в
+JSON им же, в pydantic-core; строки с незагруженными столбцами проверяются по атрибутам.
+Возвращаемый Response FastAPI отдает как есть, response_model в декораторе остается для
+схемы OpenAPI.
+"""
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+from fastapi import Response
+from pydantic import TypeAdapter
+from sqlalchemy import inspect
+
+from common.schemas import Page
+
+
+@lru_cache(maxsize=None)
+def adapter(tp) -> TypeAdapter:
+    """Один TypeAdapter на тип: сборка валидатора и сериализатора дорогая"""
+    return TypeAdapter(tp)
+
+
+def _values(row):
+    # Значения загруженных столбцов лежат в __dict__. Истекший (после flush - серверные
+    # значения по умолчанию, expire), отложенный или еще не загруженный столбец там
+    # отсутствует - такую строку отдаем как есть, TypeAdapter прочитает атрибуты
+    if not hasattr(row, "_sa_instance_state"):
+        return row
+    state = inspect(row)
+    if not state.unloaded.isdisjoint(state.mapper.column_attrs.keys()):
+        return row
+    return row.__dict__
+
+
+def json_response(tp, value, status_code: int = 200) -> Response:
+    """Ответ tp (например InboxOut) из value - словарей, моделей или объектов с атрибутами"""
+    type_adapter = adapter(tp)
+    body = type_adapter.dump_json(type_adapter.validate_python(value, from_attributes=True))
+    return Response(body, status_code=status_code, media_type="application/json")
+
+
+def list_response(item_type, rows: Sequence) -> Response:
+    """List[item_type] из строк ORM"""
+    return json_response(List[item_type], [_values(row) for row in rows])
+
+
+def page_response(item_type, rows: Sequence, next_cursor: Optional[str]) -> Response:
+    """Page[item_type] из строк ORM и курсора следующей страницы"""
+    return json_response(Page[item_type], {"items": [_values(row) for row in rows], "next_cursor": next_cursor})
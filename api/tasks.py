@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+from api.config import settings
+from api.deps import AsyncSessionLocal
+from common import crud
+from common.broadcast import BroadcastDispatcher, TelegramSender
+
+logger = logging.getLogger("api")
+
+_tasks = []
+
+
+async def code_reaper(interval: int, batch_size: int):
+    """Периодически удаляет истекшие коды (см. crud.reap_codes)"""
+    after = None
+    while True:
+        try:
+            started = time.perf_counter()
+            async with AsyncSessionLocal() as session:
+                reaped, after = await crud.reap_codes(session, batch_size=batch_size, after=after)
+            logger.info("Очистка кодов: удалено %s строк за %.2f с", reaped, time.perf_counter() - started)
+        except Exception:
+            logger.exception("Ошибка очистки кодов")
+        await asyncio.sleep(interval)
+
+
+def _seconds_until(hour: int) -> float:
+    now = datetime.now()
+    at = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if at <= now:
+        at += timedelta(days=1)
+    return (at - now).total_seconds()
+
+
+async def birthday_gifts(hour: int):
+    """Раз в сутки в hour:00 выдает подарки именинникам (см. crud.give_birthday_gifts).
+
+    Первый запуск - сразу при старте: повторная выдача за день ничего не делает,
+    а день, на который пришелся перезапуск API, так не пропадает.
+    """
+    while True:
+        try:
+            started = time.perf_counter()
+            async with AsyncSessionLocal() as session:
+                given = await crud.give_birthday_gifts(session)
+            logger.info("Подарки на ДР: выдано %s за %.2f с", given, time.perf_counter() - started)
+        except Exception:
+            logger.exception("Ошибка выдачи подарков на ДР")
+        await asyncio.sleep(_seconds_until(hour))
+
+
+def create_broadcast_dispatcher():
+    sender = TelegramSender(settings.TELEGRAM_TOKEN_CLIENT, settings.TELEGRAM_API_URL)
+    return BroadcastDispatcher(
+        AsyncSessionLocal, sender, rate=settings.BROADCAST_RATE, chat_rate=settings.BROADCAST_CHAT_RATE
+    )
+
+
+async def broadcast_worker(interval: int):
+    """Периодически отправляет ожидающие рассылки уведомлений (см. common.broadcast)"""
+    dispatcher = create_broadcast_dispatcher()
+    try:
+        while True:
+            try:
+                while await dispatcher.run_next():
+                    pass
+            except Exception:
+                logger.exception("Ошибка рассылки уведомлений")
+            await asyncio.sleep(interval)
+    finally:
+        await dispatcher.sender.close()
+
+
+def start_background_tasks():
+    """Запускает фоновые задачи API (интервал 0 или час -1 отключает задачу)"""
+    if settings.CODE_REAPER_INTERVAL > 0:
+        _tasks.append(asyncio.create_task(code_reaper(settings.CODE_REAPER_INTERVAL, settings.CODE_REAPER_BATCH)))
+    if settings.BROADCAST_INTERVAL > 0 and settings.TELEGRAM_TOKEN_CLIENT:
+        _tasks.append(asyncio.create_task(broadcast_worker(settings.BROADCAST_INTERVAL)))
+    if settings.BIRTHDAY_GIFTS_HOUR >= 0:
+        _tasks.append(asyncio.create_task(birthday_gifts(settings.BIRTHDAY_GIFTS_HOUR)))
+
+
+async def stop_background_tasks():
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
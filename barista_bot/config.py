@@ -4,3 +4,17 @@ from dotenv import load_dotenv
 load_dotenv()
 TELEGRAM_TOKEN_BARISTA = os.getenv("TELEGRAM_TOKEN_BARISTA")
 API_BASE_URL = os.getenv("API_BASE_URL", "http://api:8000")
+# Хранилище FSM: пусто - в памяти процесса, redis://... - общее для нескольких воркеров
+FSM_STORAGE_URL = os.getenv("FSM_STORAGE_URL", "")
+FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", "86400"))
+# Режим работы: polling или webhook (несколько воркеров за балансировщиком)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook/barista")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8081"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "16"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+# Порт /metrics в режиме polling (0 - не отдавать); в режиме webhook /metrics на порту вебхука
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
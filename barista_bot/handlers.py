@@ -2,9 +2,8 @@ from aiogram import Router, types, F
 from aiogram.filters import CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
-import httpx
 from common import buttons, messages
-from barista_bot.config import API_BASE_URL
+from common.api_client import ApiClient
 
 router = Router()
 
@@ -37,22 +36,21 @@ async def start_order(msg: types.Message, state: FSMContext):
     await state.set_state(OrderState.waiting_for_code)
 
 @router.message(OrderState.waiting_for_code)
-async def order_code(msg: types.Message, state: FSMContext):
+async def order_code(msg: types.Message, state: FSMContext, api: ApiClient):
     code = msg.text.strip()
-    async with httpx.AsyncClient() as client:
-        r = await client.post(f"{API_BASE_URL}/codes/use", params={"code_value": code})
-        if r.status_code != 200:
-            await msg.answer(messages.CODE_INVALID, reply_markup=kb_barista())
-            await state.clear()
-            return
-        user_id = r.json()["user_id"]
-        # Для простоты подгрузим профиль клиента
-        ur = await client.get(f"{API_BASE_URL}/users/{user_id}")
-        u = ur.json()
-        await state.update_data(user_id=user_id, code_id=r.json()["id"])
-        await msg.answer(messages.ORDER_CLIENT_FOUND.format(first_name=u['first_name'], last_name=u['last_name']))
-        await msg.answer(messages.ORDER_INPUT_RECEIPT)
-        await state.set_state(OrderState.waiting_for_receipt)
+    code_data, status_code = await api.use_code(code)
+    if status_code != 200:
+        await msg.answer(messages.CODE_INVALID, reply_markup=kb_barista())
+        await state.clear()
+        return
+    user_id = code_data["user_id"]
+    # Для простоты подгрузим профиль клиента
+    u, _ = await api.get_user(user_id)
+    u = u or {}
+    await state.update_data(user_id=user_id, code_id=code_data["id"])
+    await msg.answer(messages.ORDER_CLIENT_FOUND.format(first_name=u.get('first_name'), last_name=u.get('last_name')))
+    await msg.answer(messages.ORDER_INPUT_RECEIPT)
+    await state.set_state(OrderState.waiting_for_receipt)
 
 @router.message(OrderState.waiting_for_receipt)
 async def order_receipt(msg: types.Message, state: FSMContext):
@@ -94,7 +92,7 @@ async def accumulate_points(msg: types.Message, state: FSMContext):
     await state.set_state(OrderState.confirm_order)
 
 @router.message(OrderState.confirm_order, F.text == buttons.BTN_CONFIRM)
-async def confirm_order(msg: types.Message, state: FSMContext):
+async def confirm_order(msg: types.Message, state: FSMContext, api: ApiClient):
     data = await state.get_data()
     order_json = {
         "user_id": data["user_id"],
@@ -107,9 +105,8 @@ async def confirm_order(msg: types.Message, state: FSMContext):
         "use_points": data["use_points"],
         "used_points_amount": 0  # TODO: получить из профиля пользователя если требуется списание
     }
-    async with httpx.AsyncClient() as client:
-        r = await client.post(f"{API_BASE_URL}/orders/", json=order_json)
-    if r.status_code == 200:
+    _, status_code = await api.create_order(order_json)
+    if status_code == 200:
         await msg.answer(messages.ORDER_SUCCESS, reply_markup=kb_barista())
     else:
         await msg.answer(messages.ORDER_FAIL, reply_markup=kb_barista())
@@ -139,22 +136,20 @@ async def start_gift(msg: types.Message, state: FSMContext):
     await state.set_state(GiftState.waiting_for_user_id)
 
 @router.message(GiftState.waiting_for_user_id)
-async def gift_user_id(msg: types.Message, state: FSMContext):
+async def gift_user_id(msg: types.Message, state: FSMContext, api: ApiClient):
     user_id = msg.text.strip()
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{API_BASE_URL}/users/{user_id}")
-        if r.status_code == 200:
-            user = r.json()
-            await state.update_data(target_user=user)
-            kb = types.ReplyKeyboardMarkup(keyboard=[
-                [types.KeyboardButton(text="Напиток")],
-                [types.KeyboardButton(text="Сэндвич")],
-                [types.KeyboardButton(text="Назад")]
-            ], resize_keyboard=True)
-            await msg.answer(f"Пользователь найден: {user['first_name']} {user['last_name']}\nВыберите тип подарка:", reply_markup=kb)
-            await state.set_state(GiftState.waiting_for_gift_type)
-        else:
-            await msg.answer("Пользователь не найден. Попробуйте еще раз или введите 'Назад':")
+    user, status_code = await api.get_user(user_id)
+    if status_code == 200:
+        await state.update_data(target_user=user)
+        kb = types.ReplyKeyboardMarkup(keyboard=[
+            [types.KeyboardButton(text="Напиток")],
+            [types.KeyboardButton(text="Сэндвич")],
+            [types.KeyboardButton(text="Назад")]
+        ], resize_keyboard=True)
+        await msg.answer(f"Пользователь найден: {user['first_name']} {user['last_name']}\nВыберите тип подарка:", reply_markup=kb)
+        await state.set_state(GiftState.waiting_for_gift_type)
+    else:
+        await msg.answer("Пользователь не найден. Попробуйте еще раз или введите 'Назад':")
 
 @router.message(GiftState.waiting_for_gift_type)
 async def gift_type(msg: types.Message, state: FSMContext):
@@ -199,7 +194,7 @@ async def gift_amount(msg: types.Message, state: FSMContext):
         await msg.answer("Введите корректное число или оставьте пустым для 1:")
 
 @router.message(GiftState.confirm_gift)
-async def confirm_gift(msg: types.Message, state: FSMContext):
+async def confirm_gift(msg: types.Message, state: FSMContext, api: ApiClient):
     if msg.text == "Отмена":
         await msg.answer("Отменено", reply_markup=kb_barista())
         await state.clear()
@@ -214,13 +209,12 @@ async def confirm_gift(msg: types.Message, state: FSMContext):
             "created_by": msg.from_user.id  # ID бариста
         }
         
-        async with httpx.AsyncClient() as client:
-            r = await client.post(f"{API_BASE_URL}/gifts/", json=gift_data)
-            if r.status_code == 200:
-                gift_type_ru = "напитков" if data["gift_type"] == "drink" else "сэндвичей"
-                await msg.answer(f"✅ Подарок выдан: {data['amount']} {gift_type_ru} для {data['target_user']['first_name']}", reply_markup=kb_barista())
-            else:
-                await msg.answer("❌ Ошибка при выдаче подарка", reply_markup=kb_barista())
+        _, status_code = await api.create_gift(gift_data)
+        if status_code == 200:
+            gift_type_ru = "напитков" if data["gift_type"] == "drink" else "сэндвичей"
+            await msg.answer(f"✅ Подарок выдан: {data['amount']} {gift_type_ru} для {data['target_user']['first_name']}", reply_markup=kb_barista())
+        else:
+            await msg.answer("❌ Ошибка при выдаче подарка", reply_markup=kb_barista())
     
     await state.clear()
 
@@ -231,44 +225,41 @@ async def start_writeoff(msg: types.Message, state: FSMContext):
     await state.set_state(WriteOffState.waiting_for_user_id)
 
 @router.message(WriteOffState.waiting_for_user_id)
-async def writeoff_user_id(msg: types.Message, state: FSMContext):
+async def writeoff_user_id(msg: types.Message, state: FSMContext, api: ApiClient):
     user_id = msg.text.strip()
-    async with httpx.AsyncClient() as client:
-        # Получаем пользователя
-        user_r = await client.get(f"{API_BASE_URL}/users/{user_id}")
-        if user_r.status_code == 200:
-            user = user_r.json()
-            await state.update_data(target_user=user)
+    # Получаем пользователя
+    user, status_code = await api.get_user(user_id)
+    if status_code == 200:
+        await state.update_data(target_user=user)
+        
+        # Получаем активные подарки пользователя
+        gifts, gifts_status = await api.user_gifts(user['id'])
+        if gifts_status == 200:
+            active_gifts = [g for g in gifts if not g.get('is_written_off', True)]
             
-            # Получаем активные подарки пользователя
-            gifts_r = await client.get(f"{API_BASE_URL}/gifts/user/{user['id']}")
-            if gifts_r.status_code == 200:
-                gifts = gifts_r.json()
-                active_gifts = [g for g in gifts if not g.get('is_written_off', True)]
+            if active_gifts:
+                await state.update_data(available_gifts=active_gifts)
+                gifts_text = "Доступные подарки:\n"
+                buttons_list = []
+                
+                for i, gift in enumerate(active_gifts[:10]):  # Ограничиваем 10 подарками
+                    gift_type_ru = "напиток" if gift['type'] == "drink" else "сэндвич"
+                    gifts_text += f"{i+1}. {gift_type_ru} (x{gift['amount']})\n"
+                    buttons_list.append([types.KeyboardButton(text=str(i+1))])
+                
+                buttons_list.append([types.KeyboardButton(text="Назад")])
+                kb = types.ReplyKeyboardMarkup(keyboard=buttons_list, resize_keyboard=True)
                 
-                if active_gifts:
-                    await state.update_data(available_gifts=active_gifts)
-                    gifts_text = "Доступные подарки:\n"
-                    buttons_list = []
-                    
-                    for i, gift in enumerate(active_gifts[:10]):  # Ограничиваем 10 подарками
-                        gift_type_ru = "напиток" if gift['type'] == "drink" else "сэндвич"
-                        gifts_text += f"{i+1}. {gift_type_ru} (x{gift['amount']})\n"
-                        buttons_list.append([types.KeyboardButton(text=str(i+1))])
-                    
-                    buttons_list.append([types.KeyboardButton(text="Назад")])
-                    kb = types.ReplyKeyboardMarkup(keyboard=buttons_list, resize_keyboard=True)
-                    
-                    await msg.answer(f"Пользователь: {user['first_name']} {user['last_name']}\n\n{gifts_text}\nВыберите номер подарка для списания:", reply_markup=kb)
-                    await state.set_state(WriteOffState.waiting_for_gift_selection)
-                else:
-                    await msg.answer("У пользователя нет активных подарков", reply_markup=kb_barista())
-                    await state.clear()
+                await msg.answer(f"Пользователь: {user['first_name']} {user['last_name']}\n\n{gifts_text}\nВыберите номер подарка для списания:", reply_markup=kb)
+                await state.set_state(WriteOffState.waiting_for_gift_selection)
             else:
-                await msg.answer("Ошибка при получении подарков", reply_markup=kb_barista())
+                await msg.answer("У пользователя нет активных подарков", reply_markup=kb_barista())
                 await state.clear()
         else:
-            await msg.answer("Пользователь не найден. Попробуйте еще раз:")
+            await msg.answer("Ошибка при получении подарков", reply_markup=kb_barista())
+            await state.clear()
+    else:
+        await msg.answer("Пользователь не найден. Попробуйте еще раз:")
 
 @router.message(WriteOffState.waiting_for_gift_selection)
 async def writeoff_select_gift(msg: types.Message, state: FSMContext):
@@ -302,7 +293,7 @@ async def writeoff_select_gift(msg: types.Message, state: FSMContext):
         await msg.answer("Введите номер подарка:")
 
 @router.message(WriteOffState.confirm_writeoff)
-async def confirm_writeoff(msg: types.Message, state: FSMContext):
+async def confirm_writeoff(msg: types.Message, state: FSMContext, api: ApiClient):
     if msg.text == "Отмена":
         await msg.answer("Отменено", reply_markup=kb_barista())
         await state.clear()
@@ -312,13 +303,12 @@ async def confirm_writeoff(msg: types.Message, state: FSMContext):
         data = await state.get_data()
         gift_id = data["selected_gift"]["id"]
         
-        async with httpx.AsyncClient() as client:
-            r = await client.post(f"{API_BASE_URL}/gifts/{gift_id}/writeoff")
-            if r.status_code == 200:
-                gift_type_ru = "напиток" if data["selected_gift"]['type'] == "drink" else "сэндвич"
-                await msg.answer(f"✅ Подарок списан: {gift_type_ru} у {data['target_user']['first_name']}", reply_markup=kb_barista())
-            else:
-                await msg.answer("❌ Ошибка при списании подарка", reply_markup=kb_barista())
+        _, status_code = await api.write_off_gift(gift_id)
+        if status_code == 200:
+            gift_type_ru = "напиток" if data["selected_gift"]['type'] == "drink" else "сэндвич"
+            await msg.answer(f"✅ Подарок списан: {gift_type_ru} у {data['target_user']['first_name']}", reply_markup=kb_barista())
+        else:
+            await msg.answer("❌ Ошибка при списании подарка", reply_markup=kb_barista())
     
     await state.clear()
 
@@ -357,16 +347,14 @@ async def notification_target(msg: types.Message, state: FSMContext):
         await state.set_state(NotificationState.waiting_for_user_id)
 
 @router.message(NotificationState.waiting_for_user_id)
-async def notification_user_id(msg: types.Message, state: FSMContext):
+async def notification_user_id(msg: types.Message, state: FSMContext, api: ApiClient):
     user_id = msg.text.strip()
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{API_BASE_URL}/users/{user_id}")
-        if r.status_code == 200:
-            user = r.json()
-            await state.update_data(target_user=user)
-            await confirm_notification(msg, state)
-        else:
-            await msg.answer("Пользователь не найден. Попробуйте еще раз:")
+    user, status_code = await api.get_user(user_id)
+    if status_code == 200:
+        await state.update_data(target_user=user)
+        await confirm_notification(msg, state)
+    else:
+        await msg.answer("Пользователь не найден. Попробуйте еще раз:")
 
 async def confirm_notification(msg: types.Message, state: FSMContext):
     data = await state.get_data()
@@ -385,7 +373,7 @@ async def confirm_notification(msg: types.Message, state: FSMContext):
     await state.set_state(NotificationState.confirm_notification)
 
 @router.message(NotificationState.confirm_notification)
-async def send_notification(msg: types.Message, state: FSMContext):
+async def send_notification(msg: types.Message, state: FSMContext, api: ApiClient):
     if msg.text == "Отмена":
         await msg.answer("Отменено", reply_markup=kb_barista())
         await state.clear()
@@ -401,34 +389,31 @@ async def send_notification(msg: types.Message, state: FSMContext):
         if data["target_type"] == "one":
             notification_data["user_id"] = data["target_user"]["id"]
         
-        async with httpx.AsyncClient() as client:
-            r = await client.post(f"{API_BASE_URL}/notifications/", json=notification_data)
-            if r.status_code == 200:
-                target_text = "всем пользователям" if data["target_type"] == "all" else "пользователю"
-                await msg.answer(f"✅ Уведомление отправлено {target_text}", reply_markup=kb_barista())
-            else:
-                await msg.answer("❌ Ошибка при отправке уведомления", reply_markup=kb_barista())
+        _, status_code = await api.send_notification(notification_data)
+        if status_code == 200:
+            target_text = "всем пользователям" if data["target_type"] == "all" else "пользователю"
+            await msg.answer(f"✅ Уведомление отправлено {target_text}", reply_markup=kb_barista())
+        else:
+            await msg.answer("❌ Ошибка при отправке уведомления", reply_markup=kb_barista())
     
     await state.clear()
 
 # ИСТОРИЯ ОПЕРАЦИЙ
 @router.message(F.text == buttons.BTN_HISTORY)
-async def show_history(msg: types.Message, state: FSMContext):
-    async with httpx.AsyncClient() as client:
-        # Получаем последние заказы
-        orders_r = await client.get(f"{API_BASE_URL}/orders/recent", params={"limit": 10})
-        if orders_r.status_code == 200:
-            orders = orders_r.json()
-            if orders:
-                history_text = "📋 Последние 10 заказов:\n\n"
-                for order in orders:
-                    history_text += f"🔹 Заказ #{order.get('receipt_number', 'N/A')}\n"
-                    history_text += f"   Сумма: {order.get('total_sum', 0)} руб.\n"
-                    history_text += f"   Напитки: {order.get('drinks_count', 0)}, Сэндвичи: {order.get('sandwiches_count', 0)}\n"
-                    history_text += f"   Дата: {order.get('date_created', '')[:16]}\n\n"
-                
-                await msg.answer(history_text, reply_markup=kb_barista())
-            else:
-                await msg.answer("История заказов пуста", reply_markup=kb_barista())
+async def show_history(msg: types.Message, state: FSMContext, api: ApiClient):
+    # Получаем последние заказы
+    orders, status_code = await api.recent_orders(limit=10)
+    if status_code == 200:
+        if orders:
+            history_text = "📋 Последние 10 заказов:\n\n"
+            for order in orders:
+                history_text += f"🔹 Заказ #{order.get('receipt_number', 'N/A')}\n"
+                history_text += f"   Сумма: {order.get('total_sum', 0)} руб.\n"
+                history_text += f"   Напитки: {order.get('drinks_count', 0)}, Сэндвичи: {order.get('sandwiches_count', 0)}\n"
+                history_text += f"   Дата: {order.get('date_created', '')[:16]}\n\n"
+            
+            await msg.answer(history_text, reply_markup=kb_barista())
         else:
-            await msg.answer("Ошибка при получении истории", reply_markup=kb_barista())
+            await msg.answer("История заказов пуста", reply_markup=kb_barista())
+    else:
+        await msg.answer("Ошибка при получении истории", reply_markup=kb_barista())
\ No newline at end of file
@@ -0,0 +1 @@
+# Бенчмарки: запускаются как модули, например `python -m benchmarks.bench_order_path`
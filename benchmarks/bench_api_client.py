@@ -0,0 +1,89 @@
+"""Задержка на одно сообщение бота: новый httpx.AsyncClient на каждый хендлер против общего ApiClient.
+
+Поднимает локальный HTTP-сервер (uvicorn) с заглушками эндпоинтов и прогоняет
+"сообщения" так, как это делает хендлер погашения кода: POST /codes/use + GET /users/{id}.
+Запуск: python -m benchmarks.bench_api_client [--messages 500] [--concurrency 10]
+"""
+import argparse
+import asyncio
+import socket
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+from common.api_client import ApiClient
+from benchmarks.utils import percentile
+
+stub = FastAPI()
+
+
+@stub.post("/codes/use")
+async def use_code(code_value: str):
+    return {"id": 1, "code": code_value, "user_id": 42, "is_used": True}
+
+
+@stub.get("/users/{telegram_id}")
+async def get_user(telegram_id: str):
+    return {"id": 42, "telegram_id": telegram_id, "first_name": "Иван", "last_name": "Тестов"}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def per_call_message(base_url, _api):
+    # Как было в хендлерах: клиент (и TCP-соединение) на каждое сообщение
+    async with httpx.AsyncClient() as client:
+        r = await client.post(f"{base_url}/codes/use", params={"code_value": "12345"})
+        await client.get(f"{base_url}/users/{r.json()['user_id']}")
+
+
+async def pooled_message(_base_url, api):
+    code, _ = await api.use_code("12345")
+    await api.get_user(code["user_id"])
+
+
+async def measure(message, base_url, api, messages, concurrency):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await message(base_url, api)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(messages)])
+    return messages / (time.perf_counter() - started), latencies
+
+
+async def main(messages, concurrency):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = uvicorn.Server(uvicorn.Config(stub, host="127.0.0.1", port=port, log_level="warning"))
+    serve = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    api = ApiClient(base_url)
+    print(f"{'client':<10}{'msg/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, message in (("per-call", per_call_message), ("pooled", pooled_message)):
+        rate, latencies = await measure(message, base_url, api, messages, concurrency)
+        print(f"{name:<10}{rate:>10.0f}{percentile(latencies, 50):>10.2f}{percentile(latencies, 99):>10.2f}")
+    await api.close()
+
+    server.should_exit = True
+    await serve
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.concurrency))
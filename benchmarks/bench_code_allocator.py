@@ -0,0 +1,60 @@
+"""Выдача кода при заполненности пространства кодов на 10%, 50% и 90%.
+
+Сравнивает прежний цикл "случайный код + SELECT, пока не найдем свободный"
+(каждая попытка - round trip к БД, здесь - проверка по множеству) и CodeAllocator.
+Запуск: python -m benchmarks.bench_code_allocator [--codes 5000]
+"""
+import argparse
+import secrets
+import time
+from datetime import datetime, timedelta
+
+from common.codes import CODE_SPACE, CodeAllocator, format_code
+
+
+def random_retry(live: set, codes: int):
+    attempts = 0
+    for _ in range(codes):
+        while True:
+            attempts += 1
+            code_value = "".join([str(secrets.randbelow(10)) for _ in range(5)])
+            if code_value not in live:
+                break
+        live.add(code_value)
+    return attempts
+
+
+def allocator_path(allocator: CodeAllocator, codes: int):
+    expires_at = datetime.utcnow() + timedelta(hours=1)
+    for _ in range(codes):
+        allocator.allocate(expires_at)
+    return codes
+
+
+def main(codes: int):
+    print(f"{'fill':>6}{'retry us/code':>16}{'retry attempts':>16}{'pool us/code':>15}")
+    for fill in (0.1, 0.5, 0.9):
+        live_count = int(CODE_SPACE * fill)
+        # Заполнение растет и во время замера, поэтому берем не больше 5% пространства
+        batch = min(codes, CODE_SPACE // 20)
+        expires_at = datetime.utcnow() + timedelta(hours=1)
+        live = {format_code(n): expires_at for n in secrets.SystemRandom().sample(range(CODE_SPACE), live_count)}
+
+        started = time.perf_counter()
+        attempts = random_retry(set(live), batch)
+        retry_us = (time.perf_counter() - started) * 1e6 / batch
+
+        allocator = CodeAllocator()
+        allocator.load(live)
+        started = time.perf_counter()
+        allocator_path(allocator, batch)
+        pool_us = (time.perf_counter() - started) * 1e6 / batch
+
+        print(f"{fill:>6.0%}{retry_us:>16.2f}{attempts / batch:>16.2f}{pool_us:>15.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--codes", type=int, default=5000)
+    args = parser.parse_args()
+    main(args.codes)
@@ -0,0 +1,209 @@
+"""Микробенчмарки горячих функций common/crud.py: запросы, round trip'ы и время на вызов.
+
+Досеивает --users клиентов (дни рождения по всему году) и по --notifications личных
+уведомлений на клиента, затем вызывает каждую функцию --calls раз, каждый вызов в своей
+сессии, как в API (первый вызов - прогрев, не считается). Печатает на вызов: запросы,
+round trip'ы (запросы + BEGIN/COMMIT/ROLLBACK), среднее и p95 времени.
+
+QUERY_BUDGET - запросов и round trip'ов на вызов сейчас. Если функция стала делать
+в --factor раз больше (по умолчанию вдвое), прогон завершается с кодом 1. Поменяли число
+запросов намеренно - обновите QUERY_BUDGET. give_birthday_gifts вызывается только на дни
+рождения, которые есть у засеянных клиентов и нет ни у кого больше: подарки получают
+только они. Нужна отдельная БД (BENCH_DATABASE_URL, см. benchmarks.utils).
+Запуск: python -m benchmarks.bench_crud [--users 10000] [--notifications 5] [--calls 200] [--only use_code ...]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import date
+
+from sqlalchemy import func, select, text
+
+from common import crud
+from common.models import Base, User
+from benchmarks.utils import create_bench_engine, percentile, StatementCounter
+
+PREFIX = "bench-crud-"
+# Невисокосный год, далекий от текущей даты: выданные сейчас подарки не считаются выданными в этот день
+BIRTHDAY_YEAR = 2100
+
+SEED_USERS_SQL = text("""
+    INSERT INTO users (telegram_id, first_name, birth_date, loyalty_status, points, drinks_count,
+                       sandwiches_count, gift_drinks, gift_sandwiches, is_active, role)
+    SELECT 'bench-crud-' || g, 'Гость ' || g, DATE '1990-01-01' + g % 365, 'standard', 0, g % 60, 0, 0, 0,
+           true, 'client'
+    FROM generate_series(CAST(:start AS integer), CAST(:stop AS integer)) AS g
+""")
+
+# Дни рождения (месяц, день) засеянных клиентов, которых нет у остальных. 28 и 29 февраля
+# исключены: в невисокосный год 28-го поздравляют и родившихся 29-го
+BENCH_ONLY_BIRTHDAYS_SQL = text("""
+    SELECT CAST(EXTRACT(month FROM birth_date) AS integer), CAST(EXTRACT(day FROM birth_date) AS integer)
+    FROM users WHERE telegram_id LIKE 'bench-crud-%' AND birth_date IS NOT NULL
+    EXCEPT
+    SELECT CAST(EXTRACT(month FROM birth_date) AS integer), CAST(EXTRACT(day FROM birth_date) AS integer)
+    FROM users WHERE coalesce(telegram_id, '') NOT LIKE 'bench-crud-%' AND birth_date IS NOT NULL
+    EXCEPT
+    SELECT 2, d FROM generate_series(28, 29) AS d
+    ORDER BY 1, 2
+""")
+
+SEED_NOTIFICATIONS_SQL = text("""
+    INSERT INTO notifications (user_id, text, date_sent, is_read)
+    SELECT u.id, 'Уведомление ' || n, now() - n * interval '1 hour', n % 2 = 0
+    FROM users AS u CROSS JOIN generate_series(1, CAST(:per_user AS integer)) AS n
+    WHERE u.telegram_id LIKE 'bench-crud-%' AND NOT EXISTS (SELECT 1 FROM notifications WHERE user_id = u.id)
+""")
+
+# (запросов, round trip'ов) на вызов - см. docstring
+QUERY_BUDGET = {
+    "generate_code": (1, 3),
+    "use_code": (2, 4),
+    "create_order": (3, 7),
+    "process_order": (2, 4),
+    "update_user_stats_after_order": (1, 3),
+    "get_user_by_telegram": (1, 3),
+    "get_notifications_for_user": (1, 3),
+    "give_birthday_gifts": (3, 5),
+}
+
+
+@dataclass
+class Dataset:
+    users: list  # [(id, telegram_id)] засеянных клиентов
+    barista_id: int
+    codes: list = field(default_factory=list)  # свободные коды для use_code
+    birthdays: list = field(default_factory=list)  # дни для give_birthday_gifts, см. BENCH_ONLY_BIRTHDAYS_SQL
+
+    def user(self, i):
+        # Шаг по простому числу - вызовы идут в разные места таблицы, а не подряд
+        return self.users[i * 7919 % len(self.users)]
+
+
+def order(data, i):
+    return dict(user_id=data.user(i)[0], barista_id=data.barista_id, code_id=None, receipt_number=f"BC-{i}",
+                total_sum=350, drinks_count=1, sandwiches_count=1, use_points=False, used_points_amount=0)
+
+
+CASES = {
+    "generate_code": lambda session, data, i: crud.generate_code(session, data.user(i)[0]),
+    "use_code": lambda session, data, i: crud.use_code(session, data.codes[i]),
+    "create_order": lambda session, data, i: crud.create_order(session, **order(data, i)),
+    "process_order": lambda session, data, i: crud.process_order(session, **order(data, i)),
+    "update_user_stats_after_order": lambda session, data, i: crud.update_user_stats_after_order(
+        session, data.user(i)[0], 1, 1, 350, False, 0),
+    "get_user_by_telegram": lambda session, data, i: crud.get_user_by_telegram(session, data.user(i)[1]),
+    "get_notifications_for_user": lambda session, data, i: crud.get_notifications_for_user(
+        session, data.user(i)[0]),
+    # Каждый вызов - следующий день из data.birthdays: у каждого дня свои именинники
+    "give_birthday_gifts": lambda session, data, i: crud.give_birthday_gifts(
+        session, date(BIRTHDAY_YEAR, *data.birthdays[i % len(data.birthdays)])),
+}
+
+
+async def prepare_codes(session_factory, data, calls):
+    async with session_factory() as session:
+        data.codes = [(await crud.generate_code(session, data.user(i)[0])).code for i in range(calls)]
+
+
+async def prepare_birthdays(session_factory, data, calls):
+    async with session_factory() as session:
+        data.birthdays = [tuple(row) for row in (await session.execute(BENCH_ONLY_BIRTHDAYS_SQL)).all()]
+    if not data.birthdays:
+        raise SystemExit("give_birthday_gifts: нет дня рождения только у засеянных клиентов - "
+                         "запустите на отдельной БД")
+
+
+PREPARE = {"use_code": prepare_codes, "give_birthday_gifts": prepare_birthdays}
+
+
+async def seed(session_factory, users, notifications):
+    async with session_factory() as session:
+        existing = await session.scalar(select(func.count(User.id)).where(User.telegram_id.like(f"{PREFIX}%")))
+        if existing < users:
+            print(f"Досеиваем {users - existing} клиентов...")
+            await session.execute(SEED_USERS_SQL, {"start": existing + 1, "stop": users})
+        await session.execute(SEED_NOTIFICATIONS_SQL, {"per_user": notifications})
+        await session.commit()
+        await session.execute(text("ANALYZE users"))
+        await session.execute(text("ANALYZE notifications"))
+        rows = (await session.execute(
+            select(User.id, User.telegram_id).where(User.telegram_id.like(f"{PREFIX}%")).order_by(User.id).limit(users)
+        )).all()
+        barista = await crud.get_barista_by_telegram(session, f"{PREFIX}barista")
+        if barista is None:
+            barista = await crud.create_barista(session, telegram_id=f"{PREFIX}barista")
+    return Dataset(users=[tuple(row) for row in rows], barista_id=barista.id)
+
+
+async def measure(session_factory, counter, data, name, calls):
+    """Среднее на вызов: запросы, round trip'ы, мс; плюс p95 мс"""
+    case = CASES[name]
+    if name in PREPARE:
+        await PREPARE[name](session_factory, data, calls + 1)
+    async with session_factory() as session:
+        await case(session, data, calls)  # прогрев: кэши аллокатора кодов, подготовленные запросы
+    latencies = []
+    counter.reset()
+    for i in range(calls):
+        started = time.perf_counter()
+        async with session_factory() as session:
+            await case(session, data, i)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return {
+        "statements": counter.statements / calls,
+        "round_trips": counter.round_trips / calls,
+        "mean_ms": sum(latencies) / calls,
+        "p95_ms": percentile(latencies, 95),
+    }
+
+
+def over_budget(results, factor=2.0):
+    """Функции, где запросов или round trip'ов стало в factor раз больше QUERY_BUDGET"""
+    problems = []
+    for name, result in results.items():
+        statements, round_trips = QUERY_BUDGET[name]
+        if result["statements"] >= statements * factor or result["round_trips"] >= round_trips * factor:
+            problems.append(f"{name}: запросов {result['statements']:.1f} (бюджет {statements}), "
+                            f"round trip'ов {result['round_trips']:.1f} (бюджет {round_trips})")
+    return problems
+
+
+async def run(session_factory, engine, users, notifications, calls, names):
+    data = await seed(session_factory, users, notifications)
+    counter = StatementCounter(engine)
+    try:
+        return {name: await measure(session_factory, counter, data, name, calls) for name in names}
+    finally:
+        counter.close()
+
+
+async def main(users, notifications, calls, names, factor):
+    engine, session_factory = create_bench_engine()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    results = await run(session_factory, engine, users, notifications, calls, names)
+    await engine.dispose()
+
+    print(f"{'функция':<32}{'запросов':>9}{'round trip':>11}{'бюджет':>8}{'мс':>8}{'p95 мс':>8}")
+    for name, result in results.items():
+        budget = "/".join(map(str, QUERY_BUDGET[name]))
+        print(f"{name:<32}{result['statements']:>9.1f}{result['round_trips']:>11.1f}{budget:>8}"
+              f"{result['mean_ms']:>8.2f}{result['p95_ms']:>8.2f}")
+    problems = over_budget(results, factor)
+    for problem in problems:
+        print(f"РЕГРЕССИЯ: {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--notifications", type=int, default=5, help="личных уведомлений на клиента")
+    parser.add_argument("--calls", type=int, default=200, help="вызовов каждой функции")
+    parser.add_argument("--only", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--factor", type=float, default=2.0, help="во сколько раз больше бюджета - регрессия")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.users, args.notifications, args.calls, args.only, args.factor)))
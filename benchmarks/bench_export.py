@@ -0,0 +1,92 @@
+"""Выгрузка заказов: пиковая память процесса и строк в секунду в зависимости от объема.
+
+Досеивает в orders до --rows строк (с date_created через секунду), затем выгружает
+последние N заказов (фильтр start) тем же генератором, что отдает тело ответа
+GET /export/orders, и выбрасывает куски. Для сравнения в конце - наивная выгрузка
+через session.execute(...).all() и сборку всего CSV в памяти.
+Запуск: python -m benchmarks.bench_export [--rows 10000000] [--format csv]
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select, text
+
+from api.routes.export import _csv_chunk, _export_rows
+from common import crud
+from common.models import Base, Order
+from benchmarks.utils import create_bench_engine, timer
+
+SEED_SQL = text("""
+    INSERT INTO orders (receipt_number, total_sum, drinks_count, sandwiches_count, use_points,
+                        used_points_amount, date_created)
+    SELECT 'BENCH-' || g, 300, 1, 0, false, 0, now() - g * interval '1 second'
+    FROM generate_series(1, :count) AS g
+""")
+
+
+def rss_mb():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+async def seed(session_factory, rows):
+    async with session_factory() as session:
+        existing = await session.scalar(select(func.count(Order.id)))
+        if existing < rows:
+            print(f"Досеиваем {rows - existing} заказов...")
+            await session.execute(SEED_SQL, {"count": rows - existing})
+            await session.commit()
+            await session.execute(text("ANALYZE orders"))
+
+
+async def streamed(fmt, start):
+    peak, size = rss_mb(), 0
+    async for chunk in _export_rows("orders", fmt, start, None):
+        size += len(chunk)
+        peak = max(peak, rss_mb())
+    return peak, size
+
+
+async def naive(session_factory, start):
+    peak = rss_mb()
+    columns, date_column = crud.EXPORTS["orders"]
+    async with session_factory() as session:
+        rows = (await session.execute(select(*columns).where(date_column >= start).order_by(date_column))).all()
+        peak = max(peak, rss_mb())
+        body = _csv_chunk(rows)
+        peak = max(peak, rss_mb())
+    return peak, len(body)
+
+
+async def main(rows, fmt):
+    engine, session_factory = create_bench_engine()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await seed(session_factory, rows)
+
+    print(f"{'rows':>10}{'MB':>10}{'rows/s':>12}{'peak RSS MB':>14}")
+    sizes = [n for n in (1_000, 100_000, 1_000_000, 10_000_000) if n <= rows]
+    for n in sizes:
+        start = datetime.now(timezone.utc) - timedelta(seconds=n)
+        with timer() as elapsed:
+            peak, size = await streamed(fmt, start)
+        print(f"{n:>10}{size / 2**20:>10.1f}{n / elapsed():>12.0f}{peak:>14.1f}")
+
+    n = min(rows, 1_000_000)
+    start = datetime.now(timezone.utc) - timedelta(seconds=n)
+    with timer() as elapsed:
+        peak, size = await naive(session_factory, start)
+    print(f"наивно, {n} строк: {n / elapsed():.0f} строк/с, пик RSS {peak:.1f} MB")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.format))
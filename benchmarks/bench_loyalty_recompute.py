@@ -0,0 +1,95 @@
+"""Пересчет уровней лояльности всех клиентов после смены порогов LOYALTY_LEVELS.
+
+Досеивает в users до --users клиентов с drinks_count от 0 до 149, затем меняет пороги
+и сравнивает: старый путь (check_and_update_loyalty_level по одному пользователю,
+на выборке --sample с пересчетом на всю таблицу), один UPDATE на всю таблицу и
+пачки по --chunk-size. Пороги подменяются на время прогона и пересчитывают всех клиентов
+базы, поэтому только на отдельной БД (BENCH_DATABASE_URL, см. benchmarks.utils); засеянные
+клиенты удаляются в конце.
+Запуск: python -m benchmarks.bench_loyalty_recompute [--users 1000000] [--chunk-size 50000] [--sample 2000]
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import delete, func, select, text
+
+from common import crud, utils
+from common.models import Base, User
+from benchmarks.utils import create_bench_engine, StatementCounter, timer
+
+SEED_SQL = text("""
+    INSERT INTO users (telegram_id, loyalty_status, points, drinks_count, sandwiches_count,
+                       gift_drinks, gift_sandwiches, is_active, role)
+    SELECT 'bench-lvl-' || g, 'standard', 0, g % 150, 0, 0, 0, true, 'client'
+    FROM generate_series(CAST(:start AS integer), CAST(:stop AS integer)) AS g
+""")
+
+# Два набора порогов: каждый прогон переводит между уровнями заметную часть клиентов
+THRESHOLDS = [
+    [("Стандарт", 0), ("Серебро", 20), ("Золото", 50), ("Платина", 100)],
+    [("Стандарт", 0), ("Серебро", 15), ("Золото", 40), ("Платина", 80)],
+]
+
+
+async def seed(session_factory, users):
+    async with session_factory() as session:
+        existing = await session.scalar(select(func.count(User.id)).where(User.telegram_id.like("bench-lvl-%")))
+        if existing < users:
+            print(f"Досеиваем {users - existing} клиентов...")
+            await session.execute(SEED_SQL, {"start": existing + 1, "stop": users})
+            await session.commit()
+            await session.execute(text("ANALYZE users"))
+        total = await session.scalar(select(func.count(User.id)))
+    return total
+
+
+async def main(users, chunk_size, sample):
+    engine, session_factory = create_bench_engine()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    total = await seed(session_factory, users)
+    counter = StatementCounter(engine)
+    original = utils.LOYALTY_LEVELS
+
+    try:
+        async with session_factory() as session:
+            utils.LOYALTY_LEVELS = THRESHOLDS[0]
+            await crud.recompute_loyalty_levels(session, chunk_size)
+
+            utils.LOYALTY_LEVELS = THRESHOLDS[1]
+            ids = (await session.scalars(
+                select(User.id).where(User.telegram_id.like("bench-lvl-%")).order_by(User.id).limit(sample)
+            )).all()
+            counter.reset()
+            with timer() as elapsed:
+                for user_id in ids:
+                    await crud.check_and_update_loyalty_level(session, user_id)
+            per_user = elapsed() / len(ids)
+            print(f"по одному: {per_user * 1000:.2f} мс/клиент, {counter.statements / len(ids):.1f} запроса/клиент, "
+                  f"на {total} клиентов ~{per_user * total:.0f} с")
+
+            for run, (name, size) in enumerate([("один UPDATE", 0), (f"пачки по {chunk_size}", chunk_size)]):
+                utils.LOYALTY_LEVELS = THRESHOLDS[(run + 1) % 2]
+                counter.reset()
+                with timer() as elapsed:
+                    moves = await crud.recompute_loyalty_levels(session, size)
+                print(f"{name}: {elapsed():.2f} с, запросов {counter.statements}, "
+                      f"сменили уровень {sum(moves.values())}")
+    finally:
+        # Пороги возвращаются, даже если прогон упал; остальные клиенты - к настоящим уровням
+        utils.LOYALTY_LEVELS = original
+        counter.close()
+        async with session_factory() as session:
+            await session.execute(delete(User).where(User.telegram_id.like("bench-lvl-%")))
+            await session.commit()
+            await crud.recompute_loyalty_levels(session, chunk_size)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    parser.add_argument("--sample", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.chunk_size, args.sample))
@@ -0,0 +1,64 @@
+"""Накладные расходы MetricsMiddleware относительно времени запроса к API.
+
+Прогоняет --calls вызовов пустого ASGI-приложения с middleware и без (лучший из --rounds
+замеров - меньше шума от соседних процессов) и сравнивает разницу со временем запроса
+к приложению API на роуте без БД (GET /users/cache/stats) - самом дешевом, поэтому оценка
+доли сверху. Если доля больше --max-share, код выхода 1.
+Запуск: python -m benchmarks.bench_metrics [--calls 20000] [--rounds 3] [--requests 500] [--max-share 0.02]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from types import SimpleNamespace
+
+from httpx import ASGITransport, AsyncClient
+
+from api.main import app
+from api.metrics import MetricsMiddleware
+
+
+async def bare(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def noop_send(message):
+    pass
+
+
+async def per_call(asgi_app, calls):
+    scope = {"type": "http", "method": "GET", "route": SimpleNamespace(path="/bench-metrics")}
+    started = time.perf_counter()
+    for _ in range(calls):
+        await asgi_app(dict(scope), None, noop_send)
+    return (time.perf_counter() - started) / calls
+
+
+async def request_time(requests):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        await client.get("/users/cache/stats")
+        started = time.perf_counter()
+        for _ in range(requests):
+            await client.get("/users/cache/stats")
+        return (time.perf_counter() - started) / requests
+
+
+async def main(calls, rounds, requests, max_share):
+    wrapped = MetricsMiddleware(bare)
+    overhead = min([await per_call(wrapped, calls) - await per_call(bare, calls) for _ in range(rounds)])
+    request = await request_time(requests)
+    share = overhead / request
+    print(f"middleware: {overhead * 1e6:.2f} мкс на запрос, запрос без БД: {request * 1e6:.0f} мкс, "
+          f"доля {share:.2%} (порог {max_share:.0%})")
+    return 1 if share > max_share else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--max-share", type=float, default=0.02)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.calls, args.rounds, args.requests, args.max_share)))
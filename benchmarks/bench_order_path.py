@@ -0,0 +1,74 @@
+"""Сравнение старого и нового пути проведения заказа (POST /orders/).
+
+Считает запросы, коммиты и round trip'ы на один заказ и среднее время.
+Запуск: python -m benchmarks.bench_order_path [--orders 200]
+"""
+import argparse
+import asyncio
+import uuid
+
+from common import crud
+from common.models import Base
+from benchmarks.utils import create_bench_engine, StatementCounter, timer
+
+
+async def legacy_order(session, **order):
+    # Путь до process_order: проверка пользователя, заказ, пересчет статистики
+    await crud.get_user_by_id(session, order["user_id"])
+    await crud.create_order(session, **order)
+    await crud.update_user_stats_after_order(
+        session, order["user_id"], order["drinks_count"], order["sandwiches_count"],
+        order["total_sum"], order["use_points"], order["used_points_amount"],
+    )
+
+
+async def single_transaction_order(session, **order):
+    await crud.process_order(session, **order)
+
+
+async def run(path, session_factory, counter, user_id, barista_id, code_id, orders):
+    counter.reset()
+    with timer() as elapsed:
+        for i in range(orders):
+            async with session_factory() as session:
+                await path(
+                    session, user_id=user_id, barista_id=barista_id, code_id=code_id,
+                    receipt_number=f"B-{i}", total_sum=350, drinks_count=1, sandwiches_count=1,
+                    use_points=False, used_points_amount=0,
+                )
+    stats = counter.snapshot()
+    return {
+        "statements": stats["statements"] / orders,
+        "commits": stats["commits"] / orders,
+        "round_trips": stats["round_trips"] / orders,
+        "ms_per_order": elapsed() * 1000 / orders,
+    }
+
+
+async def main(orders: int):
+    engine, session_factory = create_bench_engine()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_factory() as session:
+        suffix = uuid.uuid4().hex[:8]
+        user = await crud.create_user(session, telegram_id=f"bench-{suffix}")
+        barista = await crud.create_barista(session, telegram_id=f"bench-b-{suffix}")
+        code = await crud.generate_code(session, user.id)
+
+    counter = StatementCounter(engine)
+    results = {}
+    for name, path in (("before", legacy_order), ("after", single_transaction_order)):
+        results[name] = await run(path, session_factory, counter, user.id, barista.id, code.id, orders)
+    counter.close()
+    await engine.dispose()
+
+    print(f"{'path':<8}{'statements':>12}{'commits':>10}{'round trips':>13}{'ms/order':>10}")
+    for name, r in results.items():
+        print(f"{name:<8}{r['statements']:>12.1f}{r['commits']:>10.1f}{r['round_trips']:>13.1f}{r['ms_per_order']:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.orders))
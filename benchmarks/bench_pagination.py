@@ -0,0 +1,88 @@
+"""Задержка страницы списка заказов в зависимости от глубины: OFFSET против курсора.
+
+Досеивает в orders до --rows строк (INSERT ... SELECT generate_series), затем для разных
+глубин меряет страницу GET /orders/ в двух вариантах: старый OFFSET/LIMIT и
+crud.get_all_orders с курсором последней строки предыдущей страницы.
+Запуск: python -m benchmarks.bench_pagination [--rows 2000000] [--limit 100] [--repeat 5]
+"""
+import argparse
+import asyncio
+import statistics
+
+from sqlalchemy import func, select, text
+
+from common import crud
+from common.models import Base, Order
+from common.pagination import encode_cursor
+from benchmarks.utils import create_bench_engine, timer
+
+SEED_SQL = text("""
+    INSERT INTO orders (receipt_number, total_sum, drinks_count, sandwiches_count, use_points,
+                        used_points_amount, date_created)
+    SELECT 'BENCH-' || g, 300, 1, 0, false, 0, now() - g * interval '1 second'
+    FROM generate_series(1, :count) AS g
+""")
+
+
+async def seed(session_factory, rows):
+    async with session_factory() as session:
+        existing = await session.scalar(select(func.count(Order.id)))
+        if existing < rows:
+            print(f"Досеиваем {rows - existing} заказов...")
+            await session.execute(SEED_SQL, {"count": rows - existing})
+            await session.commit()
+            await session.execute(text("ANALYZE orders"))
+        return max(existing, rows)
+
+
+async def measure(coro_factory, repeat):
+    samples = []
+    for _ in range(repeat):
+        with timer() as elapsed:
+            await coro_factory()
+        samples.append(elapsed() * 1000)
+    return statistics.median(samples)
+
+
+async def main(rows, limit, repeat):
+    engine, session_factory = create_bench_engine()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    total = await seed(session_factory, rows)
+
+    depths = [d for d in (0, 1_000, 10_000, 100_000, 1_000_000, total - limit) if 0 <= d <= total - limit]
+    print(f"{'depth':>10}{'offset ms':>12}{'cursor ms':>12}")
+    async with session_factory() as session:
+        for depth in depths:
+            # Курсор - ключ последней строки предыдущей страницы (вычисляется вне замера)
+            cursor = None
+            if depth:
+                prev = (await session.execute(
+                    select(Order.date_created, Order.id)
+                    .order_by(Order.date_created.desc(), Order.id.desc())
+                    .offset(depth - 1).limit(1)
+                )).one()
+                cursor = encode_cursor(prev)
+
+            async def offset_page():
+                await session.execute(
+                    select(Order).order_by(Order.date_created.desc(), Order.id.desc()).offset(depth).limit(limit)
+                )
+
+            async def cursor_page():
+                await crud.get_all_orders(session, limit, cursor)
+
+            offset_ms = await measure(offset_page, repeat)
+            cursor_ms = await measure(cursor_page, repeat)
+            session.expunge_all()
+            print(f"{depth:>10}{offset_ms:>12.2f}{cursor_ms:>12.2f}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.limit, args.repeat))
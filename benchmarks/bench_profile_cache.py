@@ -0,0 +1,88 @@
+"""Чтение профиля (GET /users/{telegram_id}) с кэшем профилей и без него.
+
+Создает --users клиентов и делает --lookups чтений crud.get_profile по telegram_id
+с перекосом, как у живого трафика (вес клиента ~ 1/ранг), по сессии на чтение, как
+в API. Варианты: без кэша, локальный LRU, LRU + общий уровень в MemoryKV и, если
+задан --kv-url, LRU + Redis. Доля записей (--writes) сбрасывает профили через crud.
+Запуск: python -m benchmarks.bench_profile_cache [--users 2000] [--lookups 20000] [--writes 0.05]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+
+from sqlalchemy import insert, select
+
+from common import crud
+from common.kv import MemoryKV, create_kv
+from common.models import Base, User
+from common.profile_cache import ProfileCache
+from benchmarks.utils import create_bench_engine, StatementCounter, timer
+
+
+async def run(session_factory, counter, users, lookups, writes, cache):
+    crud.set_profile_cache(cache)
+    rng = random.Random(42)
+    picks = rng.choices(users, weights=[1 / (rank + 1) for rank in range(len(users))], k=lookups)
+    latencies = []
+    counter.reset()
+    with timer() as elapsed:
+        for user_id, telegram_id in picks:
+            if rng.random() < writes:
+                async with session_factory() as session:
+                    await crud.update_user(session, user_id, points=rng.randrange(1000))
+            started = time.perf_counter()
+            async with session_factory() as session:
+                await crud.get_profile(session, telegram_id=telegram_id)
+            latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        "rps": lookups / elapsed(),
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1000,
+        "queries": counter.statements / lookups,
+        "hit_ratio": cache.stats()["hit_ratio"] if cache else 0.0,
+    }
+
+
+async def main(users, lookups, writes, kv_url):
+    engine, session_factory = create_bench_engine()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    prefix = f"bench-prof-{uuid.uuid4().hex[:8]}"
+    async with session_factory() as session:
+        await session.execute(insert(User), [{"telegram_id": f"{prefix}-{i}"} for i in range(users)])
+        await session.commit()
+        rows = (await session.execute(
+            select(User.id, User.telegram_id).where(User.telegram_id.like(f"{prefix}-%")).order_by(User.id)
+        )).all()
+    counter = StatementCounter(engine)
+
+    variants = [
+        ("без кэша", None),
+        ("LRU", ProfileCache(max_size=users)),
+        ("LRU + MemoryKV", ProfileCache(max_size=users, kv=MemoryKV())),
+    ]
+    if kv_url:
+        variants.append(("LRU + Redis", ProfileCache(max_size=users, kv=create_kv(kv_url))))
+
+    print(f"{'вариант':<16}{'чтений/с':>10}{'p50 мс':>9}{'p99 мс':>9}{'запросов':>10}{'попаданий':>11}")
+    for name, cache in variants:
+        result = await run(session_factory, counter, rows, lookups, writes, cache)
+        print(f"{name:<16}{result['rps']:>10.0f}{result['p50']:>9.3f}{result['p99']:>9.3f}"
+              f"{result['queries']:>10.2f}{result['hit_ratio']:>11.1%}")
+    crud.set_profile_cache(None)
+    counter.close()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--writes", type=float, default=0.05, help="доля итераций с записью в профиль")
+    parser.add_argument("--kv-url", default="", help="redis://... для общего уровня в Redis")
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.lookups, args.writes, args.kv_url))
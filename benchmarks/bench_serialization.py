@@ -0,0 +1,81 @@
+"""Сериализация списка заказов: путь FastAPI через response_model и быстрый путь api.serialization.
+
+Строит --rows заказов (ORM-объекты без БД) и --repeat раз собирает тело ответа
+Page[OrderOut] двумя способами:
+- model: OrderOut.model_validate на каждую строку, затем то, что делает FastAPI с
+  возвращенной моделью, - повторная валидация по response_model, jsonable_encoder и
+  JSONResponse (json.dumps);
+- fast: page_response - одна валидация списка TypeAdapter'ом по __dict__ строк и dump_json
+  в pydantic-core.
+Печатает время на ответ, ускорение и пик выделенной памяти (tracemalloc).
+Запуск: python -m benchmarks.bench_serialization [--rows 10000] [--repeat 20]
+"""
+import argparse
+import asyncio
+import json
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from api.serialization import page_response
+from common.models import Order
+from common.schemas import OrderOut, Page
+from benchmarks.utils import timer
+
+FIELD = create_response_field("Response_list_orders", Page[OrderOut])
+
+
+def make_orders(rows):
+    started = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [
+        Order(id=i, user_id=i % 500, barista_id=1, code_id=i, receipt_number=f"R-{i:06d}", total_sum=150 + i % 700,
+              drinks_count=1 + i % 3, sandwiches_count=i % 2, use_points=False, used_points_amount=0,
+              date_created=started + timedelta(minutes=i))
+        for i in range(rows)
+    ]
+
+
+async def model_path(orders):
+    page = Page[OrderOut](items=[OrderOut.model_validate(o) for o in orders], next_cursor="cursor")
+    content = await serialize_response(field=FIELD, response_content=page, is_coroutine=True)
+    return JSONResponse(content).body
+
+
+async def fast_path(orders):
+    return page_response(OrderOut, orders, "cursor").body
+
+
+async def measure(path, orders, repeat):
+    body = await path(orders)  # прогрев (сборка адаптера, кэши pydantic)
+    with timer() as elapsed:
+        for _ in range(repeat):
+            await path(orders)
+    seconds = elapsed() / repeat
+    tracemalloc.start()
+    await path(orders)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak, body
+
+
+async def main(rows, repeat):
+    orders = make_orders(rows)
+    results = {}
+    for name, path in (("model", model_path), ("fast", fast_path)):
+        results[name] = await measure(path, orders, repeat)
+        seconds, peak, body = results[name]
+        print(f"{name:>5}: {seconds * 1000:8.1f} мс на ответ, пик памяти {peak / 2**20:6.1f} МБ, тело {len(body) / 2**20:.1f} МБ")
+    assert json.loads(results["model"][2]) == json.loads(results["fast"][2])
+    print(f"ускорение x{results['model'][0] / results['fast'][0]:.1f}, "
+          f"пик памяти x{results['model'][1] / results['fast'][1]:.1f} меньше")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.repeat))
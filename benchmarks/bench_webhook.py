@@ -0,0 +1,100 @@
+"""Пропускная способность вебхук-режима бота на синтетических апдейтах Telegram.
+
+Поднимает WebhookReceiver на localhost с хендлером-заглушкой (имитирует обращение
+к API через asyncio.sleep) и шлет ему POST-запросы с апдейтами, как это делает Telegram.
+Реальный Telegram API не нужен: хендлер не отвечает в чат.
+Запуск: python -m benchmarks.bench_webhook [--updates 2000] [--workers 16] [--handler-ms 5]
+"""
+import argparse
+import asyncio
+import socket
+import time
+
+import aiohttp
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+from aiohttp import web
+
+from benchmarks.utils import percentile
+from common.bot_runner import WebhookReceiver, create_webhook_app
+
+PATH = "/webhook/bench"
+
+
+def synthetic_update(update_id):
+    chat_id = 100000 + update_id % 500
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Бенч"},
+            "text": "Сгенерировать код",
+        },
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def main(updates, workers, handler_ms, concurrency):
+    router = Router()
+
+    @router.message()
+    async def handler(msg: Message):
+        await asyncio.sleep(handler_ms / 1000)
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot(token="42:BENCH")
+    latencies = []
+    done = asyncio.Event()
+
+    def on_processed(_update, seconds):
+        latencies.append(seconds * 1000)
+        if len(latencies) == updates:
+            done.set()
+
+    receiver = WebhookReceiver(dp, bot, workers=workers, queue_size=updates, on_processed=on_processed)
+    runner = web.AppRunner(create_webhook_app(receiver, PATH))
+    await runner.setup()
+    port = free_port()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    url = f"http://127.0.0.1:{port}{PATH}"
+    acks = []
+    semaphore = asyncio.Semaphore(concurrency)
+    async with aiohttp.ClientSession() as http:
+        async def post(update_id):
+            async with semaphore:
+                sent = time.perf_counter()
+                async with http.post(url, json=synthetic_update(update_id)) as response:
+                    assert response.status == 200, response.status
+                acks.append((time.perf_counter() - sent) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[post(i) for i in range(1, updates + 1)])
+        await done.wait()
+        elapsed = time.perf_counter() - started
+
+    await runner.cleanup()
+    await bot.session.close()
+    print(f"updates={updates} workers={workers} handler={handler_ms}ms")
+    print(f"throughput: {updates / elapsed:.0f} updates/s")
+    print(f"ack latency: p50 {percentile(acks, 50):.2f} ms, p99 {percentile(acks, 99):.2f} ms")
+    print(f"handler latency (queued + handled): p50 {percentile(latencies, 50):.2f} ms, "
+          f"p99 {percentile(latencies, 99):.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--handler-ms", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.updates, args.workers, args.handler_ms, args.concurrency))
@@ -0,0 +1,324 @@
+"""Нагрузочный тест "утренний час пик": смешанный трафик клиентов, бариста и админа к API.
+
+Создает в БД --customers клиентов и --baristas бариста и --duration секунд гоняет:
+- клиент: профиль (GET /users/{telegram_id}), код (POST /codes/generate), встает с кодом
+  в очередь к стойке, после обслуживания - пауза со средним --think секунд;
+- бариста: берет код из очереди, гасит его (POST /codes/use), читает профиль клиента и
+  проводит заказ (POST /orders/);
+- админ: раз в --admin-interval секунд открывает дашборд (GET /analytics/dashboard).
+Очередь у стойки ограничена (по два клиента на бариста): клиенты ждут, как в кофейне.
+
+Без --url поднимает API отдельным процессом (uvicorn, --workers) на БД бенчмарков
+(BENCH_DATABASE_URL, см. benchmarks.utils) с выключенными лимитами slowapi - весь трафик
+идет с одного адреса. С --url клиенты засеиваются в BENCH_DATABASE_URL: API по адресу
+должен работать с той же БД.
+Сценарий повторяется --runs раз; по каждому роуту печатаются RPS и медианы p50/p95/p99
+по прогонам - один прогон на общей машине шумит до ~30%. --save пишет результат в
+benchmarks/results/<дата>-<коммит>.json (каталог не в git: эталон снимает CI на своей
+машине), --compare сравнивает с сохраненным: при росте медианы p95 любого роута больше чем
+на --max-regression или доле ошибок выше --max-errors код выхода 1. Роуты, где в этом или
+эталонном результате меньше --min-requests запросов, не сравниваются: p95 по нескольким
+запросам - это их максимум.
+Запуск: python -m benchmarks.load_test [--customers 200] [--baristas 10] [--duration 30]
+        [--runs 3] [--workers 1] [--url http://...] [--save] [--compare benchmarks/results/....json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import statistics
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+from sqlalchemy import insert
+from sqlalchemy.engine import make_url
+
+from common.models import Barista, Base, User
+from benchmarks.utils import BENCH_DATABASE_URL, create_bench_engine, percentile
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+class RouteStats:
+    """Задержки и ошибки по шаблону роута (не по конкретному пути)"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+
+    async def call(self, client: httpx.AsyncClient, route: str, path: str, **kwargs):
+        """JSON ответа или None при ошибке; route - "МЕТОД /шаблон" для отчета"""
+        method = route.split(" ", 1)[0]
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            response = None
+        self.latencies[route].append((time.perf_counter() - started) * 1000)
+        if response is None or response.status_code != 200:
+            self.errors[route] += 1
+            return None
+        return response.json()
+
+    def report(self, elapsed: float) -> dict:
+        routes = {}
+        for route in sorted(self.latencies):
+            latencies = self.latencies[route]
+            routes[route] = {
+                "requests": len(latencies),
+                "errors": self.errors[route],
+                "rps": len(latencies) / elapsed,
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+            }
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        return {
+            "routes": routes,
+            "total": {"requests": total, "errors": sum(self.errors.values()), "rps": total / elapsed},
+        }
+
+
+async def customer(client, stats, user, counter, deadline, think, rng):
+    user_id, telegram_id = user
+    while time.monotonic() < deadline:
+        await stats.call(client, "GET /users/{telegram_id}", f"/users/{telegram_id}")
+        code = await stats.call(client, "POST /codes/generate", "/codes/generate", params={"user_id": user_id})
+        if code is not None:
+            served = asyncio.Event()
+            await counter.put((user, code["code"], served))
+            await served.wait()
+        await asyncio.sleep(min(rng.expovariate(1 / think), max(0.0, deadline - time.monotonic())))
+
+
+async def barista(client, stats, barista_id, counter, deadline, rng):
+    while True:
+        (user_id, telegram_id), code_value, served = await counter.get()
+        try:
+            code = await stats.call(client, "POST /codes/use", "/codes/use", params={"code_value": code_value})
+            if code is None:
+                continue
+            await stats.call(client, "GET /users/{telegram_id}", f"/users/{telegram_id}")
+            drinks = rng.randint(1, 3)
+            await stats.call(client, "POST /orders/", "/orders/", json={
+                "user_id": user_id, "barista_id": barista_id, "code_id": code["id"],
+                "receipt_number": f"LT-{uuid.uuid4().hex[:10]}", "total_sum": drinks * rng.randint(150, 350),
+                "drinks_count": drinks, "sandwiches_count": rng.randint(0, 1),
+            })
+        finally:
+            served.set()
+
+
+async def admin(client, stats, deadline, interval):
+    while time.monotonic() < deadline:
+        await stats.call(client, "GET /analytics/dashboard", "/analytics/dashboard")
+        await asyncio.sleep(min(interval, max(0.0, deadline - time.monotonic())))
+
+
+async def seed(session_factory, customers, baristas):
+    """Клиенты и бариста этого прогона: ([(id, telegram_id)], [barista.id])"""
+    prefix = f"load-{uuid.uuid4().hex[:8]}"
+    async with session_factory() as session:
+        users = (await session.execute(
+            insert(User).returning(User.id, User.telegram_id),
+            [{"telegram_id": f"{prefix}-{i}", "first_name": f"Гость {i}"} for i in range(customers)],
+        )).all()
+        barista_ids = (await session.scalars(
+            insert(Barista).returning(Barista.id),
+            [{"telegram_id": f"{prefix}-b{i}"} for i in range(baristas)],
+        )).all()
+        await session.commit()
+    return [tuple(user) for user in users], list(barista_ids)
+
+
+async def run(client: httpx.AsyncClient, users, barista_ids, duration, think=2.0, admin_interval=5.0, seed_=42):
+    """Гоняет трафик duration секунд через client и возвращает отчет RouteStats.report"""
+    rng = random.Random(seed_)
+    stats = RouteStats()
+    counter = asyncio.Queue(maxsize=2 * len(barista_ids))
+    started = time.monotonic()
+    deadline = started + duration
+    staff = [asyncio.create_task(barista(client, stats, barista_id, counter, deadline, random.Random(rng.random())))
+             for barista_id in barista_ids]
+    # Клиенты приходят не одновременно, а в течение первой паузы
+    visitors = [customer(client, stats, user, counter, deadline, think, random.Random(rng.random()))
+                for user in users]
+    await asyncio.gather(admin(client, stats, deadline, admin_interval), *[
+        _after(rng.uniform(0, think), visit) for visit in visitors
+    ])
+    elapsed = time.monotonic() - started
+    for task in staff:
+        task.cancel()
+    await asyncio.gather(*staff, return_exceptions=True)
+    return stats.report(elapsed)
+
+
+def combine(reports):
+    """Отчет по нескольким прогонам: запросы и ошибки - суммы, RPS и перцентили - медианы"""
+    routes = {}
+    for route in sorted({route for report in reports for route in report["routes"]}):
+        rows = [report["routes"][route] for report in reports if route in report["routes"]]
+        routes[route] = {
+            "requests": sum(row["requests"] for row in rows),
+            "errors": sum(row["errors"] for row in rows),
+            **{key: statistics.median(row[key] for row in rows) for key in ("rps", "p50", "p95", "p99")},
+            "p95_runs": [row["p95"] for row in rows],
+        }
+    totals = [report["total"] for report in reports]
+    return {
+        "runs": len(reports),
+        "routes": routes,
+        "total": {"requests": sum(total["requests"] for total in totals),
+                  "errors": sum(total["errors"] for total in totals),
+                  "rps": statistics.median(total["rps"] for total in totals)},
+    }
+
+
+async def _after(delay, coro):
+    await asyncio.sleep(delay)
+    await coro
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def start_api(workers):
+    """API отдельным процессом uvicorn; возвращает (процесс, base_url)"""
+    port = free_port()
+    # ENV=dev включает echo SQL в API - это измеряло бы логирование, а не API
+    # WEB_CONCURRENCY - чтобы API знал число процессов (кэш профилей без общего KV - только при одном)
+    env = {"ENV": "production", **os.environ, "RATE_LIMIT_ENABLED": "false", "WEB_CONCURRENCY": str(workers)}
+    # API собирает адрес БД из POSTGRES_*: направляем его на БД бенчмарков
+    url = make_url(BENCH_DATABASE_URL)
+    env.update(POSTGRES_HOST=url.host or "", POSTGRES_PORT=str(url.port or 5432), POSTGRES_DB=url.database or "",
+               POSTGRES_USER=url.username or "", POSTGRES_PASSWORD=url.password or "")
+    process = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "api.main:app", "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning",
+    ], env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        for _ in range(200):
+            if process.poll() is not None:
+                raise RuntimeError(f"API не запустился (код {process.returncode})")
+            try:
+                if (await client.get("/users/cache/stats")).status_code == 200:
+                    return process, base_url
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("API не ответил за 20 секунд")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(result, baseline=None, min_requests=0):
+    print(f"{'роут':<28}{'запросов':>9}{'ошибок':>8}{'RPS':>8}{'p50 мс':>9}{'p95 мс':>9}{'p99 мс':>9}"
+          + (f"{'p95 было':>10}{'изм.':>8}" if baseline else ""))
+    for route, row in result["routes"].items():
+        line = (f"{route:<28}{row['requests']:>9}{row['errors']:>8}{row['rps']:>8.1f}"
+                f"{row['p50']:>9.1f}{row['p95']:>9.1f}{row['p99']:>9.1f}")
+        before = baseline["routes"].get(route) if baseline else None
+        if before:
+            line += f"{before['p95']:>10.1f}{row['p95'] / before['p95'] - 1:>+8.0%}"
+            if min(row["requests"], before["requests"]) < min_requests:
+                line += "  не сравнивается: мало запросов"
+        print(line)
+    total = result["total"]
+    print(f"{'всего':<28}{total['requests']:>9}{total['errors']:>8}{total['rps']:>8.1f}")
+
+
+def regressions(result, baseline, max_regression, max_errors, min_requests=0):
+    """Список проблем для CI: рост p95 по роутам относительно baseline и доля ошибок.
+
+    Роуты, где здесь или в baseline меньше min_requests запросов, по p95 не сравниваются.
+    """
+    problems = []
+    total = result["total"]
+    if total["requests"] and total["errors"] / total["requests"] > max_errors:
+        problems.append(f"ошибок {total['errors']} из {total['requests']}")
+    for route, row in result["routes"].items():
+        before = (baseline or {}).get("routes", {}).get(route)
+        if not before or min(row["requests"], before["requests"]) < min_requests:
+            continue
+        if row["p95"] > before["p95"] * (1 + max_regression):
+            problems.append(f"{route}: p95 {before['p95']:.1f} -> {row['p95']:.1f} мс")
+    return problems
+
+
+async def main(args):
+    engine, session_factory = create_bench_engine()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    users, barista_ids = await seed(session_factory, args.customers, args.baristas)
+    await engine.dispose()
+    process, base_url = (None, args.url) if args.url else await start_api(args.workers)
+    try:
+        limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+            reports = [await run(client, users, barista_ids, args.duration, args.think, args.admin_interval)
+                       for _ in range(args.runs)]
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    result = {
+        "commit": git_commit(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "config": {key: getattr(args, key) for key in
+                   ("customers", "baristas", "duration", "runs", "think", "admin_interval", "workers",
+                    "connections")},
+        **combine(reports),
+    }
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    if baseline and baseline["config"] != result["config"]:
+        print(f"внимание: параметры прогона отличаются от {args.compare}: {baseline['config']}")
+    print_report(result, baseline, args.min_requests)
+    if args.save:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        path = RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{result['commit']}.json"
+        path.write_text(json.dumps(result, ensure_ascii=False, indent=2))
+        print(f"сохранено: {path}")
+    problems = regressions(result, baseline, args.max_regression, args.max_errors, args.min_requests)
+    for problem in problems:
+        print(f"РЕГРЕССИЯ: {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=200)
+    parser.add_argument("--baristas", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30, help="секунд трафика")
+    parser.add_argument("--runs", type=int, default=3, help="повторов сценария, сравниваются медианы")
+    parser.add_argument("--think", type=float, default=2.0, help="средняя пауза клиента между визитами, с")
+    parser.add_argument("--admin-interval", type=float, default=5.0, help="период обновления дашборда, с")
+    parser.add_argument("--workers", type=int, default=1, help="процессов uvicorn (без --url)")
+    parser.add_argument("--connections", type=int, default=100, help="соединений в пуле клиента")
+    parser.add_argument("--url", default="", help="адрес уже запущенного API вместо локального процесса")
+    parser.add_argument("--save", action="store_true", help="сохранить результат в benchmarks/results")
+    parser.add_argument("--compare", default="", help="JSON прошлого прогона для сравнения")
+    # Шум одного прогона на общей машине - до ~30%, порог выше него
+    parser.add_argument("--max-regression", type=float, default=0.5, help="допустимый рост медианы p95 (доля)")
+    parser.add_argument("--min-requests", type=int, default=30, help="меньше запросов роута - p95 не сравнивается")
+    parser.add_argument("--max-errors", type=float, default=0.01, help="допустимая доля ошибок")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,101 @@
+import os
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from api.config import settings
+
+BENCH_DATABASE_URL = os.getenv("BENCH_DATABASE_URL", "")
+
+
+def _database(url):
+    url = make_url(url)
+    return url.host, url.port or 5432, url.database
+
+
+def create_bench_engine():
+    """Движок для бенчмарков на отдельной БД BENCH_DATABASE_URL.
+
+    Бенчмарки досеивают сотни тысяч строк, выдают подарки и меняют уровни, поэтому на БД
+    приложения (settings.DATABASE_URL) и без явно заданной БД не запускаются.
+    """
+    if not BENCH_DATABASE_URL:
+        raise SystemExit("Задайте BENCH_DATABASE_URL - отдельную БД для бенчмарков")
+    if _database(BENCH_DATABASE_URL) == _database(settings.DATABASE_URL):
+        raise SystemExit("BENCH_DATABASE_URL указывает на БД приложения - нужна отдельная БД")
+    engine = create_async_engine(BENCH_DATABASE_URL, future=True)
+    return engine, async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+
+
+class StatementCounter:
+    """Считает запросы, BEGIN/COMMIT/ROLLBACK - то есть сетевые round trip'ы к БД"""
+
+    def __init__(self, engine):
+        self.sync_engine = engine.sync_engine
+        self.reset()
+        event.listen(self.sync_engine, "before_cursor_execute", self._on_execute)
+        event.listen(self.sync_engine, "begin", self._on_begin)
+        event.listen(self.sync_engine, "commit", self._on_commit)
+        event.listen(self.sync_engine, "rollback", self._on_rollback)
+
+    def reset(self):
+        self.statements = 0
+        self.begins = 0
+        self.commits = 0
+        self.rollbacks = 0
+
+    def _on_execute(self, *args):
+        self.statements += 1
+
+    def _on_begin(self, *args):
+        self.begins += 1
+
+    def _on_commit(self, *args):
+        self.commits += 1
+
+    def _on_rollback(self, *args):
+        self.rollbacks += 1
+
+    @property
+    def round_trips(self):
+        return self.statements + self.begins + self.commits + self.rollbacks
+
+    def snapshot(self):
+        return {
+            "statements": self.statements,
+            "commits": self.commits,
+            "round_trips": self.round_trips,
+        }
+
+    def close(self):
+        event.remove(self.sync_engine, "before_cursor_execute", self._on_execute)
+        event.remove(self.sync_engine, "begin", self._on_begin)
+        event.remove(self.sync_engine, "commit", self._on_commit)
+        event.remove(self.sync_engine, "rollback", self._on_rollback)
+
+
+@contextmanager
+def timer():
+    """with timer() as t: ...; t() - прошедшее время в секундах"""
+    start = time.perf_counter()
+    elapsed = None
+
+    def get():
+        return elapsed if elapsed is not None else time.perf_counter() - start
+
+    try:
+        yield get
+    finally:
+        elapsed = time.perf_counter() - start
+
+
+def percentile(values, pct):
+    """Перцентиль по отсортированной копии (без numpy)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
@@ -3,10 +3,9 @@ from aiogram.filters import CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.utils.keyboard import ReplyKeyboardBuilder
-import httpx
 import logging
 from common import buttons, messages
-from client_bot.config import API_BASE_URL
+from common.api_client import ApiClient
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -14,30 +13,6 @@ logger = logging.getLogger(__name__)
 
 router = Router()
 
-# Универсальная функция для API вызовов с обработкой ошибок
-async def safe_api_call(url: str, method: str = "GET", json_data: dict = None, params: dict = None):
-    """Безопасный вызов API с обработкой ошибок"""
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            if method.upper() == "GET":
-                response = await client.get(url, params=params)
-            elif method.upper() == "POST":
-                response = await client.post(url, json=json_data, params=params)
-            else:
-                logger.error(f"Неподдерживаемый HTTP метод: {method}")
-                return None, 500
-            
-            return response.json() if response.status_code == 200 else None, response.status_code
-    except httpx.TimeoutException:
-        logger.error(f"Timeout при обращении к {url}")
-        return None, 408
-    except httpx.RequestError as e:
-        logger.error(f"Ошибка запроса к {url}: {e}")
-        return None, 500
-    except Exception as e:
-        logger.error(f"Неожиданная ошибка при обращении к {url}: {e}")
-        return None, 500
-
 class RegisterState(StatesGroup):
     waiting_for_phone = State()
     waiting_for_first_name = State()
@@ -61,8 +36,8 @@ async def start(msg: types.Message, state: FSMContext):
     await msg.answer(messages.WELCOME_MSG, reply_markup=kb_start())
 
 @router.message(F.text == buttons.BTN_START)
-async def register(msg: types.Message, state: FSMContext):
-    user_data, status_code = await safe_api_call(f"{API_BASE_URL}/users/{msg.from_user.id}")
+async def register(msg: types.Message, state: FSMContext, api: ApiClient):
+    user_data, status_code = await api.get_user(msg.from_user.id)
     if status_code == 200 and user_data:
         await msg.answer(messages.REGISTRATION_SUCCESS, reply_markup=kb_main())
         await state.clear()
@@ -107,7 +82,7 @@ async def get_birthdate(msg: types.Message, state: FSMContext):
     await state.set_state(RegisterState.confirm)
 
 @router.message(RegisterState.confirm, F.text == buttons.BTN_CONFIRM)
-async def register_confirm(msg: types.Message, state: FSMContext):
+async def register_confirm(msg: types.Message, state: FSMContext, api: ApiClient):
     data = await state.get_data()
     user_data = {
         "telegram_id": str(msg.from_user.id),
@@ -117,7 +92,7 @@ async def register_confirm(msg: types.Message, state: FSMContext):
         "birth_date": data.get("birth_date"),
     }
     
-    result, status_code = await safe_api_call(f"{API_BASE_URL}/users/", "POST", user_data)
+    result, status_code = await api.register_user(user_data)
     if status_code == 200 and result:
         await msg.answer(messages.REGISTRATION_SUCCESS, reply_markup=kb_main())
         await state.clear()
@@ -131,8 +106,8 @@ async def register_confirm(msg: types.Message, state: FSMContext):
         await state.clear()
 
 @router.message(F.text == buttons.BTN_PROFILE)
-async def show_profile(msg: types.Message, state: FSMContext):
-    user_data, status_code = await safe_api_call(f"{API_BASE_URL}/users/{msg.from_user.id}")
+async def show_profile(msg: types.Message, state: FSMContext, api: ApiClient):
+    user_data, status_code = await api.get_user(msg.from_user.id)
     if status_code == 200 and user_data:
         await msg.answer(messages.PROFILE_TEMPLATE.format(**user_data), reply_markup=kb_main())
     elif status_code == 404:
@@ -141,18 +116,17 @@ async def show_profile(msg: types.Message, state: FSMContext):
         await msg.answer("Ошибка при получении профиля. Попробуйте позже.", reply_markup=kb_main())
 
 @router.message(F.text == buttons.BTN_GEN_CODE)
-async def gen_code(msg: types.Message, state: FSMContext):
-    async with httpx.AsyncClient() as client:
-        r = await client.post(f"{API_BASE_URL}/codes/generate", params={"user_id": msg.from_user.id})
-    if r.status_code == 200:
-        code = r.json()["code"]
+async def gen_code(msg: types.Message, state: FSMContext, api: ApiClient):
+    code_data, status_code = await api.generate_code(msg.from_user.id)
+    if status_code == 200:
+        code = code_data["code"]
         await msg.answer(messages.CODE_GENERATED.format(code=code), reply_markup=types.ReplyKeyboardMarkup(keyboard=[[types.KeyboardButton(text=buttons.BTN_GEN_NEW_CODE)], [types.KeyboardButton(text=buttons.BTN_BACK)]], resize_keyboard=True))
     else:
         await msg.answer("Ошибка генерации кода.", reply_markup=kb_main())
 
 @router.message(F.text == buttons.BTN_GEN_NEW_CODE)
-async def gen_new_code(msg: types.Message, state: FSMContext):
-    await gen_code(msg, state)
+async def gen_new_code(msg: types.Message, state: FSMContext, api: ApiClient):
+    await gen_code(msg, state, api)
 
 @router.message(F.text == buttons.BTN_BACK)
 async def back_to_main(msg: types.Message, state: FSMContext):
@@ -196,7 +170,7 @@ async def start_feedback(msg: types.Message, state: FSMContext):
     await state.set_state(FeedbackState.waiting_for_score)
 
 @router.message(FeedbackState.waiting_for_score)
-async def get_feedback_score(msg: types.Message, state: FSMContext):
+async def get_feedback_score(msg: types.Message, state: FSMContext, api: ApiClient):
     if msg.text == buttons.BTN_BACK_FEEDBACK:
         await feedback_menu(msg, state)
         return
@@ -210,7 +184,7 @@ async def get_feedback_score(msg: types.Message, state: FSMContext):
                     keyboard=[[types.KeyboardButton(text=buttons.BTN_SEND)], [types.KeyboardButton(text=buttons.BTN_BACK_FEEDBACK)]], 
                     resize_keyboard=True))
                 # Сразу отправляем положительный отзыв
-                await send_feedback_to_api(msg, state, score, "Положительный отзыв")
+                await send_feedback_to_api(msg, state, api, score, "Положительный отзыв")
             else:
                 await msg.answer(messages.FEEDBACK_THANKS_NEGATIVE, reply_markup=types.ReplyKeyboardMarkup(
                     keyboard=[[types.KeyboardButton(text=buttons.BTN_BACK_FEEDBACK)]], resize_keyboard=True))
@@ -221,32 +195,30 @@ async def get_feedback_score(msg: types.Message, state: FSMContext):
         await msg.answer("Пожалуйста, введите число от 1 до 10")
 
 @router.message(FeedbackState.waiting_for_feedback_text)
-async def get_feedback_text(msg: types.Message, state: FSMContext):
+async def get_feedback_text(msg: types.Message, state: FSMContext, api: ApiClient):
     if msg.text == buttons.BTN_BACK_FEEDBACK:
         await feedback_menu(msg, state)
         return
     
     data = await state.get_data()
-    await send_feedback_to_api(msg, state, data['score'], msg.text)
+    await send_feedback_to_api(msg, state, api, data['score'], msg.text)
 
-async def send_feedback_to_api(msg: types.Message, state: FSMContext, score: int, text: str):
-    async with httpx.AsyncClient() as client:
-        # Сначала получим ID пользователя
-        user_response = await client.get(f"{API_BASE_URL}/users/{msg.from_user.id}")
-        if user_response.status_code == 200:
-            user_id = user_response.json()["id"]
-            feedback_data = {
-                "user_id": user_id,
-                "score": score,
-                "text": text
-            }
-            response = await client.post(f"{API_BASE_URL}/feedback/review", json=feedback_data)
-            if response.status_code == 200:
-                await msg.answer(messages.FEEDBACK_SENT, reply_markup=kb_main())
-            else:
-                await msg.answer("Произошла ошибка при отправке отзыва", reply_markup=kb_main())
+async def send_feedback_to_api(msg: types.Message, state: FSMContext, api: ApiClient, score: int, text: str):
+    # Сначала получим ID пользователя
+    user, status_code = await api.get_user(msg.from_user.id)
+    if status_code == 200:
+        feedback_data = {
+            "user_id": user["id"],
+            "score": score,
+            "text": text
+        }
+        _, status_code = await api.send_feedback(feedback_data)
+        if status_code == 200:
+            await msg.answer(messages.FEEDBACK_SENT, reply_markup=kb_main())
         else:
-            await msg.answer("Ошибка: пользователь не найден", reply_markup=kb_main())
+            await msg.answer("Произошла ошибка при отправке отзыва", reply_markup=kb_main())
+    else:
+        await msg.answer("Ошибка: пользователь не найден", reply_markup=kb_main())
     await state.clear()
 
 @router.message(F.text == buttons.BTN_LEAVE_IDEA)
@@ -258,27 +230,25 @@ async def start_idea(msg: types.Message, state: FSMContext):
     await state.set_state(FeedbackState.waiting_for_idea_text)
 
 @router.message(FeedbackState.waiting_for_idea_text)
-async def get_idea_text(msg: types.Message, state: FSMContext):
+async def get_idea_text(msg: types.Message, state: FSMContext, api: ApiClient):
     if msg.text == buttons.BTN_BACK_FEEDBACK:
         await feedback_menu(msg, state)
         return
     
-    async with httpx.AsyncClient() as client:
-        # Получаем ID пользователя
-        user_response = await client.get(f"{API_BASE_URL}/users/{msg.from_user.id}")
-        if user_response.status_code == 200:
-            user_id = user_response.json()["id"]
-            idea_data = {
-                "user_id": user_id,
-                "text": msg.text
-            }
-            response = await client.post(f"{API_BASE_URL}/feedback/idea", json=idea_data)
-            if response.status_code == 200:
-                await msg.answer(messages.IDEA_SENT, reply_markup=kb_main())
-            else:
-                await msg.answer("Произошла ошибка при отправке идеи", reply_markup=kb_main())
+    # Получаем ID пользователя
+    user, status_code = await api.get_user(msg.from_user.id)
+    if status_code == 200:
+        idea_data = {
+            "user_id": user["id"],
+            "text": msg.text
+        }
+        _, status_code = await api.send_idea(idea_data)
+        if status_code == 200:
+            await msg.answer(messages.IDEA_SENT, reply_markup=kb_main())
         else:
-            await msg.answer("Ошибка: пользователь не найден", reply_markup=kb_main())
+            await msg.answer("Произошла ошибка при отправке идеи", reply_markup=kb_main())
+    else:
+        await msg.answer("Ошибка: пользователь не найден", reply_markup=kb_main())
     await state.clear()
 
 @router.message(F.text == buttons.BTN_CONTACT_ADMIN)
@@ -290,28 +260,26 @@ async def start_admin_contact(msg: types.Message, state: FSMContext):
     await state.set_state(FeedbackState.waiting_for_admin_message)
 
 @router.message(FeedbackState.waiting_for_admin_message)
-async def get_admin_message(msg: types.Message, state: FSMContext):
+async def get_admin_message(msg: types.Message, state: FSMContext, api: ApiClient):
     if msg.text == buttons.BTN_BACK_FEEDBACK:
         await feedback_menu(msg, state)
         return
     
-    async with httpx.AsyncClient() as client:
-        # Получаем информацию о пользователе
-        user_response = await client.get(f"{API_BASE_URL}/users/{msg.from_user.id}")
-        if user_response.status_code == 200:
-            user = user_response.json()
-            # Отправляем как идею с пометкой "Сообщение для руководства"
-            idea_data = {
-                "user_id": user["id"],
-                "text": f"📞 Сообщение для руководства от {user['first_name']} {user['last_name']}:\n\n{msg.text}"
-            }
-            response = await client.post(f"{API_BASE_URL}/feedback/idea", json=idea_data)
-            if response.status_code == 200:
-                await msg.answer("Ваше сообщение отправлено руководству!", reply_markup=kb_main())
-            else:
-                await msg.answer("Произошла ошибка при отправке сообщения", reply_markup=kb_main())
+    # Получаем информацию о пользователе
+    user, status_code = await api.get_user(msg.from_user.id)
+    if status_code == 200:
+        # Отправляем как идею с пометкой "Сообщение для руководства"
+        idea_data = {
+            "user_id": user["id"],
+            "text": f"📞 Сообщение для руководства от {user['first_name']} {user['last_name']}:\n\n{msg.text}"
+        }
+        _, status_code = await api.send_idea(idea_data)
+        if status_code == 200:
+            await msg.answer("Ваше сообщение отправлено руководству!", reply_markup=kb_main())
         else:
-            await msg.answer("Ошибка: пользователь не найден", reply_markup=kb_main())
+            await msg.answer("Произошла ошибка при отправке сообщения", reply_markup=kb_main())
+    else:
+        await msg.answer("Ошибка: пользователь не найден", reply_markup=kb_main())
     await state.clear()
 
 # Обработчик для кнопки "Назад" в меню обратной связи
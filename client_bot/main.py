@@ -1,16 +1,30 @@
 import asyncio
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 from common.messages import *
 from client_bot.handlers import router
-from client_bot.config import TELEGRAM_TOKEN_CLIENT
+from client_bot.config import TELEGRAM_TOKEN_CLIENT, API_BASE_URL, FSM_STORAGE_URL, FSM_STATE_TTL
+from client_bot import config
+from common.api_client import ApiClient
+from common.bot_runner import run_bot
+from common.fsm_storage import create_fsm_storage
 
 async def main():
     bot = Bot(token=TELEGRAM_TOKEN_CLIENT, parse_mode="HTML")
-    dp = Dispatcher(storage=MemoryStorage())
+    dp = Dispatcher(storage=create_fsm_storage(FSM_STORAGE_URL, ttl=FSM_STATE_TTL))
     dp.include_router(router)
+    # Один клиент API на процесс: хендлеры получают его аргументом api
+    api = ApiClient(API_BASE_URL)
+    dp["api"] = api
     print("Client Bot started")
-    await dp.start_polling(bot)
+    try:
+        await run_bot(
+            dp, bot, mode=config.BOT_MODE, webhook_url=config.WEBHOOK_BASE_URL,
+            webhook_path=config.WEBHOOK_PATH, host=config.WEBHOOK_HOST, port=config.WEBHOOK_PORT,
+            secret_token=config.WEBHOOK_SECRET, workers=config.WEBHOOK_WORKERS,
+            queue_size=config.WEBHOOK_QUEUE_SIZE, metrics_port=config.METRICS_PORT,
+        )
+    finally:
+        await api.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,139 @@
+import logging
+import re
+import time
+from typing import Optional, Tuple
+
+import httpx
+
+from common.metrics import counter, histogram
+
+logger = logging.getLogger(__name__)
+
+ApiResult = Tuple[Optional[object], int]
+
+API_CALLS = counter("api_client_requests_total", "Вызовы API из процесса", ("method", "path", "status"))
+API_CALL_LATENCY = histogram("api_client_request_duration_seconds", "Время вызова API, с", ("method", "path"))
+# Числовые сегменты пути (id, telegram_id) - в один ряд метрик: /users/{id}
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+class ApiClient:
+    """Общий клиент API для ботов и админ-панели.
+
+    Создается один раз при старте процесса и закрывается при остановке: соединения
+    переиспользуются (keep-alive пул), таймауты одинаковые для всех вызовов.
+    Методы возвращают (json или None, status_code), как прежний safe_api_call:
+    408 - таймаут, 500 - ошибка соединения.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 10.0, max_connections: int = 50,
+                 max_keepalive_connections: int = 20, transport: httpx.AsyncBaseTransport = None):
+        self.base_url = base_url
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0)),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections),
+            transport=transport,
+        )
+
+    async def close(self):
+        await self._client.aclose()
+
+    async def request(self, method: str, path: str, json: dict = None, params: dict = None) -> ApiResult:
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await self._client.request(method, path, json=json, params=params)
+            status = response.status_code
+        except httpx.TimeoutException:
+            status = 408
+            logger.error(f"Timeout при обращении к {path}")
+            return None, 408
+        except httpx.RequestError as e:
+            logger.error(f"Ошибка запроса к {path}: {e}")
+            return None, 500
+        finally:
+            template = _ID_SEGMENT.sub("/{id}", path)
+            API_CALL_LATENCY.observe(time.perf_counter() - started, method, template)
+            API_CALLS.inc(method, template, str(status))
+        if response.status_code != 200:
+            return None, response.status_code
+        try:
+            return response.json(), response.status_code
+        except ValueError:
+            logger.error(f"Некорректный JSON от {path}")
+            return None, 500
+
+    async def get(self, path: str, params: dict = None) -> ApiResult:
+        # Необязательные параметры (например cursor первой страницы) не передаем
+        params = {k: v for k, v in params.items() if v is not None} if params else None
+        return await self.request("GET", path, params=params)
+
+    async def post(self, path: str, json: dict = None, params: dict = None) -> ApiResult:
+        return await self.request("POST", path, json=json, params=params)
+
+    # USERS
+    async def get_user(self, telegram_id) -> ApiResult:
+        return await self.get(f"/users/{telegram_id}")
+
+    async def register_user(self, user: dict) -> ApiResult:
+        return await self.post("/users/", json=user)
+
+    async def list_users(self, **params) -> ApiResult:
+        """Страница пользователей: {"items": [...], "next_cursor": ...}"""
+        return await self.get("/users/", params=params)
+
+    # CODES
+    async def generate_code(self, user_id) -> ApiResult:
+        return await self.post("/codes/generate", params={"user_id": user_id})
+
+    async def use_code(self, code_value: str) -> ApiResult:
+        return await self.post("/codes/use", params={"code_value": code_value})
+
+    # ORDERS
+    async def create_order(self, order: dict) -> ApiResult:
+        return await self.post("/orders/", json=order)
+
+    async def recent_orders(self, limit: int = 10) -> ApiResult:
+        return await self.get("/orders/recent", params={"limit": limit})
+
+    async def list_orders(self, **params) -> ApiResult:
+        return await self.get("/orders/", params=params)
+
+    # GIFTS
+    async def create_gift(self, gift: dict) -> ApiResult:
+        return await self.post("/gifts/", json=gift)
+
+    async def user_gifts(self, user_id: int, active_only: bool = True) -> ApiResult:
+        return await self.get(f"/gifts/user/{user_id}", params={"active_only": active_only})
+
+    async def write_off_gift(self, gift_id: int) -> ApiResult:
+        return await self.post(f"/gifts/{gift_id}/writeoff")
+
+    async def list_gifts(self, **params) -> ApiResult:
+        return await self.get("/gifts/", params=params)
+
+    # FEEDBACK
+    async def send_feedback(self, feedback: dict) -> ApiResult:
+        return await self.post("/feedback/review", json=feedback)
+
+    async def send_idea(self, idea: dict) -> ApiResult:
+        return await self.post("/feedback/idea", json=idea)
+
+    async def list_feedbacks(self, **params) -> ApiResult:
+        return await self.get("/feedback/", params=params)
+
+    async def list_ideas(self, **params) -> ApiResult:
+        return await self.get("/feedback/ideas", params=params)
+
+    # NOTIFICATIONS
+    async def send_notification(self, notification: dict) -> ApiResult:
+        return await self.post("/notifications/", json=notification)
+
+    # ANALYTICS
+    async def analytics_summary(self) -> ApiResult:
+        return await self.get("/analytics/summary")
+
+    async def analytics_dashboard(self, limit: int = 10) -> ApiResult:
+        """Итоги, уровни клиентов, последние заказы и отзывы одним запросом"""
+        return await self.get("/analytics/dashboard", params={"limit": limit})
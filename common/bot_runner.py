@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+from common.metrics import CONTENT_TYPE, REGISTRY, counter, histogram
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+HANDLER_CALLS = counter("bot_handler_calls_total", "Вызовы хендлеров бота", ("handler", "status"))
+HANDLER_LATENCY = histogram("bot_handler_duration_seconds", "Время работы хендлера, с", ("handler",))
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Счетчик (ok/error) и время по каждому хендлеру - по имени его функции"""
+
+    async def __call__(self, handler, event, data):
+        name = getattr(data["handler"].callback, "__name__", "handler")
+        status = "error"
+        started = time.perf_counter()
+        try:
+            result = await handler(event, data)
+            status = "ok"
+            return result
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - started, name)
+            HANDLER_CALLS.inc(name, status)
+
+
+def install_metrics(dp: Dispatcher):
+    """Метрики для всех хендлеров: inner-middleware диспетчера действуют и на вложенные роутеры"""
+    middleware = HandlerMetricsMiddleware()
+    for name, observer in dp.observers.items():
+        if name not in ("update", "error"):
+            observer.middleware(middleware)
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(body=REGISTRY.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+
+class WebhookReceiver:
+    """Прием апдейтов по вебхуку с обработкой в ограниченном пуле воркеров.
+
+    Обработчик HTTP только проверяет секрет, разбирает апдейт и кладет его в очередь,
+    сразу отвечая Telegram 200. Апдейты разбирают workers задач через dp.feed_update.
+    Если очередь заполнена, отвечаем 503 - Telegram повторит доставку позже.
+    on_processed(update, seconds) вызывается после обработки (для метрик и замеров).
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, workers: int = 16, queue_size: int = 1000,
+                 secret_token: Optional[str] = None, on_processed: Optional[Callable] = None):
+        self.dp = dp
+        self.bot = bot
+        self.workers = workers
+        self.secret_token = secret_token
+        self.on_processed = on_processed
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._tasks = []
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret_token and request.headers.get(SECRET_HEADER) != self.secret_token:
+            return web.Response(status=401)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except ValueError:
+            return web.Response(status=400)
+        try:
+            self.queue.put_nowait((update, time.perf_counter()))
+        except asyncio.QueueFull:
+            logger.warning("Очередь апдейтов переполнена, апдейт %s отклонен", update.update_id)
+            return web.Response(status=503)
+        return web.Response(status=200)
+
+    async def _worker(self):
+        while True:
+            update, received_at = await self.queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception:
+                logger.exception("Ошибка обработки апдейта %s", update.update_id)
+            finally:
+                self.queue.task_done()
+                if self.on_processed:
+                    self.on_processed(update, time.perf_counter() - received_at)
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Дожидается обработки принятых апдейтов и останавливает воркеров"""
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Не обработано апдейтов при остановке: %s", self.queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+def create_webhook_app(receiver: WebhookReceiver, path: str) -> web.Application:
+    app = web.Application()
+    app.router.add_post(path, receiver.handle)
+    app.router.add_get("/metrics", metrics_handler)
+
+    async def on_startup(_app):
+        receiver.start()
+
+    async def on_cleanup(_app):
+        await receiver.stop()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+async def run_bot(dp: Dispatcher, bot: Bot, mode: str = "polling", webhook_url: str = "",
+                  webhook_path: str = "/webhook", host: str = "0.0.0.0", port: int = 8080,
+                  secret_token: Optional[str] = None, workers: int = 16, queue_size: int = 1000,
+                  metrics_port: int = 0):
+    """Запуск бота в режиме polling или webhook (по настройке BOT_MODE).
+
+    /metrics отдается на порту вебхука, а в режиме polling - на metrics_port (0 - не отдается).
+    """
+    install_metrics(dp)
+    if mode != "webhook":
+        metrics_runner = None
+        if metrics_port:
+            metrics_app = web.Application()
+            metrics_app.router.add_get("/metrics", metrics_handler)
+            metrics_runner = web.AppRunner(metrics_app)
+            await metrics_runner.setup()
+            await web.TCPSite(metrics_runner, host, metrics_port).start()
+        try:
+            await dp.start_polling(bot)
+        finally:
+            if metrics_runner is not None:
+                await metrics_runner.cleanup()
+        return
+
+    receiver = WebhookReceiver(dp, bot, workers=workers, queue_size=queue_size, secret_token=secret_token)
+    runner = web.AppRunner(create_webhook_app(receiver, webhook_path))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    await dp.emit_startup(bot=bot, **dp.workflow_data)
+    await bot.set_webhook(webhook_url.rstrip("/") + webhook_path, secret_token=secret_token,
+                          allowed_updates=dp.resolve_used_update_types())
+    logger.info("Вебхук слушает %s:%s%s", host, port, webhook_path)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await dp.emit_shutdown(bot=bot, **dp.workflow_data)
+        await bot.session.close()
@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Optional, Tuple
+
+import httpx
+
+from common import crud
+from common.models import Notification
+
+logger = logging.getLogger(__name__)
+
+# Результаты отправки одного сообщения
+SENT = "sent"
+BLOCKED = "blocked"        # 403: пользователь заблокировал бота
+FAILED = "failed"          # 400: чат не найден и прочие ошибки, которые не лечатся повтором
+THROTTLED = "throttled"    # 429: Telegram просит подождать retry_after секунд
+ERROR = "error"            # сеть или 5xx: повторяем с паузой
+
+
+class TokenBucket:
+    """Ограничитель частоты: rate токенов в секунду, запас до capacity.
+
+    pause(seconds) останавливает выдачу токенов всем ожидающим - так выполняется
+    retry_after из ответа 429, который у Telegram действует на весь бот. Запас после паузы
+    копится с ее конца: сразу после retry_after пачка сообщений не уходит.
+    """
+
+    def __init__(self, rate: float, capacity: float = None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = self._clock()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+        self._tokens = 0
+        self._updated = max(self._updated, self._paused_until)
+
+
+class ChatRateLimiter:
+    """Не чаще rate сообщений в секунду в один чат (лимит Telegram на чат)"""
+
+    def __init__(self, rate: float = 1.0, clock=time.monotonic, max_chats: int = 10000):
+        self.interval = 1 / rate
+        self._clock = clock
+        self._max_chats = max_chats
+        self._next = {}
+
+    async def acquire(self, chat_id):
+        now = self._clock()
+        if len(self._next) > self._max_chats:
+            self._next = {chat: at for chat, at in self._next.items() if at > now}
+        at = max(now, self._next.get(chat_id, now))
+        self._next[chat_id] = at + self.interval
+        if at > now:
+            await asyncio.sleep(at - now)
+
+
+class TelegramSender:
+    """sendMessage через Bot API по общему keep-alive клиенту"""
+
+    def __init__(self, token: str, api_url: str = "https://api.telegram.org", timeout: float = 10.0,
+                 transport: httpx.AsyncBaseTransport = None):
+        self._client = httpx.AsyncClient(
+            base_url=f"{api_url.rstrip('/')}/bot{token}", timeout=timeout, transport=transport
+        )
+
+    async def send_message(self, chat_id, text: str) -> Tuple[str, float]:
+        """Возвращает (результат, через сколько секунд повторить)"""
+        try:
+            response = await self._client.post("/sendMessage", json={"chat_id": chat_id, "text": text})
+        except httpx.RequestError as e:
+            logger.warning(f"Ошибка отправки в чат {chat_id}: {e}")
+            return ERROR, 1.0
+        if response.status_code == 200:
+            return SENT, 0
+        if response.status_code == 429:
+            try:
+                retry_after = response.json().get("parameters", {}).get("retry_after", 1)
+            except ValueError:
+                retry_after = 1
+            return THROTTLED, float(retry_after)
+        if response.status_code == 403:
+            return BLOCKED, 0
+        if response.status_code >= 500:
+            return ERROR, 1.0
+        return FAILED, 0
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class BroadcastDispatcher:
+    """Рассылка уведомлений всем клиентам (Notification.user_id = null).
+
+    Получатели читаются пачками по checkpoint_every по курсору users.id, каждая пачка -
+    короткой транзакцией: соединение и снимок БД не держатся на время отправки. Отправка идет
+    через общий (rate в секунду) и початовый лимитеры, не более concurrency запросов
+    одновременно. После каждой пачки в notification_deliveries сохраняются курсор и счетчики:
+    упавшая рассылка продолжится с последнего чекпоинта (повторно могут уйти только сообщения
+    незавершенной пачки). Пока рассылка идет, захват продлевается каждые stale_after / 3 секунд,
+    в том числе во время пауз по retry_after, - другой процесс не возьмет ее как зависшую.
+    """
+
+    def __init__(self, session_factory, sender: TelegramSender, rate: float = 25, chat_rate: float = 1,
+                 concurrency: int = 10, checkpoint_every: int = 100, max_retries: int = 5,
+                 stale_after: float = 300):
+        self.session_factory = session_factory
+        self.sender = sender
+        self.bucket = TokenBucket(rate)
+        self.chats = ChatRateLimiter(chat_rate)
+        self.concurrency = concurrency
+        self.checkpoint_every = checkpoint_every
+        self.max_retries = max_retries
+        self.stale_after = stale_after
+
+    async def run_next(self, notification_id: Optional[int] = None):
+        """Берет ожидающую (или зависшую) рассылку и доводит ее до конца. None - рассылок нет"""
+        async with self.session_factory() as session:
+            delivery = await crud.claim_broadcast(session, notification_id, timedelta(seconds=self.stale_after))
+            if delivery is None:
+                return None
+            notification = await session.get(Notification, delivery.notification_id)
+            if notification is None:
+                # Уведомление удалили после захвата (строка рассылки удаляется с ним каскадом):
+                # отправлять нечего, переходим к следующей рассылке
+                logger.warning("Рассылка %s: уведомление удалено, не отправляем", delivery.notification_id)
+                await crud.checkpoint_broadcast(session, delivery.notification_id, delivery.last_user_id, done=True)
+                return delivery
+            text = notification.text
+        started = time.perf_counter()
+        heartbeat = asyncio.create_task(self._heartbeat(delivery.notification_id))
+        try:
+            await self._deliver(delivery.notification_id, text, delivery.last_user_id)
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+        async with self.session_factory() as session:
+            finished = await crud.get_notification_delivery(session, delivery.notification_id)
+        if finished is None:
+            logger.warning("Рассылка %s: уведомление удалено во время отправки", delivery.notification_id)
+            return delivery
+        delivery = finished
+        logger.info(
+            "Рассылка %s: отправлено %s, заблокировали бота %s, ошибок %s, 429: %s, %.1f с",
+            delivery.notification_id, delivery.sent, delivery.blocked, delivery.failed, delivery.throttled,
+            time.perf_counter() - started,
+        )
+        return delivery
+
+    async def _heartbeat(self, notification_id: int):
+        while True:
+            await asyncio.sleep(self.stale_after / 3)
+            try:
+                async with self.session_factory() as session:
+                    await crud.touch_broadcast(session, notification_id)
+            except Exception:
+                logger.exception("Не удалось продлить захват рассылки %s", notification_id)
+
+    async def _deliver(self, notification_id: int, text: str, after_id: int):
+        while True:
+            async with self.session_factory() as session:
+                chunk = await crud.get_broadcast_recipients(session, after_id, self.checkpoint_every)
+            done = len(chunk) < self.checkpoint_every
+            # Чекпоинт не нашел рассылку - уведомление удалили, остальным не отправляем
+            if not await self._deliver_chunk(notification_id, text, chunk, done=done) or done:
+                return
+            after_id = chunk[-1][0]
+
+    async def _deliver_chunk(self, notification_id: int, text: str, chunk: list, done: bool = False):
+        stats = {SENT: 0, BLOCKED: 0, FAILED: 0, THROTTLED: 0}
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver_one(chat_id):
+            async with semaphore:
+                for _ in range(self.max_retries + 1):
+                    await self.chats.acquire(chat_id)
+                    await self.bucket.acquire()
+                    result, retry_after = await self.sender.send_message(chat_id, text)
+                    if result == THROTTLED:
+                        stats[THROTTLED] += 1
+                        self.bucket.pause(retry_after)
+                    elif result == ERROR:
+                        await asyncio.sleep(retry_after)
+                    else:
+                        stats[result] += 1
+                        return
+                stats[FAILED] += 1
+
+        await asyncio.gather(*[deliver_one(chat_id) for _, chat_id in chunk])
+        last_user_id = chunk[-1][0] if chunk else 0
+        async with self.session_factory() as session:
+            return await crud.checkpoint_broadcast(
+                session, notification_id, last_user_id, sent=stats[SENT], blocked=stats[BLOCKED],
+                failed=stats[FAILED], throttled=stats[THROTTLED], done=done,
+            )
@@ -0,0 +1,118 @@
+import heapq
+import random
+from collections import deque
+from datetime import datetime
+
+CODE_LENGTH = 5
+CODE_SPACE = 10 ** CODE_LENGTH
+
+
+def format_code(number: int) -> str:
+    return f"{number:0{CODE_LENGTH}d}"
+
+
+class CodeAllocator:
+    """Выдает свободные коды за O(1) из заранее перемешанного пула.
+
+    Пул - очередь всех кодов пространства в случайном порядке. Выданный код возвращается
+    в конец очереди, когда его использовали (release) или истек срок действия, поэтому
+    повторно он попадется не раньше, чем пройдет весь пул. Не нужно угадывать код
+    и проверять его в БД, как бы ни было заполнено пространство.
+    Аллокатор локален для процесса: пересечения между процессами отсекает
+    уникальный индекс по неиспользованным кодам в БД.
+    """
+
+    def __init__(self, space: int = CODE_SPACE, rng: random.Random = None):
+        self.space = space
+        self._rng = rng or random.SystemRandom()
+        self.load({})
+
+    def load(self, live: dict):
+        """Пересобирает пул, исключая живые коды {code: expires_at} (например, из БД при старте)"""
+        live = {int(code): expires_at for code, expires_at in live.items()}
+        free = [n for n in range(self.space) if n not in live]
+        self._rng.shuffle(free)
+        self._free = deque(free)
+        self._live = live
+        self._expiry = [(expires_at, code) for code, expires_at in live.items()]
+        heapq.heapify(self._expiry)
+
+    @property
+    def free_count(self) -> int:
+        return len(self._free)
+
+    @property
+    def live_count(self) -> int:
+        return len(self._live)
+
+    def allocate(self, expires_at: datetime, now: datetime = None):
+        """Следующий свободный код или None, если все пространство занято живыми кодами"""
+        self.reclaim_expired(now or datetime.utcnow())
+        if not self._free:
+            return None
+        number = self._free.popleft()
+        self._live[number] = expires_at
+        heapq.heappush(self._expiry, (expires_at, number))
+        return format_code(number)
+
+    def release(self, code: str):
+        """Возвращает использованный код в пул"""
+        number = int(code)
+        if self._live.pop(number, None) is not None:
+            self._free.append(number)
+
+    def reclaim_expired(self, now: datetime):
+        """Возвращает в пул коды с истекшим сроком"""
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, number = heapq.heappop(self._expiry)
+            # Код мог быть уже использован или выдан заново с другим сроком
+            if self._live.get(number) == expires_at:
+                del self._live[number]
+                self._free.append(number)
+
+
+class ActiveCode:
+    __slots__ = ("code_id", "user_id", "expires_at")
+
+    def __init__(self, code_id: int, user_id: int, expires_at: datetime):
+        self.code_id = code_id
+        self.user_id = user_id
+        self.expires_at = expires_at
+
+
+class ActiveCodeIndex:
+    """Индекс живых кодов: code -> (code_id, user_id, expires_at) в KV-хранилище.
+
+    Ключи живут ровно до истечения кода и вытесняются хранилищем сами. Неизвестный
+    или истекший код отклоняется без запроса в Postgres. Флаг "использован" хранится
+    только в БД: индекс лишь говорит, какую строку пытаться пометить.
+    С MemoryKV индекс локален для процесса - подходит только для одного процесса API.
+    """
+
+    prefix = "code:"
+
+    def __init__(self, kv):
+        self.kv = kv
+
+    async def add(self, code_value: str, code_id: int, user_id: int, expires_at: datetime, now: datetime = None):
+        ttl = expires_at - (now or datetime.utcnow())
+        if ttl.total_seconds() <= 0:
+            return
+        await self.kv.set(
+            self.prefix + code_value,
+            f"{code_id}:{user_id or ''}:{expires_at.isoformat()}",
+            px=int(ttl.total_seconds() * 1000),
+        )
+
+    async def get(self, code_value: str, now: datetime = None):
+        raw = await self.kv.get(self.prefix + code_value)
+        if raw is None:
+            return None
+        code_id, user_id, expires_at = raw.split(":", 2)
+        entry = ActiveCode(int(code_id), int(user_id) if user_id else None, datetime.fromisoformat(expires_at))
+        if entry.expires_at <= (now or datetime.utcnow()):
+            return None
+        return entry
+
+    async def discard(self, code_value: str):
+        await self.kv.delete(self.prefix + code_value)
@@ -1,15 +1,69 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, and_, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy import (
+    select, update, delete, insert, and_, func, case, literal, exists, values, column, Integer, union_all, text,
+    literal_column, extract, or_, Date, tuple_
+)
+from collections import Counter
 from datetime import datetime, timedelta, date
-import secrets
+import asyncio
+import calendar
+import random
 
 from .models import (
-    User, Barista, Code, Order, Gift, Feedback, Idea, Notification, BaristaAction, RoleEnum, LoyaltyLevelEnum
+    User, Barista, Code, Order, Gift, Feedback, Idea, Notification, NotificationDelivery, NotificationInbox,
+    NotificationCounter, AnalyticsCounter, AnalyticsRollup, BaristaAction, RoleEnum, LoyaltyLevelEnum
 )
+from .codes import CodeAllocator, ActiveCodeIndex
+from .pagination import paginate
 
 # USERS
+# Кэш профилей для GET /users/{telegram_id}, включается API при старте (set_profile_cache)
+profile_cache = None
+
+def set_profile_cache(cache):
+    global profile_cache
+    profile_cache = cache
+
+async def _commit_users(session: AsyncSession, *user_ids, all_users: bool = False):
+    """commit и сброс изменившихся профилей в кэше.
+
+    Сбрасываем после commit: иначе параллельное чтение успело бы закэшировать старые значения.
+    """
+    await session.commit()
+    if profile_cache is None:
+        return
+    if all_users:
+        await profile_cache.clear()
+    elif user_ids:
+        await profile_cache.invalidate(*user_ids)
+
+def _profile(user: User) -> dict:
+    return {column.key: getattr(user, column.key) for column in User.__table__.columns}
+
+async def get_profile(session: AsyncSession, telegram_id: str = None, user_id: int = None):
+    """Профиль пользователя (значения столбцов users) по telegram_id или id - через кэш профилей.
+
+    None - пользователя нет. Для изменения пользователя нужен get_user_by_* (ORM-объект).
+    """
+    if profile_cache is None:
+        user = await (get_user_by_id(session, user_id) if user_id is not None
+                      else get_user_by_telegram(session, telegram_id))
+        return _profile(user) if user else None
+    profile = await profile_cache.get(user_id=user_id, telegram_id=telegram_id)
+    if profile is not None:
+        return profile
+    snapshot = await profile_cache.snapshot()
+    user = await (get_user_by_id(session, user_id) if user_id is not None
+                  else get_user_by_telegram(session, telegram_id))
+    if user is None:
+        return None
+    return await profile_cache.put(_profile(user), snapshot)
+
 async def create_user(session: AsyncSession, telegram_id: str, **kwargs):
     user = User(telegram_id=telegram_id, **kwargs)
+    # Рассылки, отправленные до регистрации, в ленте нового пользователя прочитаны
+    user.inbox = NotificationInbox(broadcasts_seen=func.coalesce(_broadcast_seq(), 0))
     session.add(user)
     await session.commit()
     await session.refresh(user)
@@ -23,63 +77,159 @@ async def get_user_by_id(session: AsyncSession, user_id: int):
     q = await session.execute(select(User).where(User.id == user_id))
     return q.scalar_one_or_none()
 
+async def get_users(session: AsyncSession, limit: int = 100, cursor: str = None):
+    """Пользователи, новые сверху: (пользователи, next_cursor)"""
+    return await paginate(session, select(User), (User.id,), limit, cursor)
+
 async def update_user(session: AsyncSession, user_id: int, **kwargs):
     await session.execute(update(User).where(User.id == user_id).values(**kwargs))
-    await session.commit()
+    await _commit_users(session, user_id)
 
 async def update_user_stats_after_order(session: AsyncSession, user_id: int, drinks_count: int, sandwiches_count: int, total_sum: int, use_points: bool, used_points_amount: int):
-    """Обновляем статистику пользователя после заказа"""
-    user = await get_user_by_id(session, user_id)
-    if not user:
-        return
-    
-    # Обновляем счетчики
-    new_drinks_count = user.drinks_count + drinks_count
-    new_sandwiches_count = user.sandwiches_count + sandwiches_count
-    
+    """Обновляем статистику пользователя после заказа (атомарными инкрементами в БД)"""
     # Рассчитываем баллы (1 балл за каждые 100 руб, но только если не списываем баллы)
     points_earned = 0 if use_points else total_sum // 100
-    
-    # Списываем или начисляем баллы
-    if use_points:
-        new_points = max(0, user.points - used_points_amount)
-    else:
-        new_points = user.points + points_earned
-    
-    # Определяем новый уровень лояльности
-    from .utils import get_loyalty_level
-    new_level = get_loyalty_level(new_drinks_count)
-    
-    # Преобразуем строку уровня в enum
-    level_mapping = {
-        "Стандарт": LoyaltyLevelEnum.standard,
-        "Серебро": LoyaltyLevelEnum.silver,
-        "Золото": LoyaltyLevelEnum.gold,
-        "Платина": LoyaltyLevelEnum.platinum,
-    }
-    new_loyalty_status = level_mapping.get(new_level, LoyaltyLevelEnum.standard)
-    
-    # Обновляем пользователя
-    await update_user(session, user_id, 
-                     drinks_count=new_drinks_count,
-                     sandwiches_count=new_sandwiches_count,
-                     points=new_points,
-                     loyalty_status=new_loyalty_status)
-    
-    # Проверяем день рождения и выдаем подарок если нужно
-    await check_and_give_birthday_gift(session, user_id)
-    
+    points_used = used_points_amount if use_points else 0
+
+    user_row = await apply_user_deltas(session, user_id,
+                                       drinks_count=drinks_count,
+                                       sandwiches_count=sandwiches_count,
+                                       points_earned=points_earned,
+                                       points_used=points_used)
+    if user_row is None:
+        return
+    level_upgraded, new_level = await _apply_level_upgrade(session, user_row)
+    await _commit_users(session, user_id)
+
     # Возвращаем информацию об изменениях для уведомлений
-    level_upgraded = user.loyalty_status != new_loyalty_status
-    birthday_gift = await check_and_give_birthday_gift(session, user_id)
-    
     return {
         "points_earned": points_earned,
-        "points_used": used_points_amount if use_points else 0,
-        "new_points_total": new_points,
+        "points_used": points_used,
+        "new_points_total": user_row.points,
         "level_upgraded": level_upgraded,
-        "new_level": new_level if level_upgraded else None,
-        "birthday_gift": birthday_gift
+        "new_level": new_level,
+    }
+
+def loyalty_level_case(drinks_count):
+    """SQL-выражение уровня лояльности по количеству напитков (аналог get_loyalty_level)"""
+    from .utils import LOYALTY_LEVELS
+    level_type = User.__table__.c.loyalty_status.type
+    return case(
+        *[
+            (drinks_count >= drinks, literal(LoyaltyLevelEnum(lvl), level_type))
+            for lvl, drinks in reversed(LOYALTY_LEVELS)
+        ],
+        else_=literal(LoyaltyLevelEnum.standard, level_type),
+    )
+
+async def apply_user_deltas(session: AsyncSession, user_id: int, drinks_count: int = 0, sandwiches_count: int = 0,
+                            points_earned: int = 0, points_used: int = 0, gift_drinks: int = 0, gift_sandwiches: int = 0,
+                            ctes=()):
+    """Атомарно меняет счетчики и баллы пользователя (points = points + :delta), без commit.
+
+    Значения не читаются в Python и строка не блокируется заранее, поэтому параллельные заказы
+    не теряют обновления и ждут друг друга только на самом UPDATE. Уровень лояльности запрос
+    не меняет: RETURNING отдает сохраненный уровень, повышение - _apply_level_upgrade.
+    ctes - изменяющие CTE (например analytics_bump_ctes), которые выполнятся тем же запросом.
+    Возвращает строку с новыми значениями или None, если пользователя нет.
+    """
+    assignments = {}
+    if drinks_count:
+        assignments["drinks_count"] = User.drinks_count + drinks_count
+    if sandwiches_count:
+        assignments["sandwiches_count"] = User.sandwiches_count + sandwiches_count
+    if points_used:
+        assignments["points"] = func.greatest(0, User.points + points_earned - points_used)
+    elif points_earned:
+        assignments["points"] = User.points + points_earned
+    if gift_drinks:
+        assignments["gift_drinks"] = User.gift_drinks + gift_drinks
+    if gift_sandwiches:
+        assignments["gift_sandwiches"] = User.gift_sandwiches + gift_sandwiches
+    if not assignments:
+        assignments["drinks_count"] = User.drinks_count
+
+    stmt = (
+        update(User)
+        .where(User.id == user_id)
+        .values(**assignments)
+        .returning(User.id, User.telegram_id, User.drinks_count, User.sandwiches_count, User.points,
+                   User.loyalty_status, User.gift_drinks, User.gift_sandwiches, User.birth_date)
+        .execution_options(synchronize_session=False)
+    )
+    if ctes:
+        stmt = stmt.add_cte(*ctes)
+    result = await session.execute(stmt)
+    return result.one_or_none()
+
+async def _apply_level_upgrade(session: AsyncSession, user_row):
+    """(level_upgraded, new_level) по строке из apply_user_deltas, без commit.
+
+    Повышение - относительно сохраненного уровня, а не посчитанного по напиткам: он мог
+    разойтись с формулой (пересчет с другими порогами, ручная смена), заказ его не понижает.
+    Строку уже держит UPDATE из apply_user_deltas, поэтому второй запрос (только при
+    повышении, несколько раз за жизнь клиента) не гоняется с параллельными заказами.
+    """
+    from .utils import get_loyalty_level
+    levels = list(LoyaltyLevelEnum)
+    new_level = LoyaltyLevelEnum(get_loyalty_level(user_row.drinks_count))
+    if levels.index(new_level) <= levels.index(user_row.loyalty_status):
+        return False, None
+    await session.execute(
+        update(User).where(User.id == user_row.id).values(loyalty_status=new_level)
+        .execution_options(synchronize_session=False)
+    )
+    return True, new_level.value
+
+async def process_order(session: AsyncSession, user_id: int, barista_id: int, code_id: int, receipt_number: str,
+                        total_sum: int, drinks_count: int, sandwiches_count: int,
+                        use_points: bool = False, used_points_amount: int = 0):
+    """Проводит заказ одной транзакцией: сам заказ, счетчики и баллы пользователя, аналитика.
+
+    Подарки на ДР выдает ежедневная задача (give_birthday_gifts), а не заказ.
+
+    Возвращает (order, stats) или (None, None), если пользователь не найден.
+    """
+    points_earned = 0 if use_points else total_sum // 100
+    points_used = used_points_amount if use_points else 0
+
+    # Заказ - только если пользователь есть. Строку users при этом не блокируем: проверка
+    # внешнего ключа берет KEY SHARE, который не конфликтует с UPDATE счетчиков
+    row = dict(user_id=user_id, barista_id=barista_id, code_id=code_id, receipt_number=receipt_number,
+               total_sum=total_sum, drinks_count=drinks_count, sandwiches_count=sandwiches_count,
+               use_points=use_points, used_points_amount=used_points_amount)
+    order = await session.scalar(
+        insert(Order)
+        .from_select(list(row), select(*[literal(value, Order.__table__.c[name].type)
+                                         for name, value in row.items()])
+                     .where(exists().where(User.id == user_id)))
+        .returning(Order)
+    )
+    if order is None:
+        await session.rollback()
+        return None, None
+
+    # Счетчики и баллы клиента и счетчики аналитики - одним UPDATE ... RETURNING последним
+    # перед commit (при повышении уровня - еще один UPDATE той же строки). Строки users и срезов
+    # аналитики блокируются до commit, поэтому параллельные заказы ждут друг друга только здесь
+    user_row = await apply_user_deltas(session, user_id,
+                                       drinks_count=drinks_count,
+                                       sandwiches_count=sandwiches_count,
+                                       points_earned=points_earned,
+                                       points_used=points_used,
+                                       ctes=analytics_bump_ctes(orders=1, drinks=drinks_count,
+                                                                sandwiches=sandwiches_count, revenue=total_sum,
+                                                                points_earned=points_earned,
+                                                                points_used=points_used))
+    level_upgraded, new_level = await _apply_level_upgrade(session, user_row)
+    await _commit_users(session, user_id)
+
+    return order, {
+        "points_earned": points_earned,
+        "points_used": points_used,
+        "new_points_total": user_row.points,
+        "level_upgraded": level_upgraded,
+        "new_level": new_level,
     }
 
 async def set_loyalty_level(session: AsyncSession, user_id: int, level: LoyaltyLevelEnum):
@@ -98,21 +248,75 @@ async def create_barista(session: AsyncSession, telegram_id: str, **kwargs):
     return barista
 
 # CODES
-async def generate_code(session: AsyncSession, user_id: int, validity_seconds: int = 90):
-    # Генерируем уникальный 5-значный код, валиден 90 сек
-    while True:
-        code_value = "".join([str(secrets.randbelow(10)) for _ in range(5)])
-        q = await session.execute(select(Code).where(Code.code == code_value, Code.is_used == False))
-        if not q.scalar_one_or_none():
-            break
-    expires_at = datetime.utcnow() + timedelta(seconds=validity_seconds)
-    code = Code(code=code_value, user_id=user_id, expires_at=expires_at)
-    session.add(code)
-    await session.commit()
-    await session.refresh(code)
-    return code
+code_allocator = CodeAllocator()
+_code_allocator_loaded = False
+_code_allocator_lock = None
+# Индекс живых кодов для POST /codes/use, включается API при старте (set_active_code_index)
+active_code_index = None
+
+async def set_active_code_index(session: AsyncSession, kv):
+    """Включает индекс живых кодов поверх KV-хранилища и заполняет его из БД"""
+    global active_code_index
+    if kv is None:
+        active_code_index = None
+        return
+    index = ActiveCodeIndex(kv)
+    q = await session.execute(
+        select(Code.code, Code.id, Code.user_id, Code.expires_at)
+        .where(Code.is_used == False, Code.expires_at > datetime.utcnow())
+    )
+    for code_value, code_id, user_id, expires_at in q.all():
+        await index.add(code_value, code_id, user_id, expires_at)
+    active_code_index = index
+
+async def _load_code_allocator(session: AsyncSession):
+    """Один раз на процесс исключает из пула коды, которые сейчас живы в БД"""
+    global _code_allocator_loaded, _code_allocator_lock
+    if _code_allocator_lock is None:
+        _code_allocator_lock = asyncio.Lock()
+    async with _code_allocator_lock:
+        if _code_allocator_loaded:
+            return
+        q = await session.execute(
+            select(Code.code, Code.expires_at).where(Code.is_used == False, Code.expires_at > datetime.utcnow())
+        )
+        code_allocator.load({code: expires_at for code, expires_at in q.all()})
+        _code_allocator_loaded = True
+
+async def generate_code(session: AsyncSession, user_id: int, validity_seconds: int = 90, max_attempts: int = 5):
+    # Берем свободный 5-значный код из пула аллокатора, валиден 90 сек
+    if not _code_allocator_loaded:
+        await _load_code_allocator(session)
+    for _ in range(max_attempts):
+        expires_at = datetime.utcnow() + timedelta(seconds=validity_seconds)
+        code_value = code_allocator.allocate(expires_at)
+        if code_value is None:
+            return None  # все пространство кодов занято живыми кодами
+        # Истекшая неиспользованная строка с тем же кодом переиспользуется на месте.
+        # Если код жив (выдан другим процессом API) - строка не вернется, берем следующий.
+        code = await session.scalar(
+            pg_insert(Code)
+            .values(code=code_value, user_id=user_id, expires_at=expires_at)
+            .on_conflict_do_update(
+                index_elements=[Code.code],
+                index_where=Code.is_used == False,
+                set_={"user_id": user_id, "expires_at": expires_at, "created_at": func.now()},
+                where=Code.expires_at < datetime.utcnow(),
+            )
+            .returning(Code)
+            .execution_options(populate_existing=True)
+        )
+        if code is not None:
+            await session.commit()
+            if active_code_index is not None:
+                await active_code_index.add(code.code, code.id, code.user_id, code.expires_at)
+            return code
+    await session.rollback()
+    return None
 
 async def use_code(session: AsyncSession, code_value: str):
+    if active_code_index is not None:
+        return await _use_indexed_code(session, code_value)
     q = await session.execute(select(Code).where(Code.code == code_value, Code.is_used == False))
     code = q.scalar_one_or_none()
     if not code:
@@ -121,28 +325,200 @@ async def use_code(session: AsyncSession, code_value: str):
         return None
     code.is_used = True
     await session.commit()
+    code_allocator.release(code.code)
+    return code
+
+async def _use_indexed_code(session: AsyncSession, code_value: str):
+    """Погашение кода через индекс: неизвестные и истекшие коды - без обращения к БД"""
+    entry = await active_code_index.get(code_value)
+    if entry is None:
+        return None
+    # БД остается источником истины для флага "использован": гасим строку одним UPDATE
+    code = await session.scalar(
+        update(Code)
+        .where(Code.id == entry.code_id, Code.is_used == False, Code.expires_at >= datetime.utcnow())
+        .values(is_used=True)
+        .returning(Code)
+        .execution_options(populate_existing=True)
+    )
+    await active_code_index.discard(code_value)
+    if code is None:
+        await session.rollback()
+        return None
+    await session.commit()
+    code_allocator.release(code.code)
     return code
 
+async def reap_codes(session: AsyncSession, older_than: timedelta = timedelta(days=1), batch_size: int = 1000,
+                     after: tuple = None):
+    """Удаляет истекшие коды, на которые не ссылается ни один заказ, пачками по batch_size.
+
+    Каждая пачка - отдельная транзакция с FOR UPDATE SKIP LOCKED, поэтому блокировки
+    короткие и не мешают выдаче и погашению кодов. Коды с заказами остаются для истории.
+    Использованные коды просматриваются курсором по (expires_at, id): after из прошлого
+    запуска избавляет от повторного просмотра кодов с заказами. Курсор по id здесь не
+    годится - generate_code переиспользует строку на месте, и у нее остается старый id.
+    Возвращает (число удаленных строк, after для следующего запуска).
+    """
+    cutoff = datetime.utcnow() - older_than
+    has_order = exists().where(Order.code_id == Code.id)
+    reaped = 0
+
+    # Неиспользованные истекшие коды - по частичному индексу ix_codes_unused_expires_at.
+    # Условия повторяются в самом DELETE: строку могли переиспользовать между выборкой и удалением
+    unused_expired = (Code.is_used == False, Code.expires_at < cutoff, ~has_order)
+    while True:
+        batch = (
+            select(Code.id)
+            .where(*unused_expired)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        result = await session.execute(
+            delete(Code).where(Code.id.in_(batch), *unused_expired).execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        reaped += result.rowcount
+        if result.rowcount < batch_size:
+            break
+
+    # Использованные коды без заказа (погашен, но заказ не оформлен) - по ix_codes_used_expires_at_id.
+    # Использованную строку generate_code не трогает, а погасить можно только живой код,
+    # поэтому строки позади курсора уже не изменятся
+    used_expired = (Code.is_used == True, Code.expires_at < cutoff)
+    while True:
+        query = select(Code.expires_at, Code.id).where(*used_expired)
+        if after is not None:
+            query = query.where(tuple_(Code.expires_at, Code.id) > tuple_(*after))
+        rows = (await session.execute(
+            query.order_by(Code.expires_at, Code.id).limit(batch_size).with_for_update(skip_locked=True)
+        )).all()
+        if not rows:
+            await session.commit()
+            break
+        result = await session.execute(
+            delete(Code)
+            .where(Code.id.in_([code_id for _, code_id in rows]), *used_expired, ~has_order)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        reaped += result.rowcount
+        after = tuple(rows[-1])
+        if len(rows) < batch_size:
+            break
+
+    return reaped, after
+
 # ORDERS
 async def create_order(session: AsyncSession, **kwargs):
     order = Order(**kwargs)
     session.add(order)
+    await bump_analytics(session, orders=1, drinks=order.drinks_count or 0, sandwiches=order.sandwiches_count or 0,
+                         revenue=order.total_sum or 0)
     await session.commit()
     await session.refresh(order)
     return order
 
-async def get_orders_by_user(session: AsyncSession, user_id: int, limit: int = 10, offset: int = 0):
-    q = await session.execute(
-        select(Order).where(Order.user_id == user_id).order_by(Order.date_created.desc()).offset(offset).limit(limit)
-    )
-    return q.scalars().all()
+async def create_orders_batch(session: AsyncSession, orders: list):
+    """Пакетная загрузка заказов (выгрузка из кассы, дозагрузка после простоя бота).
 
-async def get_all_orders(session: AsyncSession, limit: int = 100, offset: int = 0):
-    """Получить все заказы для админки"""
-    q = await session.execute(
-        select(Order).order_by(Order.date_created.desc()).offset(offset).limit(limit)
+    Заказы вставляются multi-row INSERT'ом, а счетчики пользователей обновляются одним
+    UPDATE ... FROM (VALUES ...) с дельтами, сложенными по user_id. Все - одна транзакция.
+    Заказы со ссылкой на несуществующего пользователя, бариста или код не вставляются.
+    Подарки на ДР здесь не выдаются. Возвращает список (order, error) в порядке входа.
+
+    Баллы считаются так, будто заказы проведены по одному в порядке входа: списание
+    не уводит баланс ниже нуля на каждом шаге, поэтому итог не зависит от группировки.
+    """
+    results = [(None, None)] * len(orders)
+
+    # Проверяем внешние ключи пачкой, чтобы одна плохая строка не откатила весь пакет
+    async def existing(model, ids):
+        ids = {i for i in ids if i is not None}
+        if not ids:
+            return set()
+        return set((await session.scalars(select(model.id).where(model.id.in_(ids)))).all())
+
+    user_ids = await existing(User, (o["user_id"] for o in orders))
+    barista_ids = await existing(Barista, (o["barista_id"] for o in orders))
+    code_ids = await existing(Code, (o["code_id"] for o in orders))
+
+    valid = []
+    for index, order in enumerate(orders):
+        if order["user_id"] not in user_ids:
+            results[index] = (None, "Пользователь не найден")
+        elif order["barista_id"] is not None and order["barista_id"] not in barista_ids:
+            results[index] = (None, "Бариста не найден")
+        elif order["code_id"] is not None and order["code_id"] not in code_ids:
+            results[index] = (None, "Код не найден")
+        else:
+            valid.append(index)
+    if not valid:
+        return results
+
+    created = (await session.scalars(
+        insert(Order).returning(Order, sort_by_parameter_order=True),
+        [orders[i] for i in valid],
+    )).all()
+    for index, order in zip(valid, created):
+        results[index] = (order, None)
+
+    # Дельты по пользователям: одна строка VALUES на пользователя. Последовательное
+    # points = greatest(0, points + d) по заказам сворачивается в greatest(points + S, S - min S_k),
+    # где S_k - сумма первых k дельт баллов, S - всех: floor - баланс после последнего обнуления
+    deltas = {}
+    for index in valid:
+        order = orders[index]
+        use_points = order.get("use_points", False)
+        delta = deltas.setdefault(order["user_id"], [0, 0, 0, 0, 0, 0])
+        delta[0] += order["drinks_count"]
+        delta[1] += order["sandwiches_count"]
+        delta[2] += 0 if use_points else order["total_sum"] // 100
+        delta[3] += order.get("used_points_amount", 0) if use_points else 0
+        delta[4] = delta[2] - delta[3]
+        delta[5] = min(delta[5], delta[4])
+    # Строки VALUES - по возрастанию user_id: параллельные пакеты с общими пользователями
+    # блокируют их в одном порядке, а срезы аналитики - после всех users, как process_order.
+    # Иначе пакеты [A, B] и [B, A] ждут друг друга до deadlock.
+    batch = values(
+        column("user_id", Integer), column("drinks", Integer), column("sandwiches", Integer),
+        column("points_delta", Integer), column("points_floor", Integer),
+        name="batch",
+    ).data([(user_id, drinks, sandwiches, total, total - lowest)
+            for user_id, (drinks, sandwiches, _, _, total, lowest) in sorted(deltas.items())])
+    await session.execute(
+        update(User)
+        .where(User.id == batch.c.user_id)
+        .values(
+            drinks_count=User.drinks_count + batch.c.drinks,
+            sandwiches_count=User.sandwiches_count + batch.c.sandwiches,
+            points=func.greatest(User.points + batch.c.points_delta, batch.c.points_floor),
+            # Как в process_order: заказ только повышает сохраненный уровень (enum сравнивается по порядку)
+            loyalty_status=func.greatest(User.loyalty_status, loyalty_level_case(User.drinks_count + batch.c.drinks)),
+        )
+        .execution_options(synchronize_session=False)
     )
-    return q.scalars().all()
+    await bump_analytics(
+        session,
+        orders=len(valid),
+        drinks=sum(delta[0] for delta in deltas.values()),
+        sandwiches=sum(delta[1] for delta in deltas.values()),
+        revenue=sum(orders[i]["total_sum"] for i in valid),
+        points_earned=sum(delta[2] for delta in deltas.values()),
+        points_used=sum(delta[3] for delta in deltas.values()),
+    )
+    await _commit_users(session, *deltas)
+    return results
+
+async def get_orders_by_user(session: AsyncSession, user_id: int, limit: int = 10, cursor: str = None):
+    """Заказы пользователя, новые сверху: (заказы, next_cursor)"""
+    return await paginate(session, select(Order).where(Order.user_id == user_id),
+                          (Order.date_created, Order.id), limit, cursor)
+
+async def get_all_orders(session: AsyncSession, limit: int = 100, cursor: str = None):
+    """Получить все заказы для админки: (заказы, next_cursor)"""
+    return await paginate(session, select(Order), (Order.date_created, Order.id), limit, cursor)
 
 async def get_recent_orders(session: AsyncSession, limit: int = 10):
     """Получить последние заказы"""
@@ -155,10 +531,23 @@ async def get_recent_orders(session: AsyncSession, limit: int = 10):
 async def create_gift(session: AsyncSession, user_id: int, type_: str, amount: int, created_by: int = None):
     gift = Gift(user_id=user_id, type=type_, amount=amount, created_by=created_by)
     session.add(gift)
+    await bump_analytics(session, gifts=1)
     await session.commit()
     await session.refresh(gift)
     return gift
 
+async def issue_gift(session: AsyncSession, user_id: int, type_: str, amount: int, created_by: int = None):
+    """Создает подарок и увеличивает счетчик подарков пользователя одной транзакцией"""
+    counters = {"drink": "gift_drinks", "sandwich": "gift_sandwiches"}
+    gift = Gift(user_id=user_id, type=type_, amount=amount, created_by=created_by)
+    session.add(gift)
+    if type_ in counters:
+        await apply_user_deltas(session, user_id, **{counters[type_]: amount})
+    await bump_analytics(session, gifts=1)
+    await _commit_users(session, user_id)
+    await session.refresh(gift)
+    return gift
+
 async def write_off_gift(session: AsyncSession, gift_id: int):
     q = await session.execute(select(Gift).where(Gift.id == gift_id, Gift.is_written_off == False))
     gift = q.scalar_one_or_none()
@@ -180,12 +569,9 @@ async def get_gifts_by_user(session: AsyncSession, user_id: int, active_only: bo
         )
     return q.scalars().all()
 
-async def get_all_gifts(session: AsyncSession, limit: int = 100, offset: int = 0):
-    """Получить все подарки для админки"""
-    q = await session.execute(
-        select(Gift).order_by(Gift.date_created.desc()).offset(offset).limit(limit)
-    )
-    return q.scalars().all()
+async def get_all_gifts(session: AsyncSession, limit: int = 100, cursor: str = None):
+    """Получить все подарки для админки: (подарки, next_cursor)"""
+    return await paginate(session, select(Gift), (Gift.date_created, Gift.id), limit, cursor)
 
 # FEEDBACK
 async def create_feedback(session: AsyncSession, user_id: int, score: int, text: str = None):
@@ -195,9 +581,8 @@ async def create_feedback(session: AsyncSession, user_id: int, score: int, text:
     await session.refresh(feedback)
     return feedback
 
-async def get_feedbacks(session: AsyncSession, limit: int = 10, offset: int = 0):
-    q = await session.execute(select(Feedback).order_by(Feedback.created_at.desc()).offset(offset).limit(limit))
-    return q.scalars().all()
+async def get_feedbacks(session: AsyncSession, limit: int = 10, cursor: str = None):
+    return await paginate(session, select(Feedback), (Feedback.created_at, Feedback.id), limit, cursor)
 
 # IDEAS
 async def create_idea(session: AsyncSession, user_id: int, text: str):
@@ -207,26 +592,378 @@ async def create_idea(session: AsyncSession, user_id: int, text: str):
     await session.refresh(idea)
     return idea
 
-async def get_ideas(session: AsyncSession, limit: int = 10, offset: int = 0):
-    q = await session.execute(select(Idea).order_by(Idea.created_at.desc()).offset(offset).limit(limit))
-    return q.scalars().all()
+async def get_ideas(session: AsyncSession, limit: int = 10, cursor: str = None):
+    return await paginate(session, select(Idea), (Idea.created_at, Idea.id), limit, cursor)
 
 # NOTIFICATIONS
 async def create_notification(session: AsyncSession, text: str, sent_by: int = None, user_id: int = None):
     notification = Notification(text=text, sent_by=sent_by, user_id=user_id)
+    if user_id is None:
+        # Уведомление всем - номер рассылки для счетчиков непрочитанного и очередь рассылки
+        # (см. common.broadcast). По пользователям рассылка не копируется
+        seq = await session.scalar(
+            pg_insert(NotificationCounter)
+            .values(id=1, broadcast_seq=1)
+            .on_conflict_do_update(
+                index_elements=[NotificationCounter.id],
+                set_={"broadcast_seq": NotificationCounter.broadcast_seq + 1},
+            )
+            .returning(NotificationCounter.broadcast_seq)
+        )
+        notification.broadcast_seq = seq
+        notification.delivery = NotificationDelivery()
+    else:
+        await session.execute(
+            pg_insert(NotificationInbox)
+            .values(user_id=user_id, unread_direct=1, broadcasts_seen=func.coalesce(_broadcast_seq(), 0))
+            .on_conflict_do_update(
+                index_elements=[NotificationInbox.user_id],
+                set_={"unread_direct": NotificationInbox.unread_direct + 1},
+            )
+        )
     session.add(notification)
     await session.commit()
     await session.refresh(notification)
     return notification
 
+def _broadcast_seq():
+    return select(NotificationCounter.broadcast_seq).where(NotificationCounter.id == 1).scalar_subquery()
+
 async def get_notifications_for_user(session: AsyncSession, user_id: int, limit: int = 10, offset: int = 0):
+    """Лента пользователя: личные уведомления и рассылки всем, новые сверху.
+
+    Вместо user_id = X OR user_id IS NULL - две выборки по индексу (user_id, date_sent),
+    каждая не длиннее offset + limit, объединенные через UNION ALL.
+    """
+    order = (Notification.date_sent.desc(), Notification.id.desc())
+    window = offset + limit
+    direct = select(Notification.id).where(Notification.user_id == user_id).order_by(*order).limit(window)
+    broadcast = select(Notification.id).where(Notification.user_id.is_(None)).order_by(*order).limit(window)
+    ids = union_all(select(direct.subquery()), select(broadcast.subquery())).subquery()
     q = await session.execute(
-        select(Notification).where(
-            (Notification.user_id == user_id) | (Notification.user_id == None)
-        ).order_by(Notification.date_sent.desc()).offset(offset).limit(limit)
+        select(Notification).join(ids, Notification.id == ids.c.id).order_by(*order).offset(offset).limit(limit)
     )
     return q.scalars().all()
 
+async def get_unread_count(session: AsyncSession, user_id: int) -> int:
+    """Число непрочитанных уведомлений: одна строка ленты и счетчик рассылок, без обхода уведомлений"""
+    row = (await session.execute(
+        select(NotificationInbox.unread_direct, func.coalesce(_broadcast_seq(), 0) - NotificationInbox.broadcasts_seen)
+        .where(NotificationInbox.user_id == user_id)
+    )).first()
+    if row is None:
+        return 0
+    return row[0] + max(0, row[1])
+
+async def get_inbox(session: AsyncSession, user_id: int, limit: int = 10, offset: int = 0):
+    """Лента с признаком прочтения: ([(уведомление, прочитано)], непрочитанных всего)"""
+    notifications = await get_notifications_for_user(session, user_id, limit, offset)
+    row = (await session.execute(
+        select(NotificationInbox.unread_direct, NotificationInbox.broadcasts_seen, _broadcast_seq())
+        .where(NotificationInbox.user_id == user_id)
+    )).first()
+    unread_direct, seen, seq = row if row else (0, None, None)
+    seq = seq or 0
+    seen = seq if seen is None else seen
+    items = [
+        (n, n.is_read if n.user_id is not None else (n.broadcast_seq or 0) <= seen)
+        for n in notifications
+    ]
+    return items, unread_direct + max(0, seq - seen)
+
+async def mark_notifications_read(session: AsyncSession, user_id: int) -> int:
+    """Отмечает прочитанными все уведомления пользователя. Возвращает, сколько было непрочитанных"""
+    unread = await get_unread_count(session, user_id)
+    marked = await session.execute(
+        update(Notification)
+        .where(Notification.user_id == user_id, Notification.is_read == False)
+        .values(is_read=True)
+        .execution_options(synchronize_session=False)
+    )
+    # Вычитаем отмеченные, а не обнуляем: личное уведомление, пришедшее параллельно, останется непрочитанным
+    await session.execute(
+        pg_insert(NotificationInbox)
+        .values(user_id=user_id, unread_direct=0, broadcasts_seen=func.coalesce(_broadcast_seq(), 0))
+        .on_conflict_do_update(
+            index_elements=[NotificationInbox.user_id],
+            set_={
+                "unread_direct": func.greatest(0, NotificationInbox.unread_direct - marked.rowcount),
+                "broadcasts_seen": func.coalesce(_broadcast_seq(), 0),
+            },
+        )
+    )
+    await session.commit()
+    return unread
+
+async def get_notification_delivery(session: AsyncSession, notification_id: int):
+    q = await session.execute(
+        select(NotificationDelivery).where(NotificationDelivery.notification_id == notification_id)
+    )
+    return q.scalar_one_or_none()
+
+async def claim_broadcast(session: AsyncSession, notification_id: int = None,
+                          stale_after: timedelta = timedelta(minutes=5)):
+    """Берет рассылку в работу: ожидающую или зависшую (чекпоинт не обновлялся stale_after).
+
+    Зависшая рассылка - процесс упал посреди отправки; ее подхватит любой процесс и
+    продолжит с last_user_id. SKIP LOCKED не дает двум процессам взять одну рассылку.
+    """
+    candidate = select(NotificationDelivery.notification_id).where(
+        (NotificationDelivery.status == "pending")
+        | ((NotificationDelivery.status == "running") & (NotificationDelivery.updated_at < func.now() - stale_after))
+    )
+    if notification_id is not None:
+        candidate = candidate.where(NotificationDelivery.notification_id == notification_id)
+    candidate = (
+        candidate.order_by(NotificationDelivery.notification_id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    q = await session.execute(
+        update(NotificationDelivery)
+        .where(NotificationDelivery.notification_id == candidate)
+        .values(
+            status="running",
+            updated_at=func.now(),
+            started_at=func.coalesce(NotificationDelivery.started_at, func.now()),
+        )
+        .returning(NotificationDelivery)
+        .execution_options(populate_existing=True)
+    )
+    delivery = q.scalar_one_or_none()
+    await session.commit()
+    return delivery
+
+async def checkpoint_broadcast(session: AsyncSession, notification_id: int, last_user_id: int, sent: int = 0,
+                               blocked: int = 0, failed: int = 0, throttled: int = 0, done: bool = False):
+    """Сохраняет прогресс рассылки: курсор по users.id и приращения счетчиков.
+
+    False - рассылки уже нет (уведомление удалено вместе с ней).
+    """
+    values_ = dict(
+        last_user_id=func.greatest(NotificationDelivery.last_user_id, last_user_id),
+        sent=NotificationDelivery.sent + sent,
+        blocked=NotificationDelivery.blocked + blocked,
+        failed=NotificationDelivery.failed + failed,
+        throttled=NotificationDelivery.throttled + throttled,
+        updated_at=func.now(),
+    )
+    if done:
+        values_.update(status="done", finished_at=func.now())
+    q = await session.execute(
+        update(NotificationDelivery)
+        .where(NotificationDelivery.notification_id == notification_id)
+        .values(**values_)
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    return q.rowcount > 0
+
+async def touch_broadcast(session: AsyncSession, notification_id: int):
+    """Продлевает захват рассылки: без этого claim_broadcast через stale_after сочтет ее зависшей"""
+    await session.execute(
+        update(NotificationDelivery)
+        .where(NotificationDelivery.notification_id == notification_id, NotificationDelivery.status == "running")
+        .values(updated_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+
+async def get_broadcast_recipients(session: AsyncSession, after_id: int = 0, limit: int = 500):
+    """Следующие limit получателей рассылки (users.id, telegram_id) после after_id по возрастанию id"""
+    q = await session.execute(
+        select(User.id, User.telegram_id)
+        .where(User.id > after_id, User.is_active.isnot(False))
+        .order_by(User.id)
+        .limit(limit)
+    )
+    await session.commit()
+    return [tuple(row) for row in q.all()]
+
+# EXPORT
+# Выгрузки: столбцы и столбец даты для фильтра (None - фильтр по дате не поддерживается)
+EXPORTS = {
+    "orders": (
+        [Order.id, Order.user_id, Order.barista_id, Order.code_id, Order.receipt_number, Order.total_sum,
+         Order.drinks_count, Order.sandwiches_count, Order.use_points, Order.used_points_amount, Order.date_created],
+        Order.date_created,
+    ),
+    "users": (
+        [User.id, User.telegram_id, User.phone, User.first_name, User.last_name, User.birth_date,
+         User.loyalty_status, User.points, User.drinks_count, User.sandwiches_count, User.gift_drinks,
+         User.gift_sandwiches, User.is_active],
+        None,
+    ),
+    "gifts": (
+        [Gift.id, Gift.user_id, Gift.type, Gift.amount, Gift.created_by, Gift.is_written_off, Gift.date_created],
+        Gift.date_created,
+    ),
+    "feedback": (
+        [Feedback.id, Feedback.user_id, Feedback.score, Feedback.text, Feedback.created_at],
+        Feedback.created_at,
+    ),
+}
+
+async def stream_export(session: AsyncSession, kind: str, start: datetime = None, end: datetime = None,
+                        yield_per: int = 1000):
+    """Строки выгрузки kind пачками по yield_per - серверным курсором, без загрузки всей таблицы.
+
+    Фильтр [start, end) - по столбцу даты из EXPORTS, порядок - по (дата, id), как в индексах списков.
+    """
+    columns, date_column = EXPORTS[kind]
+    stmt = select(*columns)
+    if date_column is None:
+        stmt = stmt.order_by(columns[0])
+    else:
+        if start:
+            stmt = stmt.where(date_column >= start)
+        if end:
+            stmt = stmt.where(date_column < end)
+        stmt = stmt.order_by(date_column, columns[0])
+    result = await session.stream(stmt.execution_options(yield_per=yield_per))
+    async for rows in result.partitions():
+        yield rows
+
+# ANALYTICS
+ANALYTICS_SHARDS = 16
+ANALYTICS_COUNTERS = ("orders", "gifts", "drinks", "sandwiches")
+ROLLUP_SHARDS = 4
+ROLLUP_GRANULARITIES = ("hour", "day")
+ROLLUP_FIELDS = ("orders", "revenue", "drinks", "sandwiches", "points_earned", "points_used", "gifts")
+
+def analytics_bump_ctes(**deltas):
+    """Изменяющие CTE (счетчики, срезы текущего часа и дня) для прибавки deltas к аналитике.
+
+    Строки выбираются случайно из ANALYTICS_SHARDS/ROLLUP_SHARDS, поэтому параллельные заказы
+    почти не ждут друг друга на блокировке одной строки.
+    """
+    row = {name: deltas.get(name, 0) for name in ANALYTICS_COUNTERS}
+    counters = pg_insert(AnalyticsCounter).values(shard=random.randrange(ANALYTICS_SHARDS), **row)
+    counters = counters.on_conflict_do_update(
+        index_elements=[AnalyticsCounter.shard],
+        set_={name: getattr(AnalyticsCounter, name) + getattr(counters.excluded, name) for name in row},
+    )
+
+    rollup_row = {name: deltas.get(name, 0) for name in ROLLUP_FIELDS}
+    shard = random.randrange(ROLLUP_SHARDS)
+    rollups = pg_insert(AnalyticsRollup).values([
+        dict(granularity=granularity, bucket=func.date_trunc(granularity, func.now()), shard=shard, **rollup_row)
+        for granularity in ROLLUP_GRANULARITIES
+    ])
+    rollups = rollups.on_conflict_do_update(
+        index_elements=[AnalyticsRollup.granularity, AnalyticsRollup.bucket, AnalyticsRollup.shard],
+        set_={name: getattr(AnalyticsRollup, name) + getattr(rollups.excluded, name) for name in rollup_row},
+    )
+    return counters.cte("bump_counters"), rollups.cte("bump_rollups")
+
+async def bump_analytics(session: AsyncSession, **deltas):
+    """Прибавляет к счетчикам аналитики и к срезам текущего часа и дня одним запросом, без commit"""
+    counters, rollups = analytics_bump_ctes(**deltas)
+    await session.execute(select(literal(1)).add_cte(counters, rollups))
+
+async def get_analytics_summary(session: AsyncSession):
+    """Итоги по заказам и подаркам - сумма по ANALYTICS_SHARDS строкам счетчиков"""
+    row = (await session.execute(
+        select(*[func.coalesce(func.sum(getattr(AnalyticsCounter, name)), 0) for name in ANALYTICS_COUNTERS])
+    )).one()
+    return dict(zip(ANALYTICS_COUNTERS, (int(value) for value in row)))
+
+async def get_loyalty_distribution(session: AsyncSession):
+    """Число клиентов на каждом уровне лояльности (пустые уровни - с нулем)"""
+    rows = await session.execute(select(User.loyalty_status, func.count()).group_by(User.loyalty_status))
+    counts = {level.value: 0 for level in LoyaltyLevelEnum}
+    counts.update({level.value: count for level, count in rows})
+    return counts
+
+async def rebuild_analytics_counters(session: AsyncSession):
+    """Пересчитывает счетчики аналитики по таблицам orders и gifts.
+
+    EXCLUSIVE-блокировка таблицы счетчиков ждет уже идущие записи и задерживает новые до
+    commit: заказ, не попавший в пересчет, прибавится к счетчикам уже после него.
+    """
+    await session.execute(text("LOCK TABLE analytics_counters IN EXCLUSIVE MODE"))
+    orders = (await session.execute(
+        select(func.count(Order.id), func.coalesce(func.sum(Order.drinks_count), 0),
+               func.coalesce(func.sum(Order.sandwiches_count), 0))
+    )).one()
+    gifts = await session.scalar(select(func.count(Gift.id)))
+    await session.execute(delete(AnalyticsCounter))
+    session.add(AnalyticsCounter(shard=0, orders=orders[0], gifts=gifts, drinks=orders[1], sandwiches=orders[2]))
+    await session.commit()
+    return {"orders": orders[0], "gifts": gifts, "drinks": int(orders[1]), "sandwiches": int(orders[2])}
+
+async def get_analytics_timeseries(session: AsyncSession, granularity: str, start: datetime, end: datetime):
+    """Срезы за [start, end) с шагом granularity (hour/day), пустые интервалы - нулями.
+
+    Читаются только строки analytics_rollups нужного диапазона (первичный ключ),
+    таблица orders не затрагивается.
+    """
+    first = func.date_trunc(granularity, start)
+    step = literal_column(f"interval '1 {granularity}'")
+    series = select(func.generate_series(first, end, step).label("bucket")).subquery("series")
+    totals = (
+        select(AnalyticsRollup.bucket, *[func.sum(getattr(AnalyticsRollup, name)).label(name) for name in ROLLUP_FIELDS])
+        .where(AnalyticsRollup.granularity == granularity, AnalyticsRollup.bucket >= first, AnalyticsRollup.bucket < end)
+        .group_by(AnalyticsRollup.bucket)
+        .subquery("totals")
+    )
+    q = await session.execute(
+        select(series.c.bucket, *[func.coalesce(totals.c[name], 0).label(name) for name in ROLLUP_FIELDS])
+        .outerjoin(totals, totals.c.bucket == series.c.bucket)
+        .where(series.c.bucket < end)
+        .order_by(series.c.bucket)
+    )
+    return [{"bucket": row.bucket, **{name: int(row._mapping[name]) for name in ROLLUP_FIELDS}} for row in q]
+
+async def backfill_rollups(session: AsyncSession, since: datetime = None):
+    """Пересчитывает срезы по orders и gifts с начала дня since (без since - всю историю).
+
+    Как и rebuild_analytics_counters, держит EXCLUSIVE-блокировку таблицы срезов до commit.
+    Возвращает число записанных строк срезов.
+    """
+    await session.execute(text("LOCK TABLE analytics_rollups IN EXCLUSIVE MODE"))
+    start = func.date_trunc("day", since) if since else None
+    rebuilt = 0
+    for granularity in ROLLUP_GRANULARITIES:
+        stale = delete(AnalyticsRollup).where(AnalyticsRollup.granularity == granularity)
+        if start is not None:
+            stale = stale.where(AnalyticsRollup.bucket >= start)
+        await session.execute(stale)
+
+        bucket = func.date_trunc(granularity, Order.date_created)
+        orders = select(
+            literal(granularity), bucket, literal(0),
+            func.count(Order.id),
+            func.sum(Order.total_sum),
+            func.sum(Order.drinks_count),
+            func.sum(Order.sandwiches_count),
+            func.sum(case((Order.use_points == True, 0), else_=Order.total_sum // 100)),
+            func.sum(case((Order.use_points == True, Order.used_points_amount), else_=0)),
+            literal(0),
+        ).where(Order.date_created.isnot(None)).group_by(bucket)
+        if start is not None:
+            orders = orders.where(Order.date_created >= start)
+        result = await session.execute(
+            pg_insert(AnalyticsRollup).from_select(["granularity", "bucket", "shard", *ROLLUP_FIELDS], orders)
+        )
+        rebuilt += result.rowcount
+
+        bucket = func.date_trunc(granularity, Gift.date_created)
+        gifts = select(
+            literal(granularity), bucket, literal(0), func.count(Gift.id)
+        ).where(Gift.date_created.isnot(None)).group_by(bucket)
+        if start is not None:
+            gifts = gifts.where(Gift.date_created >= start)
+        stmt = pg_insert(AnalyticsRollup).from_select(["granularity", "bucket", "shard", "gifts"], gifts)
+        result = await session.execute(stmt.on_conflict_do_update(
+            index_elements=[AnalyticsRollup.granularity, AnalyticsRollup.bucket, AnalyticsRollup.shard],
+            set_={"gifts": stmt.excluded.gifts},
+        ))
+        rebuilt += result.rowcount
+    await session.commit()
+    return rebuilt
+
 # BARISTA ACTIONS
 async def log_barista_action(session: AsyncSession, barista_id: int, action_type: str, details: str = None):
     action = BaristaAction(barista_id=barista_id, action_type=action_type, details=details)
@@ -236,35 +973,92 @@ async def log_barista_action(session: AsyncSession, barista_id: int, action_type
     return action
 
 # BIRTHDAY GIFTS
-async def check_and_give_birthday_gift(session: AsyncSession, user_id: int):
-    """Проверяет день рождения пользователя и выдает подарок"""
-    user = await get_user_by_id(session, user_id)
-    if not user or not user.birth_date:
-        return False
-    
-    from .utils import is_birthday_today
-    if is_birthday_today(user.birth_date):
-        # Проверяем, не выдавали ли уже подарок сегодня
-        existing_gift = await session.execute(
-            select(Gift).where(
-                Gift.user_id == user_id,
-                Gift.type == "birthday_drink",
-                func.date(Gift.date_created) == date.today()
-            )
+BIRTHDAY_LOCK_ID = 0x62646179  # pg_advisory_xact_lock: один запуск выдачи подарков за раз
+
+def _birthday_filter(today: date):
+    """Именинники дня; родившиеся 29 февраля в невисокосный год получают подарок 28-го"""
+    days = [(today.month, today.day)]
+    if (today.month, today.day) == (2, 28) and not calendar.isleap(today.year):
+        days.append((2, 29))
+    month, day = extract("month", User.birth_date), extract("day", User.birth_date)
+    return or_(*[and_(month == m, day == d) for m, d in days])
+
+async def give_birthday_gifts(session: AsyncSession, today: date = None) -> int:
+    """Выдает подарки на ДР всем именинникам дня и возвращает их число.
+
+    Именинники ищутся по индексу ix_users_birth_month_day, подарки и gift_drinks
+    пишутся одним запросом (INSERT в CTE + UPDATE). Повторный запуск в тот же день
+    ничего не выдает: получившие подарок сегодня пропускаются.
+    """
+    today = today or date.today()
+    await session.execute(select(func.pg_advisory_xact_lock(BIRTHDAY_LOCK_ID)))
+    new_gifts = (
+        insert(Gift)
+        .from_select(
+            ["user_id", "type", "amount"],
+            select(User.id, literal("birthday_drink"), literal(1)).where(
+                _birthday_filter(today),
+                ~exists().where(
+                    Gift.user_id == User.id,
+                    Gift.type == "birthday_drink",
+                    # Диапазоном, а не date(date_created): так работает индекс ix_gifts_birthday
+                    Gift.date_created >= literal(today, Date),
+                    Gift.date_created < literal(today + timedelta(days=1), Date),
+                ),
+            ),
         )
-        if existing_gift.scalar_one_or_none():
-            return False  # Подарок уже выдан сегодня
-        
-        # Выдаем подарок на день рождения
-        birthday_gift = await create_gift(session, user_id, "birthday_drink", 1)
-        
-        # Обновляем счетчик подарочных напитков
-        await update_user(session, user_id, gift_drinks=user.gift_drinks + 1)
-        
-        return True
-    return False
+        .returning(Gift.user_id)
+        .cte("new_gifts")
+    )
+    result = await session.execute(
+        update(User)
+        .where(User.id.in_(select(new_gifts.c.user_id)))
+        .values(gift_drinks=User.gift_drinks + 1)
+        .returning(User.id)
+        .add_cte(new_gifts)
+        .execution_options(synchronize_session=False)
+    )
+    given = [user_id for user_id, in result.all()]
+    if given:
+        await bump_analytics(session, gifts=len(given))
+    await _commit_users(session, *given)
+    return len(given)
 
 # AUTOMATIC LOYALTY LEVEL UPDATE
+async def recompute_loyalty_levels(session: AsyncSession, chunk_size: int = 50000):
+    """Пересчитывает loyalty_status всех пользователей по текущим LOYALTY_LEVELS.
+
+    UPDATE ... FROM users AS old с CASE из loyalty_level_case переписывает только строки,
+    у которых уровень меняется, и возвращает переходы, сгруппированные в SQL. Пачками
+    по chunk_size id с commit после каждой, чтобы не держать блокировки всей таблицы
+    (0 - одним запросом). Возвращает {(старый уровень, новый уровень): число}.
+    """
+    max_id = await session.scalar(select(func.max(User.id))) or 0
+    step = chunk_size or max(max_id, 1)
+    old = User.__table__.alias("old")
+    new_level = loyalty_level_case(User.drinks_count)
+    moves = Counter()
+    for after_id in range(0, max_id, step):
+        moved = (
+            update(User)
+            # Диапазон и на old: неравенства планировщик через id = old.id не переносит
+            .where(User.id == old.c.id, User.id > after_id, User.id <= after_id + step,
+                   old.c.id > after_id, old.c.id <= after_id + step, User.loyalty_status != new_level)
+            .values(loyalty_status=new_level)
+            .returning(old.c.loyalty_status.label("old_level"), User.loyalty_status.label("new_level"))
+            .cte("moved")
+        )
+        rows = await session.execute(
+            select(moved.c.old_level, moved.c.new_level, func.count())
+            .group_by(moved.c.old_level, moved.c.new_level)
+        )
+        moved_now = 0
+        for old_level, level, count in rows:
+            moves[(old_level, level)] += count
+            moved_now += count
+        await _commit_users(session, all_users=moved_now > 0)
+    return dict(moves)
+
 async def check_and_update_loyalty_level(session: AsyncSession, user_id: int):
     """Проверяет и обновляет уровень лояльности пользователя"""
     user = await get_user_by_id(session, user_id)
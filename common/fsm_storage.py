@@ -0,0 +1,95 @@
+import json
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from common.kv import create_kv
+
+# Данные, прочитанные вместе с состоянием в рамках текущего апдейта (своя копия на задачу)
+_prefetched: ContextVar[Optional[Dict[str, Optional[str]]]] = ContextVar("fsm_prefetched", default=None)
+
+
+class KVStorage(BaseStorage):
+    """FSM-хранилище поверх Redis-совместимого KV (redis.asyncio или MemoryKV).
+
+    Состояние и данные лежат в одном хэше fsm:{bot}:{chat}:{user}[:{thread}]:{destiny}
+    с полями state и data. FSM-мидлварь читает состояние на каждом апдейте, поэтому
+    get_state одним пайплайном делает HMGET state,data и продлевает TTL, а данные
+    запоминаются до конца обработки апдейта - get_data в хендлере не ходит в KV.
+    Брошенные сессии (регистрация, заказ) удаляются сами по истечении ttl.
+    """
+
+    def __init__(self, kv, ttl: Optional[int] = 24 * 3600, prefix: str = "fsm"):
+        self.kv = kv
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, key: StorageKey) -> str:
+        parts = [self.prefix, str(key.bot_id), str(key.chat_id), str(key.user_id)]
+        if key.thread_id:
+            parts.append(str(key.thread_id))
+        parts.append(key.destiny)
+        return ":".join(parts)
+
+    def _remember(self, name: str, data: Optional[str]):
+        prefetched = _prefetched.get()
+        if prefetched is None:
+            prefetched = {}
+            _prefetched.set(prefetched)
+        prefetched[name] = data
+
+    async def _write(self, name: str, field: str, value: Optional[str]):
+        async with self.kv.pipeline(transaction=True) as pipe:
+            if value is None:
+                pipe.hdel(name, field)
+            else:
+                pipe.hset(name, field, value)
+                if self.ttl:
+                    pipe.expire(name, self.ttl)
+            await pipe.execute()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        await self._write(self._key(key), "state", value)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        name = self._key(key)
+        async with self.kv.pipeline(transaction=False) as pipe:
+            pipe.hmget(name, ["state", "data"])
+            if self.ttl:
+                pipe.expire(name, self.ttl)
+            results = await pipe.execute()
+        state, data = results[0]
+        # Новый апдейт начинается с чтения состояния: то, что запомнили раньше, сбрасываем
+        _prefetched.set({name: data})
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        name = self._key(key)
+        raw = json.dumps(data, ensure_ascii=False) if data else None
+        await self._write(name, "data", raw)
+        self._remember(name, raw)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        name = self._key(key)
+        prefetched = _prefetched.get()
+        if prefetched is not None and name in prefetched:
+            raw = prefetched[name]
+        else:
+            raw = await self.kv.hget(name, "data")
+            self._remember(name, raw)
+        return json.loads(raw) if raw else {}
+
+    async def close(self) -> None:
+        await self.kv.aclose()
+
+
+def create_fsm_storage(url: str, ttl: Optional[int] = 24 * 3600) -> BaseStorage:
+    """FSM-хранилище по URL: пусто - MemoryStorage aiogram, memory:// или redis:// - KVStorage"""
+    kv = create_kv(url)
+    if kv is None:
+        return MemoryStorage()
+    return KVStorage(kv, ttl=ttl)
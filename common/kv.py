@@ -0,0 +1,176 @@
+import heapq
+import time
+
+
+class MemoryKV:
+    """Хранилище ключ-значение в памяти процесса с подмножеством API redis.asyncio.
+
+    Локальный бэкенд для одного процесса и фейк Redis для тестов. Значения - строки,
+    как у Redis(decode_responses=True). Ключи с TTL удаляются автоматически.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._data = {}
+        self._expires = {}
+        self._heap = []
+
+    def _purge(self):
+        now = self._clock()
+        while self._heap and self._heap[0][0] <= now:
+            deadline, key = heapq.heappop(self._heap)
+            if self._expires.get(key) == deadline:
+                del self._expires[key]
+                self._data.pop(key, None)
+
+    def _set_ttl(self, key, seconds):
+        if seconds is None:
+            self._expires.pop(key, None)
+            return
+        deadline = self._clock() + seconds
+        self._expires[key] = deadline
+        heapq.heappush(self._heap, (deadline, key))
+
+    async def get(self, key):
+        self._purge()
+        value = self._data.get(key)
+        return value if isinstance(value, str) else None
+
+    async def mget(self, keys, *args):
+        keys = list(keys) if isinstance(keys, (list, tuple)) else [keys]
+        return [await self.get(key) for key in [*keys, *args]]
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        self._purge()
+        if nx and key in self._data:
+            return None
+        self._data[key] = str(value)
+        self._set_ttl(key, ex if ex is not None else (px / 1000 if px is not None else None))
+        return True
+
+    async def incrby(self, key, amount=1):
+        self._purge()
+        value = int(self._data.get(key, 0)) + amount
+        self._data[key] = str(value)
+        return value
+
+    async def incr(self, key, amount=1):
+        return await self.incrby(key, amount)
+
+    async def delete(self, *keys):
+        self._purge()
+        removed = 0
+        for key in keys:
+            if self._data.pop(key, None) is not None:
+                removed += 1
+            self._expires.pop(key, None)
+        return removed
+
+    async def exists(self, *keys):
+        self._purge()
+        return sum(1 for key in keys if key in self._data)
+
+    async def expire(self, key, seconds):
+        self._purge()
+        if key not in self._data:
+            return False
+        self._set_ttl(key, seconds)
+        return True
+
+    async def ttl(self, key):
+        self._purge()
+        if key not in self._data:
+            return -2
+        if key not in self._expires:
+            return -1
+        return max(0, round(self._expires[key] - self._clock()))
+
+    async def hset(self, name, key=None, value=None, mapping=None):
+        self._purge()
+        bucket = self._data.setdefault(name, {})
+        items = dict(mapping or {})
+        if key is not None:
+            items[key] = value
+        added = sum(1 for k in items if k not in bucket)
+        bucket.update({k: str(v) for k, v in items.items()})
+        return added
+
+    async def hget(self, name, key):
+        self._purge()
+        bucket = self._data.get(name)
+        return bucket.get(key) if isinstance(bucket, dict) else None
+
+    async def hmget(self, name, keys, *args):
+        self._purge()
+        keys = list(keys) if isinstance(keys, (list, tuple)) else [keys]
+        bucket = self._data.get(name)
+        bucket = bucket if isinstance(bucket, dict) else {}
+        return [bucket.get(k) for k in [*keys, *args]]
+
+    async def hgetall(self, name):
+        self._purge()
+        bucket = self._data.get(name)
+        return dict(bucket) if isinstance(bucket, dict) else {}
+
+    async def hdel(self, name, *keys):
+        self._purge()
+        bucket = self._data.get(name)
+        if not isinstance(bucket, dict):
+            return 0
+        removed = sum(1 for k in keys if bucket.pop(k, None) is not None)
+        if not bucket:
+            await self.delete(name)
+        return removed
+
+    async def hincrby(self, name, key, amount=1):
+        self._purge()
+        bucket = self._data.setdefault(name, {})
+        value = int(bucket.get(key, 0)) + amount
+        bucket[key] = str(value)
+        return value
+
+    def pipeline(self, transaction=True):
+        return MemoryPipeline(self)
+
+    async def ping(self):
+        return True
+
+    async def aclose(self):
+        pass
+
+
+class MemoryPipeline:
+    """Пайплайн MemoryKV: команды копятся и выполняются в execute(), как у redis.asyncio"""
+
+    def __init__(self, kv: MemoryKV):
+        self._kv = kv
+        self._commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self._kv, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self):
+        commands, self._commands = self._commands, []
+        return [await method(*args, **kwargs) for method, args, kwargs in commands]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self._commands = []
+
+
+def create_kv(url: str):
+    """KV-хранилище по URL: пусто - None, memory:// - в памяти процесса, иначе Redis"""
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return MemoryKV()
+    from redis.asyncio import Redis
+    return Redis.from_url(url, decode_responses=True)
@@ -1,5 +1,5 @@
 from sqlalchemy import (
-    Column, Integer, String, Boolean, Date, DateTime, ForeignKey, Enum, Text, func
+    Column, Integer, BigInteger, String, Boolean, Date, DateTime, ForeignKey, Enum, Text, Index, extract, func, text
 )
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.dialects.postgresql import ENUM
@@ -44,6 +44,10 @@ class User(Base):
     feedbacks = relationship("Feedback", back_populates="user", cascade="all, delete-orphan")
     ideas = relationship("Idea", back_populates="user", cascade="all, delete-orphan")
     notifications = relationship("Notification", back_populates="user", cascade="all, delete-orphan")
+    inbox = relationship("NotificationInbox", uselist=False, cascade="all, delete-orphan")
+
+# Именинники дня (crud.give_birthday_gifts) - по (месяц, день) рождения без обхода всех пользователей
+Index("ix_users_birth_month_day", extract("month", User.birth_date), extract("day", User.birth_date))
 
 class Barista(Base):
     __tablename__ = "baristas"
@@ -57,10 +61,15 @@ class Barista(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    # Keyset-пагинация списков заказов (common.pagination): общий и по пользователю
+    __table_args__ = (
+        Index("ix_orders_date_created_id", "date_created", "id"),
+        Index("ix_orders_user_id_date_created_id", "user_id", "date_created", "id"),
+    )
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     barista_id = Column(Integer, ForeignKey("baristas.id"))
-    code_id = Column(Integer, ForeignKey("codes.id"))
+    code_id = Column(Integer, ForeignKey("codes.id"), index=True)
     receipt_number = Column(String, nullable=False)
     total_sum = Column(Integer, nullable=False)
     drinks_count = Column(Integer, default=0, nullable=False)
@@ -75,8 +84,14 @@ class Order(Base):
 
 class Code(Base):
     __tablename__ = "codes"
+    # Код уникален только среди неиспользованных: использованные и истекшие коды переиспользуются
+    __table_args__ = (
+        Index("uq_codes_code_unused", "code", unique=True, postgresql_where=text("is_used = false")),
+        Index("ix_codes_unused_expires_at", "expires_at", postgresql_where=text("is_used = false")),
+        Index("ix_codes_used_expires_at_id", "expires_at", "id", postgresql_where=text("is_used = true")),
+    )
     id = Column(Integer, primary_key=True)
-    code = Column(String, unique=True, nullable=False, index=True)
+    code = Column(String, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"))
     is_used = Column(Boolean, default=False)
     expires_at = Column(DateTime, nullable=False)
@@ -85,6 +100,14 @@ class Code(Base):
 
 class Gift(Base):
     __tablename__ = "gifts"
+    __table_args__ = (
+        Index("ix_gifts_date_created_id", "date_created", "id"),
+        # Подарки пользователя (все и только активные) - сразу в порядке date_created
+        Index("ix_gifts_user_id_date_created", "user_id", "date_created"),
+        Index("ix_gifts_user_id_active", "user_id", "date_created", postgresql_where=text("is_written_off = false")),
+        # "Подарок на ДР сегодня уже выдан?"
+        Index("ix_gifts_birthday", "user_id", "date_created", postgresql_where=text("type = 'birthday_drink'")),
+    )
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     type = Column(String, nullable=False)  # drink/sandwich
@@ -97,6 +120,9 @@ class Gift(Base):
 
 class Feedback(Base):
     __tablename__ = "feedbacks"
+    __table_args__ = (
+        Index("ix_feedbacks_created_at_id", "created_at", "id"),
+    )
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     score = Column(Integer)
@@ -106,6 +132,9 @@ class Feedback(Base):
 
 class Idea(Base):
     __tablename__ = "ideas"
+    __table_args__ = (
+        Index("ix_ideas_created_at_id", "created_at", "id"),
+    )
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     text = Column(Text, nullable=False)
@@ -114,13 +143,86 @@ class Idea(Base):
 
 class Notification(Base):
     __tablename__ = "notifications"
+    # Лента пользователя - два поиска по (user_id, date_sent): user_id = X и user_id IS NULL
+    __table_args__ = (
+        Index("ix_notifications_user_id_date_sent", "user_id", "date_sent"),
+        Index("ix_notifications_unread", "user_id", postgresql_where=text("is_read = false AND user_id IS NOT NULL")),
+    )
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # null = all
     text = Column(Text, nullable=False)
     sent_by = Column(Integer, ForeignKey("baristas.id"), nullable=True)
     date_sent = Column(DateTime(timezone=True), server_default=func.now())
+    is_read = Column(Boolean, default=False, nullable=False)  # только для личных уведомлений
+    broadcast_seq = Column(Integer, nullable=True)  # порядковый номер рассылки всем (user_id = null)
     user = relationship("User", back_populates="notifications")
     barista = relationship("Barista")
+    delivery = relationship("NotificationDelivery", back_populates="notification", uselist=False,
+                            cascade="all, delete-orphan")
+
+class NotificationDelivery(Base):
+    """Ход рассылки уведомления всем (user_id = null): статус, чекпоинт и статистика"""
+    __tablename__ = "notification_deliveries"
+    __table_args__ = (
+        Index("ix_notification_deliveries_active", "status", postgresql_where=text("status <> 'done'")),
+    )
+    notification_id = Column(Integer, ForeignKey("notifications.id", ondelete="CASCADE"), primary_key=True)
+    status = Column(String, default="pending", nullable=False)  # pending/running/done
+    last_user_id = Column(Integer, default=0, nullable=False)  # users.id последнего обработанного получателя
+    sent = Column(Integer, default=0, nullable=False)
+    blocked = Column(Integer, default=0, nullable=False)
+    failed = Column(Integer, default=0, nullable=False)
+    throttled = Column(Integer, default=0, nullable=False)  # ответов 429 от Telegram
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    notification = relationship("Notification", back_populates="delivery")
+
+class NotificationInbox(Base):
+    """Состояние ленты уведомлений пользователя.
+
+    Рассылки всем не копируются по пользователям: прочитанными считаются рассылки
+    с broadcast_seq <= broadcasts_seen, непрочитанных - NotificationCounter.broadcast_seq
+    минус broadcasts_seen. Личные непрочитанные считаются в unread_direct.
+    """
+    __tablename__ = "notification_inbox"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    unread_direct = Column(Integer, default=0, nullable=False)
+    broadcasts_seen = Column(Integer, default=0, nullable=False)
+
+class NotificationCounter(Base):
+    """Счетчик рассылок всем: одна строка id = 1"""
+    __tablename__ = "notification_counters"
+    id = Column(Integer, primary_key=True)
+    broadcast_seq = Column(Integer, default=0, nullable=False)
+
+class AnalyticsCounter(Base):
+    """Итоги для /analytics/summary: сумма по всем строкам. Пишутся в транзакциях заказов и
+    подарков в случайную из нескольких строк, чтобы не было одной горячей строки"""
+    __tablename__ = "analytics_counters"
+    shard = Column(Integer, primary_key=True)
+    orders = Column(BigInteger, default=0, nullable=False)
+    gifts = Column(BigInteger, default=0, nullable=False)
+    drinks = Column(BigInteger, default=0, nullable=False)
+    sandwiches = Column(BigInteger, default=0, nullable=False)
+
+class AnalyticsRollup(Base):
+    """Почасовые и дневные срезы заказов и подарков для /analytics/timeseries.
+
+    Ведутся вместе с AnalyticsCounter; строка среза тоже выбирается случайно из нескольких
+    (shard), при чтении строки одного bucket суммируются.
+    """
+    __tablename__ = "analytics_rollups"
+    granularity = Column(String, primary_key=True)  # hour/day
+    bucket = Column(DateTime(timezone=True), primary_key=True)  # date_trunc(granularity, date_created)
+    shard = Column(Integer, primary_key=True)
+    orders = Column(BigInteger, default=0, nullable=False)
+    revenue = Column(BigInteger, default=0, nullable=False)
+    drinks = Column(BigInteger, default=0, nullable=False)
+    sandwiches = Column(BigInteger, default=0, nullable=False)
+    points_earned = Column(BigInteger, default=0, nullable=False)
+    points_used = Column(BigInteger, default=0, nullable=False)
+    gifts = Column(BigInteger, default=0, nullable=False)
 
 class BaristaAction(Base):
     __tablename__ = "barista_actions"
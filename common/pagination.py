@@ -0,0 +1,58 @@
+"""Keyset-пагинация списков: новые сверху, следующая страница - строки "после" курсора.
+
+Курсор - непрозрачная строка (base64 JSON значений ключа сортировки последней строки).
+В отличие от OFFSET, стоимость страницы не зависит от глубины, а вставки между
+запросами не дают пропусков и повторов.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Optional, Sequence
+
+from sqlalchemy import DateTime, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values: Sequence) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise InvalidCursor(cursor)
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) else int(value)
+            for column, value in zip(columns, values)
+        ]
+    except (ValueError, TypeError, binascii.Error):
+        raise InvalidCursor(cursor)
+
+
+async def paginate(session: AsyncSession, stmt, columns: Sequence, limit: int, cursor: Optional[str] = None):
+    """Страница stmt (select(Model) с фильтрами) по ключу columns по убыванию.
+
+    Последний столбец ключа должен быть уникальным (id). Для постоянной стоимости нужен
+    индекс по (фильтры..., *columns). Возвращает (строки, next_cursor или None).
+    limit вне 1..MAX_PAGE_SIZE не доходит до БД: пустая страница или не больше MAX_PAGE_SIZE строк.
+    """
+    if limit < 1:
+        return [], None
+    limit = min(limit, MAX_PAGE_SIZE)
+    if cursor:
+        stmt = stmt.where(tuple_(*columns) < tuple_(*decode_cursor(cursor, columns)))
+    rows = (await session.scalars(stmt.order_by(*[column.desc() for column in columns]).limit(limit + 1))).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor([getattr(rows[-1], column.key) for column in columns])
@@ -0,0 +1,165 @@
+import enum
+import json
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Optional
+
+
+def _plain(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+class ProfileCache:
+    """Кэш профилей пользователей (значений столбцов users) по id и telegram_id.
+
+    Локальный уровень - LRU на max_size профилей. Необязательный общий уровень - KV (Redis
+    или MemoryKV), его видят все процессы API. Сбросы публикуются через KV: invalidate
+    увеличивает общий счетчик сбросов ({prefix}:seq) и записывает его значение в версию
+    профиля ({prefix}:ver:<id>), clear - в нижнюю границу для всех ({prefix}:all). Профиль
+    хранится с меткой счетчика, снятой до чтения из БД (snapshot), и годен, только пока метка
+    не меньше версии. Версия проверяется при каждом чтении, в том числе при попадании в
+    локальный уровень (один MGET), поэтому сброс из любого процесса действует сразу, а профиль,
+    прочитанный из БД до чужой записи, не вернется в кэш. Локальный уровень при этом живет
+    не дольше local_ttl секунд, общий - ttl.
+
+    Без KV сбросы видит только свой процесс: так кэш можно включать, лишь когда все записи
+    идут через один процесс API.
+
+    Профили - словари простых значений (уровни и роли - строками, даты - ISO), их можно
+    отдать в UserOut.model_validate. Записи в crud сбрасывают профиль после commit.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 30.0, kv=None, prefix: str = "profile",
+                 clock=time.monotonic, local_ttl: float = 5.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.local_ttl = min(ttl, local_ttl) if kv is not None else ttl
+        self.kv = kv
+        self.prefix = prefix
+        self._clock = clock
+        self._profiles = OrderedDict()  # id -> (истекает, метка счетчика сбросов, профиль)
+        self._ids = {}  # telegram_id -> id
+        self._invalidations = 0
+        self.hits = 0
+        self.kv_hits = 0
+        self.misses = 0
+
+    def _key(self, kind, value=None):
+        return f"{self.prefix}:{kind}" if value is None else f"{self.prefix}:{kind}:{value}"
+
+    def _get_local(self, user_id):
+        entry = self._profiles.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] <= self._clock():
+            self._drop_local(user_id)
+            return None
+        self._profiles.move_to_end(user_id)
+        return entry
+
+    def _put_local(self, profile, stamp=0):
+        self._profiles[profile["id"]] = (self._clock() + self.local_ttl, stamp, profile)
+        self._profiles.move_to_end(profile["id"])
+        self._ids[profile["telegram_id"]] = profile["id"]
+        while len(self._profiles) > self.max_size:
+            self._drop_local(next(iter(self._profiles)))
+
+    def _drop_local(self, user_id):
+        entry = self._profiles.pop(user_id, None)
+        if entry is not None and self._ids.get(entry[2]["telegram_id"]) == user_id:
+            del self._ids[entry[2]["telegram_id"]]
+
+    async def snapshot(self) -> tuple:
+        """Метка для put, снятая до чтения из БД: профиль, прочитанный до сброса, в кэш не попадет"""
+        seq = int(await self.kv.get(self._key("seq")) or 0) if self.kv is not None else 0
+        return self._invalidations, seq, self._clock()
+
+    async def get(self, user_id: int = None, telegram_id: str = None) -> Optional[dict]:
+        if user_id is None:
+            user_id = self._ids.get(telegram_id)
+        local = self._get_local(user_id) if user_id is not None else None
+        if self.kv is None:
+            if local is not None:
+                self.hits += 1
+                return local[2]
+            self.misses += 1
+            return None
+
+        if user_id is None:
+            user_id = await self.kv.get(self._key("tg", telegram_id))
+            if user_id is None:
+                self.misses += 1
+                return None
+            user_id = int(user_id)
+        keys = [self._key("all"), self._key("ver", user_id)]
+        if local is None:
+            keys.append(self._key("id", user_id))
+        floor, version, *raw = await self.kv.mget(keys)
+        current = max(int(floor or 0), int(version or 0))
+        if local is not None and local[1] >= current:
+            self.hits += 1
+            return local[2]
+        if raw and raw[0] is not None:
+            entry = json.loads(raw[0])
+            if entry["stamp"] >= current:
+                self._put_local(entry["profile"], entry["stamp"])
+                self.kv_hits += 1
+                return entry["profile"]
+        self._drop_local(user_id)
+        self.misses += 1
+        return None
+
+    async def put(self, profile: dict, snapshot: tuple = None) -> dict:
+        """Кладет профиль в кэш и возвращает его в виде, в котором он хранится"""
+        profile = {key: _plain(value) for key, value in profile.items()}
+        if snapshot is None:
+            snapshot = await self.snapshot()
+        invalidations, stamp, taken_at = snapshot
+        # Слишком старая метка могла пережить ключ версии (он живет 2 * ttl), такой профиль не кладем
+        if invalidations != self._invalidations or self._clock() - taken_at > self.ttl:
+            return profile
+        self._put_local(profile, stamp)
+        if self.kv is not None:
+            ttl = max(1, round(self.ttl))
+            async with self.kv.pipeline(transaction=False) as pipe:
+                pipe.set(self._key("id", profile["id"]), json.dumps({"stamp": stamp, "profile": profile}), ex=ttl)
+                pipe.set(self._key("tg", profile["telegram_id"]), profile["id"], ex=ttl)
+                await pipe.execute()
+        return profile
+
+    async def invalidate(self, *user_ids):
+        self._invalidations += 1
+        for user_id in user_ids:
+            self._drop_local(user_id)
+        if self.kv is not None and user_ids:
+            seq = await self.kv.incr(self._key("seq"))
+            # Версия переживает любой профиль, положенный с меткой меньше seq
+            ttl = max(1, round(2 * self.ttl))
+            async with self.kv.pipeline(transaction=False) as pipe:
+                for user_id in user_ids:
+                    pipe.set(self._key("ver", user_id), seq, ex=ttl)
+                pipe.delete(*[self._key("id", user_id) for user_id in user_ids])
+                await pipe.execute()
+
+    async def clear(self):
+        """Сбрасывает все профили (после массовых обновлений, где id не известны)"""
+        self._invalidations += 1
+        self._profiles.clear()
+        self._ids.clear()
+        if self.kv is not None:
+            await self.kv.set(self._key("all"), await self.kv.incr(self._key("seq")))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.kv_hits + self.misses
+        return {
+            "size": len(self._profiles),
+            "hits": self.hits,
+            "kv_hits": self.kv_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.kv_hits) / lookups if lookups else 0.0,
+        }
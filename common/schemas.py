@@ -1,8 +1,15 @@
 from pydantic import BaseModel, Field
 from datetime import date, datetime
-from typing import Optional, List
+from typing import Dict, Generic, Optional, List, TypeVar
 import enum
 
+T = TypeVar("T")
+
+class Page(BaseModel, Generic[T]):
+    """Страница списка; next_cursor передается в ?cursor= за следующей (None - страниц больше нет)"""
+    items: List[T]
+    next_cursor: Optional[str] = None
+
 class RoleEnum(str, enum.Enum):
     client = "client"
     barista = "barista"
@@ -77,8 +84,8 @@ class OrderCreate(BaseModel):
 class OrderOut(BaseModel):
     id: int
     user_id: int
-    barista_id: int
-    code_id: int
+    barista_id: Optional[int]
+    code_id: Optional[int]  # в БД столбцы nullable: заказ может быть без кода
     receipt_number: str
     total_sum: int
     drinks_count: int
@@ -90,6 +97,17 @@ class OrderOut(BaseModel):
     class Config:
         from_attributes = True
 
+class OrderBatchItemResult(BaseModel):
+    index: int
+    ok: bool
+    order_id: Optional[int] = None
+    error: Optional[str] = None
+
+class OrderBatchOut(BaseModel):
+    created: int
+    failed: int
+    results: List[OrderBatchItemResult]
+
 # Gifts
 class GiftCreate(BaseModel):
     user_id: int
@@ -155,6 +173,33 @@ class NotificationOut(BaseModel):
     class Config:
         from_attributes = True
 
+class InboxItemOut(BaseModel):
+    id: int
+    text: str
+    date_sent: datetime
+    is_broadcast: bool
+    is_read: bool
+
+class InboxOut(BaseModel):
+    unread: int
+    items: List[InboxItemOut]
+
+class UnreadCountOut(BaseModel):
+    unread: int
+
+class NotificationDeliveryOut(BaseModel):
+    notification_id: int
+    status: str
+    sent: int
+    blocked: int
+    failed: int
+    throttled: int
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
 # Barista Actions
 class BaristaActionOut(BaseModel):
     id: int
@@ -165,3 +210,32 @@ class BaristaActionOut(BaseModel):
 
     class Config:
         from_attributes = True
+
+# Analytics
+class TimeseriesPoint(BaseModel):
+    bucket: datetime
+    orders: int
+    revenue: int
+    drinks: int
+    sandwiches: int
+    points_earned: int
+    points_used: int
+    gifts: int
+
+class TimeseriesOut(BaseModel):
+    granularity: str
+    start: datetime
+    end: datetime
+    points: List[TimeseriesPoint]
+
+class AnalyticsSummaryOut(BaseModel):
+    total_orders: int
+    total_gifts: int
+    total_drinks: int
+    total_sandwiches: int
+
+class DashboardOut(BaseModel):
+    summary: AnalyticsSummaryOut
+    loyalty_levels: Dict[str, int]  # уровень -> число клиентов
+    recent_orders: List[OrderOut]
+    recent_feedbacks: List[FeedbackOut]
@@ -0,0 +1,27 @@
+"""unique codes only among unused ones
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Уникальность по всей истории не дает переиспользовать коды из 100 000 возможных
+    op.drop_constraint('codes_code_key', 'codes', type_='unique')
+    op.create_index(
+        'uq_codes_code_unused', 'codes', ['code'], unique=True,
+        postgresql_where=sa.text('is_used = false'),
+    )
+
+def downgrade():
+    op.drop_index('uq_codes_code_unused', table_name='codes')
+    op.create_unique_constraint('codes_code_key', 'codes', ['code'])
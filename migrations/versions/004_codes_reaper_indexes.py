@@ -0,0 +1,33 @@
+"""indexes for the expired codes reaper
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # CONCURRENTLY не блокирует выдачу и погашение кодов, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        # Живые коды: прогрев индекса кодов и поиск истекших - только по неиспользованным строкам.
+        # Горячий индекс поиска по коду уже частичный (uq_codes_code_unused, миграция 003)
+        op.create_index(
+            'ix_codes_unused_expires_at', 'codes', ['expires_at'],
+            postgresql_where=sa.text('is_used = false'),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        # Проверка "на код ссылается заказ" перед удалением
+        op.create_index('ix_orders_code_id', 'orders', ['code_id'], postgresql_concurrently=True, if_not_exists=True)
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_orders_code_id', table_name='orders', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_codes_unused_expires_at', table_name='codes', postgresql_concurrently=True, if_exists=True)
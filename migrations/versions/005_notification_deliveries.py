@@ -0,0 +1,40 @@
+"""broadcast delivery progress for notifications
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Рассылки, созданные до этой миграции, не отправляются: строк для них нет
+    op.create_table(
+        'notification_deliveries',
+        sa.Column('notification_id', sa.Integer(),
+                  sa.ForeignKey('notifications.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('status', sa.String(), nullable=False, server_default='pending'),
+        sa.Column('last_user_id', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('sent', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('blocked', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('failed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('throttled', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index(
+        'ix_notification_deliveries_active', 'notification_deliveries', ['status'],
+        postgresql_where=sa.text("status <> 'done'"),
+    )
+
+def downgrade():
+    op.drop_index('ix_notification_deliveries_active', table_name='notification_deliveries')
+    op.drop_table('notification_deliveries')
@@ -0,0 +1,67 @@
+"""notification inbox: read state and unread counters
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('notifications', sa.Column('is_read', sa.Boolean(), nullable=False, server_default=sa.false()))
+    op.add_column('notifications', sa.Column('broadcast_seq', sa.Integer(), nullable=True))
+    op.create_table(
+        'notification_inbox',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('unread_direct', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('broadcasts_seen', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.create_table(
+        'notification_counters',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('broadcast_seq', sa.Integer(), nullable=False, server_default='0'),
+    )
+
+    # Номера уже отправленных рассылок; всё, что было до миграции, считаем прочитанным
+    op.execute("""
+        UPDATE notifications n SET broadcast_seq = s.seq
+        FROM (SELECT id, row_number() OVER (ORDER BY id) AS seq FROM notifications WHERE user_id IS NULL) s
+        WHERE n.id = s.id
+    """)
+    op.execute("INSERT INTO notification_counters (id, broadcast_seq) "
+               "SELECT 1, count(*) FROM notifications WHERE user_id IS NULL")
+    op.execute("UPDATE notifications SET is_read = true WHERE user_id IS NOT NULL")
+    op.execute("INSERT INTO notification_inbox (user_id, unread_direct, broadcasts_seen) "
+               "SELECT id, 0, (SELECT broadcast_seq FROM notification_counters WHERE id = 1) FROM users")
+
+    # CONCURRENTLY не блокирует запись уведомлений, но не работает внутри транзакции:
+    # autocommit_block сначала фиксирует столбцы и таблицы выше
+    with op.get_context().autocommit_block():
+        # Лента: user_id = X и user_id IS NULL - оба поиска по одному индексу, сразу в порядке date_sent
+        op.create_index(
+            'ix_notifications_user_id_date_sent', 'notifications', ['user_id', 'date_sent'],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            'ix_notifications_unread', 'notifications', ['user_id'],
+            postgresql_where=sa.text('is_read = false AND user_id IS NOT NULL'),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_notifications_unread', table_name='notifications',
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_notifications_user_id_date_sent', table_name='notifications',
+                      postgresql_concurrently=True, if_exists=True)
+    op.drop_table('notification_counters')
+    op.drop_table('notification_inbox')
+    op.drop_column('notifications', 'broadcast_seq')
+    op.drop_column('notifications', 'is_read')
@@ -0,0 +1,37 @@
+"""sharded analytics counters for the summary endpoint
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'analytics_counters',
+        sa.Column('shard', sa.Integer(), primary_key=True),
+        sa.Column('orders', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('gifts', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('drinks', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('sandwiches', sa.BigInteger(), nullable=False, server_default='0'),
+    )
+    # Начальные значения - из существующих заказов и подарков (дальше: python -m api.cli reconcile-analytics)
+    op.execute("""
+        INSERT INTO analytics_counters (shard, orders, gifts, drinks, sandwiches)
+        SELECT 0,
+               (SELECT count(*) FROM orders),
+               (SELECT count(*) FROM gifts),
+               (SELECT coalesce(sum(drinks_count), 0) FROM orders),
+               (SELECT coalesce(sum(sandwiches_count), 0) FROM orders)
+    """)
+
+def downgrade():
+    op.drop_table('analytics_counters')
@@ -0,0 +1,49 @@
+"""hourly and daily analytics rollups
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+FIELDS = ('orders', 'revenue', 'drinks', 'sandwiches', 'points_earned', 'points_used', 'gifts')
+
+def upgrade():
+    op.create_table(
+        'analytics_rollups',
+        sa.Column('granularity', sa.String(), primary_key=True),
+        sa.Column('bucket', sa.DateTime(timezone=True), primary_key=True),
+        sa.Column('shard', sa.Integer(), primary_key=True),
+        *[sa.Column(name, sa.BigInteger(), nullable=False, server_default='0') for name in FIELDS],
+    )
+    # История - в строку shard = 0 (то же делает python -m api.cli backfill-rollups)
+    for granularity in ('hour', 'day'):
+        op.execute(f"""
+            INSERT INTO analytics_rollups
+                (granularity, bucket, shard, orders, revenue, drinks, sandwiches, points_earned, points_used, gifts)
+            SELECT '{granularity}', date_trunc('{granularity}', date_created), 0,
+                   count(*), sum(total_sum), sum(drinks_count), sum(sandwiches_count),
+                   sum(CASE WHEN use_points THEN 0 ELSE total_sum / 100 END),
+                   sum(CASE WHEN use_points THEN used_points_amount ELSE 0 END),
+                   0
+            FROM orders WHERE date_created IS NOT NULL
+            GROUP BY 2
+        """)
+        op.execute(f"""
+            INSERT INTO analytics_rollups (granularity, bucket, shard, gifts)
+            SELECT '{granularity}', date_trunc('{granularity}', date_created), 0, count(*)
+            FROM gifts WHERE date_created IS NOT NULL
+            GROUP BY 2
+            ON CONFLICT (granularity, bucket, shard) DO UPDATE SET gifts = excluded.gifts
+        """)
+
+def downgrade():
+    op.drop_table('analytics_rollups')
@@ -0,0 +1,34 @@
+"""indexes for keyset pagination of list endpoints
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+
+from alembic import op
+
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+# (имя, таблица, столбцы) - ключи сортировки списков в common/crud.py
+INDEXES = [
+    ('ix_orders_date_created_id', 'orders', ['date_created', 'id']),
+    ('ix_orders_user_id_date_created_id', 'orders', ['user_id', 'date_created', 'id']),
+    ('ix_gifts_date_created_id', 'gifts', ['date_created', 'id']),
+    ('ix_feedbacks_created_at_id', 'feedbacks', ['created_at', 'id']),
+    ('ix_ideas_created_at_id', 'ideas', ['created_at', 'id']),
+]
+
+def upgrade():
+    # CONCURRENTLY не блокирует запись в таблицы, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,36 @@
+"""indexes for per-user gift lookups and the birthday gift check
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+# (имя, таблица, столбцы, условие частичного индекса)
+INDEXES = [
+    ('ix_gifts_user_id_date_created', 'gifts', ['user_id', 'date_created'], None),
+    ('ix_gifts_user_id_active', 'gifts', ['user_id', 'date_created'], 'is_written_off = false'),
+    ('ix_gifts_birthday', 'gifts', ['user_id', 'date_created'], "type = 'birthday_drink'"),
+]
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name, table, columns,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True, if_not_exists=True,
+            )
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
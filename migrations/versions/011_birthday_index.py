@@ -0,0 +1,28 @@
+"""expression index for the daily birthday gifts job
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Выражения должны совпадать с запросом crud.give_birthday_gifts
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_users_birth_month_day', 'users',
+            [sa.text('EXTRACT(month FROM birth_date)'), sa.text('EXTRACT(day FROM birth_date)')],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_users_birth_month_day', table_name='users', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,28 @@
+"""index for the reaper cursor over used codes
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Курсор crud.reap_codes по использованным кодам: (expires_at, id) > :after
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_codes_used_expires_at_id', 'codes', ['expires_at', 'id'],
+            postgresql_where=sa.text('is_used = true'),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_codes_used_expires_at_id', table_name='codes', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,15 @@
+import asyncio
+
+import pytest
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: замеры пропускной способности, пропуск: -m 'not slow'")
+
+
+@pytest.fixture(scope="session")
+def event_loop():
+    # Один event loop на всю сессию: пул соединений api.deps привязан к циклу, в котором создан
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
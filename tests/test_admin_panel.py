@@ -0,0 +1,114 @@
+import asyncio
+
+import httpx
+import pytest
+from httpx import AsyncClient
+
+import admin_panel.main as admin
+from api.config import settings
+from common.api_client import ApiClient
+
+
+def fake_feedbacks(total):
+    """API отзывов: total записей страницами по limit, курсор - id последней"""
+    calls = []
+
+    def handler(request):
+        limit = int(request.url.params["limit"])
+        after = int(request.url.params.get("cursor", total + 1))
+        calls.append(limit)
+        ids = list(range(after - 1, max(0, after - 1 - limit), -1))
+        items = [{"id": i, "user_id": 1, "score": 9, "text": f"<b>{i}</b>", "created_at": "2026-10-18"} for i in ids]
+        return httpx.Response(200, json={"items": items, "next_cursor": str(ids[-1]) if ids and ids[-1] > 1 else None})
+
+    return ApiClient("http://api", transport=httpx.MockTransport(handler)), calls
+
+
+@pytest.mark.asyncio
+async def test_table_is_streamed_in_api_chunks(monkeypatch):
+    api, calls = fake_feedbacks(25)
+    monkeypatch.setattr(admin, "API_CHUNK", 4)
+    monkeypatch.setattr(admin, "PAGE_ROWS", 10)
+
+    chunks = [chunk async for chunk in admin.stream_table(admin.FEEDBACKS_TABLE, api.list_feedbacks, "/feedbacks")]
+    await api.close()
+
+    # Заголовок, три пачки строк (4 + 4 + 2) и хвост со ссылкой на следующую страницу
+    assert calls == [4, 4, 2]
+    assert len(chunks) == 5
+    page = "".join(chunks)
+    assert page.count("<tr><td>") == 10
+    assert "&lt;b&gt;25&lt;/b&gt;" in page and "<b>25</b>" not in page
+    assert '<a href="/feedbacks?cursor=16">' in page
+
+
+@pytest.mark.asyncio
+async def test_table_page_requires_login_and_streams_html(monkeypatch):
+    api, _ = fake_feedbacks(3)
+    monkeypatch.setattr(admin, "api", api)
+
+    async with AsyncClient(app=admin.app, base_url="http://admin") as client:
+        r = await client.get("/feedbacks")
+        assert r.status_code == 302
+
+        await client.post("/login", data={"username": settings.ADMIN_LOGIN, "password": settings.ADMIN_PASSWORD})
+        r = await client.get("/feedbacks")
+    await api.close()
+
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/html")
+    assert r.text.count("<tr><td>") == 3
+    assert "Следующая страница" not in r.text
+    assert r.text.rstrip().endswith("</html>")
+
+
+@pytest.mark.asyncio
+async def test_dashboard_and_analytics_share_one_cached_api_call(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(200, json={
+            "summary": {"total_orders": 7, "total_gifts": 1, "total_drinks": 9, "total_sandwiches": 2},
+            "loyalty_levels": {"Стандарт": 5, "Серебро": 1, "Золото": 0, "Платина": 0},
+            "recent_orders": [], "recent_feedbacks": [
+                {"id": 1, "user_id": 1, "score": 3, "text": "<script>", "created_at": "2026-10-18"}
+            ],
+        })
+
+    api = ApiClient("http://api", transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(admin, "api", api)
+    monkeypatch.setattr(admin, "_dashboard_cache", {"data": None, "expires": 0.0})
+
+    async with AsyncClient(app=admin.app, base_url="http://admin") as client:
+        await client.post("/login", data={"username": settings.ADMIN_LOGIN, "password": settings.ADMIN_PASSWORD})
+        pages = await asyncio.gather(client.get("/dashboard"), client.get("/dashboard"), client.get("/analytics"))
+    await api.close()
+
+    assert calls == ["/analytics/dashboard"]
+    assert '<div class="stat-number">7</div>' in pages[0].text
+    assert "&lt;script&gt;" in pages[0].text
+    assert "<td>Серебро</td><td>1</td>" in pages[2].text
+
+
+@pytest.mark.asyncio
+async def test_dashboard_shows_unavailable_and_does_not_cache_api_errors(monkeypatch, caplog):
+    responses = [httpx.Response(503), httpx.Response(200, json={
+        "summary": {"total_orders": 4}, "loyalty_levels": {}, "recent_orders": [], "recent_feedbacks": [],
+    })]
+    api = ApiClient("http://api", transport=httpx.MockTransport(lambda request: responses.pop(0)))
+    monkeypatch.setattr(admin, "api", api)
+    monkeypatch.setattr(admin, "_dashboard_cache", {"data": None, "expires": 0.0})
+
+    async with AsyncClient(app=admin.app, base_url="http://admin") as client:
+        await client.post("/login", data={"username": settings.ADMIN_LOGIN, "password": settings.ADMIN_PASSWORD})
+        failed = await client.get("/dashboard")
+        recovered = await client.get("/dashboard")
+    await api.close()
+
+    assert "Данные недоступны" in failed.text and "503" in failed.text
+    assert 'class="stat-number">0<' not in failed.text
+    assert "503" in caplog.text
+    # Ошибка не закэширована: следующая загрузка снова спросила API
+    assert responses == []
+    assert '<div class="stat-number">4</div>' in recovered.text
+
@@ -0,0 +1,53 @@
+import uuid
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select
+from api.deps import AsyncSessionLocal
+from api.main import app
+from common import crud
+from common.models import AnalyticsCounter, Gift, Order
+
+
+async def summary(ac):
+    r = await ac.get("/analytics/summary")
+    assert r.status_code == 200
+    return r.json()
+
+
+@pytest.mark.asyncio
+async def test_summary_counters_follow_writes_and_reconcile():
+    async with AsyncSessionLocal() as session:
+        synced = await crud.rebuild_analytics_counters(session)
+        user = await crud.create_user(session, telegram_id=f"stats-{uuid.uuid4().hex[:12]}")
+        barista = await crud.create_barista(session, telegram_id=f"stats-b-{uuid.uuid4().hex[:12]}")
+        code = await crud.generate_code(session, user.id)
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        before = await summary(ac)
+        async with AsyncSessionLocal() as session:
+            await crud.process_order(session, user.id, barista.id, code.id, "S-1", 500, 2, 1)
+            await crud.issue_gift(session, user.id, "drink", 1)
+            await crud.create_orders_batch(session, [
+                {"user_id": user.id, "barista_id": barista.id, "code_id": code.id,
+                 "receipt_number": f"S-B{i}", "total_sum": 100, "drinks_count": 1, "sandwiches_count": 0}
+                for i in range(3)
+            ])
+        after = await summary(ac)
+
+    assert after["total_orders"] - before["total_orders"] == 4
+    assert after["total_gifts"] - before["total_gifts"] == 1
+    assert after["total_drinks"] - before["total_drinks"] == 5
+    assert after["total_sandwiches"] - before["total_sandwiches"] == 1
+
+    async with AsyncSessionLocal() as session:
+        # Счетчики разошлись с таблицами (ручная правка) - пересчет восстанавливает итоги.
+        # Сверяем с пересчетом в начале теста: разница - только строки этого теста
+        await session.execute(AnalyticsCounter.__table__.update().values(orders=AnalyticsCounter.orders + 7))
+        await session.commit()
+        rebuilt = await crud.rebuild_analytics_counters(session)
+        assert {name: rebuilt[name] - synced[name] for name in rebuilt} == {
+            "orders": 4, "gifts": 1, "drinks": 5, "sandwiches": 1}
+        assert rebuilt["orders"] == await session.scalar(select(func.count(Order.id)))
+        assert rebuilt["gifts"] == await session.scalar(select(func.count(Gift.id)))
+        assert await crud.get_analytics_summary(session) == rebuilt
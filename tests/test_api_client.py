@@ -0,0 +1,43 @@
+import httpx
+import pytest
+
+from common.api_client import ApiClient
+
+
+def make_client(handler):
+    return ApiClient("http://api", transport=httpx.MockTransport(handler))
+
+
+@pytest.mark.asyncio
+async def test_api_client_reuses_one_connection_pool():
+    seen = []
+
+    def handler(request):
+        seen.append((request.method, request.url.path, dict(request.url.params)))
+        if request.url.path == "/codes/use":
+            return httpx.Response(200, json={"id": 1, "user_id": 42})
+        return httpx.Response(200, json={"id": 42})
+
+    api = make_client(handler)
+    code, status = await api.use_code("12345")
+    user, _ = await api.get_user(code["user_id"])
+    await api.close()
+
+    assert status == 200 and user["id"] == 42
+    assert seen == [("POST", "/codes/use", {"code_value": "12345"}), ("GET", "/users/42", {})]
+
+
+@pytest.mark.asyncio
+async def test_api_client_maps_errors_to_status():
+    def handler(request):
+        if request.url.path == "/users/1":
+            return httpx.Response(404, json={"detail": "Пользователь не найден"})
+        if request.url.path == "/users/2":
+            raise httpx.ReadTimeout("timeout", request=request)
+        raise httpx.ConnectError("refused", request=request)
+
+    api = make_client(handler)
+    assert await api.get_user(1) == (None, 404)
+    assert await api.get_user(2) == (None, 408)
+    assert await api.get_user(3) == (None, 500)
+    await api.close()
@@ -0,0 +1,50 @@
+import uuid
+from datetime import date
+
+import pytest
+from sqlalchemy import select
+
+from api.deps import AsyncSessionLocal
+from common import crud
+from common.models import Gift, User
+
+
+async def _user(session, birth_date):
+    return await crud.create_user(session, telegram_id=f"bday-{uuid.uuid4().hex[:12]}", birth_date=birth_date)
+
+
+async def _gifts(session, user_id):
+    return (await session.scalars(
+        select(Gift).where(Gift.user_id == user_id, Gift.type == "birthday_drink")
+    )).all()
+
+
+@pytest.mark.asyncio
+async def test_daily_job_gives_gifts_once():
+    today = date.today()
+    async with AsyncSessionLocal() as session:
+        birthday = await _user(session, today.replace(year=1990 if (today.month, today.day) != (2, 29) else 1992))
+        other = await _user(session, date(1990, 1, 1) if (today.month, today.day) != (1, 1) else date(1990, 1, 2))
+        before = await crud.get_analytics_summary(session)
+
+        given = await crud.give_birthday_gifts(session)
+        assert given >= 1
+        # Повторный запуск в тот же день ничего не выдает
+        assert await crud.give_birthday_gifts(session) == 0
+
+        assert len(await _gifts(session, birthday.id)) == 1
+        assert await _gifts(session, other.id) == []
+        users = {u.id: u for u in (await session.scalars(
+            select(User).where(User.id.in_([birthday.id, other.id])).execution_options(populate_existing=True)
+        )).all()}
+        assert users[birthday.id].gift_drinks == 1
+        assert users[other.id].gift_drinks == 0
+        assert (await crud.get_analytics_summary(session))["gifts"] == before["gifts"] + given
+
+
+@pytest.mark.asyncio
+async def test_leap_day_birthdays_celebrated_on_feb_28():
+    async with AsyncSessionLocal() as session:
+        leap = await _user(session, date(2000, 2, 29))
+        await crud.give_birthday_gifts(session, date(2027, 2, 28))
+        assert len(await _gifts(session, leap.id)) == 1
@@ -0,0 +1,224 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from sqlalchemy import delete, func, select, text, update
+from api.deps import AsyncSessionLocal
+from common import crud
+from common.broadcast import BroadcastDispatcher, TelegramSender, TokenBucket
+from common.models import Notification, NotificationDelivery, User
+
+
+class FakeTelegram:
+    """Bot API sendMessage с лимитом limit сообщений в секунду на бота.
+
+    При превышении отвечает 429 с retry_after; запрос до истечения retry_after, пришедший
+    позже grace после 429 (не был уже в пути), считается нарушением. Чаты с "blocked"
+    в id отвечают 403.
+    """
+
+    def __init__(self, limit: int, retry_after: int = 1, grace: float = 0.05):
+        self.limit = limit
+        self.retry_after = retry_after
+        self.grace = grace
+        self.received = {}
+        self.throttled = 0
+        self.violations = 0
+        self._window = (0.0, 0)
+        self._blocked_until = 0.0
+
+    async def send_message(self, request):
+        data = await request.json()
+        now = time.monotonic()
+        if now < self._blocked_until:
+            if now > self._blocked_until - self.retry_after + self.grace:
+                self.violations += 1
+            return self._too_many()
+        started, count = self._window
+        if now - started >= 1:
+            started, count = now, 0
+        if count >= self.limit:
+            self._blocked_until = now + self.retry_after
+            return self._too_many()
+        self._window = (started, count + 1)
+        chat_id = str(data["chat_id"])
+        if "blocked" in chat_id:
+            return web.json_response({"ok": False, "error_code": 403, "description": "Forbidden"}, status=403)
+        self.received[chat_id] = self.received.get(chat_id, 0) + 1
+        return web.json_response({"ok": True, "result": {"message_id": 1}})
+
+    def _too_many(self):
+        self.throttled += 1
+        return web.json_response({
+            "ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {self.retry_after}",
+            "parameters": {"retry_after": self.retry_after},
+        }, status=429)
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/sendMessage", self.send_message)
+        return app
+
+
+async def start_fake(limit, retry_after=1):
+    fake = FakeTelegram(limit, retry_after)
+    server = TestServer(fake.app())
+    await server.start_server()
+    return fake, server
+
+
+async def create_recipients(session, count, blocked=0):
+    prefix = uuid.uuid4().hex[:8]
+    users = [User(telegram_id=f"bc-{prefix}-{i}") for i in range(count)]
+    users += [User(telegram_id=f"bc-{prefix}-blocked-{i}") for i in range(blocked)]
+    session.add_all(users)
+    await session.commit()
+    return users
+
+
+@pytest.mark.asyncio
+async def test_broadcast_respects_retry_after_and_records_stats():
+    fake, server = await start_fake(limit=10)
+    sender = TelegramSender("42:TEST", str(server.make_url("/")))
+    try:
+        async with AsyncSessionLocal() as session:
+            users = await create_recipients(session, 20, blocked=2)
+            note = await crud.create_notification(session, "Акция: второй кофе в подарок")
+            active = await session.scalar(select(func.count()).select_from(User).where(User.is_active.isnot(False)))
+
+        dispatcher = BroadcastDispatcher(AsyncSessionLocal, sender, rate=300, checkpoint_every=50)
+        delivery = await dispatcher.run_next(note.id)
+
+        assert delivery.status == "done"
+        assert fake.violations == 0
+        assert fake.throttled > 0 and delivery.throttled == fake.throttled
+        assert delivery.sent + delivery.blocked + delivery.failed == active
+        assert delivery.blocked >= 2
+        assert all(fake.received.get(u.telegram_id) == 1 for u in users if "blocked" not in u.telegram_id)
+        # Рассылка завершена - повторно не берется
+        assert await dispatcher.run_next(note.id) is None
+    finally:
+        await sender.close()
+        await server.close()
+
+
+@pytest.mark.asyncio
+async def test_crashed_broadcast_resumes_from_checkpoint():
+    fake, server = await start_fake(limit=1000)
+    sender = TelegramSender("42:TEST", str(server.make_url("/")))
+    try:
+        async with AsyncSessionLocal() as session:
+            users = await create_recipients(session, 6)
+            note = await crud.create_notification(session, "Мы открылись после ремонта")
+            # Процесс упал после чекпоинта на третьем получателе и больше не обновлял прогресс
+            await session.execute(
+                update(NotificationDelivery)
+                .where(NotificationDelivery.notification_id == note.id)
+                .values(status="running", last_user_id=users[2].id, sent=3,
+                        updated_at=datetime.now(timezone.utc) - timedelta(hours=1))
+            )
+            await session.commit()
+
+        dispatcher = BroadcastDispatcher(AsyncSessionLocal, sender, rate=1000)
+        delivery = await dispatcher.run_next(note.id)
+
+        assert delivery.status == "done"
+        assert not any(u.telegram_id in fake.received for u in users[:3])
+        assert all(fake.received.get(u.telegram_id) == 1 for u in users[3:])
+        assert delivery.sent == 3 + len(fake.received)
+    finally:
+        await sender.close()
+        await server.close()
+
+
+@pytest.mark.asyncio
+async def test_claim_is_renewed_during_retry_after_pause():
+    fake, server = await start_fake(limit=1000, retry_after=2)
+    sender = TelegramSender("42:TEST", str(server.make_url("/")))
+    try:
+        async with AsyncSessionLocal() as session:
+            await create_recipients(session, 4)
+            note = await crud.create_notification(session, "Сегодня до 23:00")
+        # Лимит текущей секунды уже выбран: первый же запрос получит 429 и паузу на 2 с
+        fake._window = (time.monotonic(), fake.limit)
+
+        dispatcher = BroadcastDispatcher(AsyncSessionLocal, sender, rate=1000, stale_after=0.6)
+        running = asyncio.create_task(dispatcher.run_next(note.id))
+        while not fake.throttled:
+            await asyncio.sleep(0.01)
+        # Пауза по retry_after дольше stale_after: захват продлевается, рассылку никто не перехватит
+        await asyncio.sleep(1)
+        async with AsyncSessionLocal() as session:
+            assert await crud.claim_broadcast(session, note.id, timedelta(seconds=0.6)) is None
+            # Получатели читаются короткими транзакциями: во время отправки транзакция не висит открытой
+            idle = await session.scalar(text(
+                "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() "
+                "AND state = 'idle in transaction' AND pid <> pg_backend_pid()"
+            ))
+            assert idle == 0
+
+        delivery = await running
+        assert delivery.status == "done"
+        assert fake.violations == 0
+    finally:
+        await sender.close()
+        await server.close()
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_pause_blocks_all_waiters():
+    bucket = TokenBucket(rate=1000)
+    bucket.pause(0.2)
+    started = time.monotonic()
+    await asyncio.gather(*[bucket.acquire() for _ in range(5)])
+    assert time.monotonic() - started >= 0.2
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_does_not_burst_after_pause():
+    now = [0.0]
+    bucket = TokenBucket(rate=10, capacity=10, clock=lambda: now[0])
+    bucket.pause(5)
+    # Запас копится с конца паузы, а не за всю паузу: после retry_after пачка не уходит
+    now[0] = 5.2
+    await bucket.acquire()
+    assert bucket._tokens == pytest.approx(1)
+    now[0] = 5.5
+    await bucket.acquire()
+    assert bucket._tokens == pytest.approx(3)
+
+
+@pytest.mark.asyncio
+async def test_notification_deleted_after_claim_is_skipped(monkeypatch):
+    fake, server = await start_fake(limit=1000)
+    sender = TelegramSender("42:TEST", str(server.make_url("/")))
+    try:
+        async with AsyncSessionLocal() as session:
+            await create_recipients(session, 3)
+            note = await crud.create_notification(session, "Отменено")
+
+        claim_broadcast = crud.claim_broadcast
+
+        async def claim_then_delete(session, *args):
+            delivery = await claim_broadcast(session, *args)
+            async with AsyncSessionLocal() as other:
+                await other.execute(delete(Notification).where(Notification.id == delivery.notification_id))
+                await other.commit()
+            return delivery
+
+        monkeypatch.setattr(crud, "claim_broadcast", claim_then_delete)
+        dispatcher = BroadcastDispatcher(AsyncSessionLocal, sender, rate=1000)
+        delivery = await dispatcher.run_next(note.id)
+
+        assert delivery.notification_id == note.id
+        assert fake.received == {}
+        async with AsyncSessionLocal() as session:
+            assert await crud.get_notification_delivery(session, note.id) is None
+    finally:
+        await sender.close()
+        await server.close()
+
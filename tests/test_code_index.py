@@ -0,0 +1,64 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from api.deps import AsyncSessionLocal
+from common import crud
+from common.codes import ActiveCodeIndex
+from common.kv import MemoryKV
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_memory_kv_evicts_expired_keys():
+    clock = FakeClock()
+    kv = MemoryKV(clock=clock)
+    await kv.set("a", "1", px=500)
+    await kv.set("b", "2")
+    assert await kv.get("a") == "1"
+
+    clock.now += 1
+    assert await kv.get("a") is None
+    assert await kv.get("b") == "2"
+    assert "a" not in kv._data
+
+
+@pytest.mark.asyncio
+async def test_unknown_and_expired_codes_rejected_without_database():
+    kv = MemoryKV()
+    index = ActiveCodeIndex(kv)
+    now = datetime.utcnow()
+    await index.add("11111", 1, 1, now + timedelta(seconds=90))
+    # Запись, которую KV еще не вытеснил, но срок кода уже вышел
+    await kv.set(index.prefix + "22222", f"2:1:{(now - timedelta(seconds=1)).isoformat()}")
+
+    previous, crud.active_code_index = crud.active_code_index, index
+    try:
+        # session=None: любое обращение к БД упало бы с ошибкой
+        assert await crud.use_code(None, "99999") is None
+        assert await crud.use_code(None, "22222") is None
+    finally:
+        crud.active_code_index = previous
+
+
+@pytest.mark.asyncio
+async def test_indexed_code_is_used_once():
+    previous = crud.active_code_index
+    async with AsyncSessionLocal() as session:
+        await crud.set_active_code_index(session, MemoryKV())
+        user = await crud.create_user(session, telegram_id=f"index-{uuid.uuid4().hex[:12]}")
+        try:
+            code = await crud.generate_code(session, user.id)
+            used = await crud.use_code(session, code.code)
+            assert used is not None and used.is_used
+            assert used.id == code.id
+            assert await crud.use_code(session, code.code) is None
+        finally:
+            crud.active_code_index = previous
@@ -0,0 +1,92 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import delete, select, update
+from api.deps import AsyncSessionLocal
+from common import crud
+from common.models import Code, Order
+
+
+@pytest_asyncio.fixture
+async def reaper_codes():
+    """Коды теста: значения уникальны в каждом прогоне (9 цифр - вне пространства выдачи),
+    строки и их заказы удаляются после теста, даже если он упал"""
+    prefix = f"{uuid.uuid4().int % 10 ** 8:08d}"
+    created = []
+
+    def make(n, **kwargs):
+        code = Code(code=f"{prefix}{n}", **kwargs)
+        created.append(code)
+        return code
+
+    yield make
+    async with AsyncSessionLocal() as session:
+        ids = [code.id for code in created if code.id is not None]
+        await session.execute(delete(Order).where(Order.code_id.in_(ids)))
+        await session.execute(delete(Code).where(Code.id.in_(ids)))
+        await session.commit()
+
+
+async def create_people(session):
+    user = await crud.create_user(session, telegram_id=f"reaper-{uuid.uuid4().hex[:12]}")
+    barista = await crud.create_barista(session, telegram_id=f"reaper-b-{uuid.uuid4().hex[:12]}")
+    return user, barista
+
+
+@pytest.mark.asyncio
+async def test_reaper_removes_only_expired_codes_without_orders(reaper_codes):
+    async with AsyncSessionLocal() as session:
+        user, barista = await create_people(session)
+        past = datetime.utcnow() - timedelta(days=2)
+        codes = {
+            "expired": reaper_codes(1, user_id=user.id, expires_at=past),
+            "used": reaper_codes(2, user_id=user.id, expires_at=past, is_used=True),
+            "ordered": reaper_codes(3, user_id=user.id, expires_at=past, is_used=True),
+            "live": reaper_codes(4, user_id=user.id, expires_at=datetime.utcnow() + timedelta(seconds=90)),
+        }
+        session.add_all(codes.values())
+        await session.commit()
+        ids = {name: code.id for name, code in codes.items()}
+        await crud.process_order(session, user_id=user.id, barista_id=barista.id, code_id=ids["ordered"],
+                                 receipt_number="R-1", total_sum=100, drinks_count=1, sandwiches_count=0)
+
+        reaped, after = await crud.reap_codes(session, batch_size=1)
+        assert reaped >= 2
+        assert after is not None
+
+        left = set((await session.scalars(select(Code.id).where(Code.id.in_(ids.values())))).all())
+        assert left == {ids["ordered"], ids["live"]}
+
+
+@pytest.mark.asyncio
+async def test_reaper_cursor_does_not_skip_reused_code_rows(reaper_codes):
+    async with AsyncSessionLocal() as session:
+        user, barista = await create_people(session)
+        now = datetime.utcnow()
+        # Строка с меньшим id истекла недавно - ее еще не удаляют, но generate_code может переиспользовать
+        recent = reaper_codes(1, user_id=user.id, expires_at=now - timedelta(minutes=5))
+        session.add(recent)
+        await session.commit()
+        ordered = reaper_codes(2, user_id=user.id, expires_at=now - timedelta(days=2), is_used=True)
+        session.add(ordered)
+        await session.commit()
+        await crud.process_order(session, user_id=user.id, barista_id=barista.id, code_id=ordered.id,
+                                 receipt_number="R-2", total_sum=100, drinks_count=1, sandwiches_count=0)
+        assert recent.id < ordered.id
+
+        # Первый запуск уводит курсор за код с заказом
+        _, after = await crud.reap_codes(session)
+        assert after >= (ordered.expires_at, ordered.id)
+
+        # Строку переиспользовали на месте (как ON CONFLICT в generate_code) и погасили без заказа,
+        # а потом срок прошел: id прежний, меньше курсора
+        await session.execute(update(Code).where(Code.id == recent.id)
+                              .values(expires_at=datetime.utcnow() - timedelta(hours=1), is_used=True))
+        await session.commit()
+
+        reaped, _ = await crud.reap_codes(session, older_than=timedelta(minutes=30), after=after)
+        assert reaped >= 1
+        left = set((await session.scalars(select(Code.id).where(Code.id.in_([recent.id, ordered.id])))).all())
+        assert left == {ordered.id}
@@ -0,0 +1,39 @@
+import random
+from datetime import datetime, timedelta
+
+from common.codes import CodeAllocator
+
+
+def make_allocator(space=100):
+    return CodeAllocator(space=space, rng=random.Random(42))
+
+
+def test_allocator_never_hands_out_live_code():
+    now = datetime(2026, 1, 1)
+    allocator = make_allocator()
+    live = {f"{n:05d}": now + timedelta(seconds=90) for n in range(0, 100, 2)}
+    allocator.load(live)
+
+    issued = [allocator.allocate(now + timedelta(seconds=90), now) for _ in range(50)]
+
+    assert len(set(issued)) == 50
+    assert not set(issued) & set(live)
+    assert allocator.allocate(now + timedelta(seconds=90), now) is None
+
+
+def test_allocator_recycles_used_and_expired_codes():
+    now = datetime(2026, 1, 1)
+    allocator = make_allocator(space=3)
+    used = allocator.allocate(now + timedelta(seconds=90), now)
+    expiring = allocator.allocate(now + timedelta(seconds=10), now)
+    allocator.allocate(now + timedelta(seconds=90), now)
+    assert allocator.allocate(now + timedelta(seconds=90), now) is None
+
+    allocator.release(used)
+    allocator.release(used)  # повторный release не дублирует код в пуле
+    assert allocator.free_count == 1
+    assert allocator.allocate(now + timedelta(seconds=90), now) == used
+
+    later = now + timedelta(seconds=11)
+    assert allocator.allocate(later + timedelta(seconds=90), later) == expiring
+    assert allocator.live_count == 3
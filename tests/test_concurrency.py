@@ -0,0 +1,151 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+
+from api.config import settings
+from common import crud
+from common.models import LoyaltyLevelEnum
+
+PARALLEL_ORDERS = 300
+# Замер пропускной способности: заказов в каждой фазе и минимальное ускорение параллельной
+THROUGHPUT_ORDERS = 200
+PARALLEL_SPEEDUP_FLOOR = 1.5
+
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine(settings.DATABASE_URL, pool_size=20, max_overflow=0)
+    yield async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+    await engine.dispose()
+
+
+async def create_customer(session_factory, **kwargs):
+    async with session_factory() as session:
+        user = await crud.create_user(session, telegram_id=f"stress-{uuid.uuid4().hex[:12]}", **kwargs)
+        barista = await crud.create_barista(session, telegram_id=f"stress-b-{uuid.uuid4().hex[:12]}")
+        return user.id, barista.id
+
+
+async def place_order(session_factory, user_id, barista_id, **kwargs):
+    async with session_factory() as session:
+        order = dict(user_id=user_id, barista_id=barista_id, code_id=None, receipt_number="S-1",
+                     total_sum=250, drinks_count=1, sandwiches_count=1)
+        order.update(kwargs)
+        return await crud.process_order(session, **order)
+
+
+@pytest.mark.asyncio
+async def test_parallel_orders_do_not_lose_increments(session_factory):
+    user_id, barista_id = await create_customer(session_factory)
+
+    results = await asyncio.gather(*[
+        place_order(session_factory, user_id, barista_id) for _ in range(PARALLEL_ORDERS)
+    ])
+
+    assert all(order is not None for order, _ in results)
+    async with session_factory() as session:
+        user = await crud.get_user_by_id(session, user_id)
+    assert user.drinks_count == PARALLEL_ORDERS
+    assert user.sandwiches_count == PARALLEL_ORDERS
+    assert user.points == PARALLEL_ORDERS * 2
+    assert user.loyalty_status.value == "Платина"
+    # Каждое повышение (Серебро, Золото, Платина) сообщено ровно одним заказом
+    upgrades = [stats["new_level"] for _, stats in results if stats["level_upgraded"]]
+    assert sorted(upgrades) == sorted(["Серебро", "Золото", "Платина"]), upgrades
+
+
+@pytest.mark.asyncio
+async def test_level_change_compares_with_stored_status(session_factory):
+    # Уровень сохранен выше формулы (пересчет со старыми порогами): 49 напитков, но уже Золото.
+    # Заказ доводит до 50 - формула дает то же Золото, повышения нет
+    user_id, barista_id = await create_customer(session_factory, drinks_count=49,
+                                                loyalty_status=LoyaltyLevelEnum.gold)
+    _, stats = await place_order(session_factory, user_id, barista_id, sandwiches_count=0)
+    assert stats["level_upgraded"] is False and stats["new_level"] is None
+
+    # Обычное повышение по-прежнему сообщается
+    user_id, barista_id = await create_customer(session_factory, drinks_count=49,
+                                                loyalty_status=LoyaltyLevelEnum.silver)
+    _, stats = await place_order(session_factory, user_id, barista_id, sandwiches_count=0)
+    assert stats["level_upgraded"] is True and stats["new_level"] == "Золото"
+
+
+@pytest.mark.asyncio
+async def test_order_holds_user_row_lock_only_for_last_statements(session_factory):
+    # Заказы одного клиента сериализуются на блокировке его строки users. Она держится от
+    # UPDATE до COMMIT, поэтому UPDATE - последний запрос транзакции (при повышении уровня -
+    # два последних), а строку не читают и не блокируют заранее (SELECT ... FOR UPDATE,
+    # чтение-изменение-запись в Python)
+    sync_engine = session_factory.kw["bind"].sync_engine
+    events = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        events.append(statement)
+
+    def on_commit(conn):
+        events.append("COMMIT")
+
+    user_id, barista_id = await create_customer(session_factory, drinks_count=18)
+    event.listen(sync_engine, "before_cursor_execute", on_execute)
+    event.listen(sync_engine, "commit", on_commit)
+    try:
+        _, plain = await place_order(session_factory, user_id, barista_id)
+        plain_events, events[:] = list(events), []
+        _, upgrade = await place_order(session_factory, user_id, barista_id)
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", on_execute)
+        event.remove(sync_engine, "commit", on_commit)
+
+    assert plain["points_earned"] == 2 and plain["level_upgraded"] is False
+    assert upgrade["new_level"] == "Серебро"
+    # INSERT заказа, UPDATE users вместе с аналитикой, COMMIT; повышение - еще один UPDATE users
+    assert len(plain_events) == 3 and len(events) == 4, (plain_events, events)
+    for statements in (plain_events, events):
+        assert "INSERT INTO orders" in statements[0] and statements[-1] == "COMMIT"
+        assert "UPDATE users" in statements[1]
+        assert "analytics_rollups" in statements[1] and "analytics_counters" in statements[1]
+    assert events[2].lstrip().startswith("UPDATE users SET loyalty_status")
+    assert not any(" FOR " in statement or statement.lstrip().startswith("SELECT users.")
+                   for statement in plain_events + events), plain_events + events
+
+
+@pytest.mark.slow
+@pytest.mark.asyncio
+async def test_parallel_orders_for_different_customers_outpace_sequential(session_factory):
+    # Заказы разных клиентов не ждут друг друга: строки users разные, срезы аналитики выбираются
+    # случайно из нескольких. Параллельно (по пулу из 20 соединений) они должны идти быстрее,
+    # чем по одному; запас на шум - порог PARALLEL_SPEEDUP_FLOOR, а не ожидаемое ускорение
+    customers = [await create_customer(session_factory) for _ in range(2 * THROUGHPUT_ORDERS)]
+    sequential, parallel = customers[:THROUGHPUT_ORDERS], customers[THROUGHPUT_ORDERS:]
+
+    started = time.perf_counter()
+    for user_id, barista_id in sequential:
+        await place_order(session_factory, user_id, barista_id)
+    sequential_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await asyncio.gather(*[place_order(session_factory, user_id, barista_id) for user_id, barista_id in parallel])
+    parallel_seconds = time.perf_counter() - started
+
+    speedup = sequential_seconds / parallel_seconds
+    assert speedup >= PARALLEL_SPEEDUP_FLOOR, (sequential_seconds, parallel_seconds)
+
+
+@pytest.mark.asyncio
+async def test_parallel_redemptions_never_go_negative(session_factory):
+    user_id, barista_id = await create_customer(session_factory, points=50)
+
+    await asyncio.gather(*[
+        place_order(session_factory, user_id, barista_id, use_points=True, used_points_amount=3)
+        for _ in range(100)
+    ])
+
+    async with session_factory() as session:
+        user = await crud.get_user_by_id(session, user_id)
+    assert user.points == 0
+    assert user.drinks_count == 100
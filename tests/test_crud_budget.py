@@ -0,0 +1,32 @@
+import pytest
+from common.models import Base
+from benchmarks import bench_crud
+from benchmarks.utils import BENCH_DATABASE_URL, create_bench_engine
+
+
+@pytest.mark.asyncio
+async def test_hot_paths_within_query_budget():
+    # Бенчмарк досеивает клиентов и выдает подарки - только на отдельной БД, как python -m benchmarks.bench_crud
+    if not BENCH_DATABASE_URL:
+        pytest.skip("BENCH_DATABASE_URL не задан")
+    engine, session_factory = create_bench_engine()
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        results = await bench_crud.run(session_factory, engine, users=200, notifications=2, calls=3,
+                                       names=list(bench_crud.CASES))
+    finally:
+        await engine.dispose()
+
+    assert set(results) == set(bench_crud.QUERY_BUDGET)
+    # Тот же потолок, что у python -m benchmarks.bench_crud, а не точное число: generate_code
+    # может повторить попытку на занятом коде, заказ - добавить UPDATE при повышении уровня
+    assert bench_crud.over_budget(results) == []
+
+
+def test_over_budget_flags_doubled_queries():
+    doubled = {"get_user_by_telegram": {"statements": 2.0, "round_trips": 4.0}}
+    assert bench_crud.over_budget(doubled) == [
+        "get_user_by_telegram: запросов 2.0 (бюджет 1), round trip'ов 4.0 (бюджет 3)"
+    ]
+    assert bench_crud.over_budget({"use_code": {"statements": 3.0, "round_trips": 6.0}}) == []
@@ -0,0 +1,25 @@
+import uuid
+
+import pytest
+from httpx import AsyncClient
+from api.deps import AsyncSessionLocal
+from api.main import app
+from common import crud
+
+
+@pytest.mark.asyncio
+async def test_dashboard_returns_everything_in_one_response():
+    async with AsyncSessionLocal() as session:
+        user = await crud.create_user(session, telegram_id=f"dash-{uuid.uuid4().hex[:12]}")
+        feedback = await crud.create_feedback(session, user.id, 8, "Вкусно")
+        levels = await crud.get_loyalty_distribution(session)
+        totals = await crud.get_analytics_summary(session)
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        r = await ac.get("/analytics/dashboard", params={"limit": 5})
+    assert r.status_code == 200
+    data = r.json()
+    assert data["summary"]["total_orders"] == totals["orders"]
+    assert data["loyalty_levels"] == levels and set(levels) == {"Стандарт", "Серебро", "Золото", "Платина"}
+    assert data["recent_feedbacks"][0]["id"] == feedback.id
+    assert len(data["recent_orders"]) <= 5
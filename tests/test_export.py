@@ -0,0 +1,55 @@
+import csv
+import io
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import AsyncClient
+from api.deps import AsyncSessionLocal
+from api.main import app
+from common import crud
+
+
+@pytest.mark.asyncio
+async def test_export_orders_csv_and_gifts_jsonl_by_date():
+    started = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as session:
+        user = await crud.create_user(session, telegram_id=f"exp-{uuid.uuid4().hex[:12]}", first_name="Анна")
+        barista = await crud.create_barista(session, telegram_id=f"exp-b-{uuid.uuid4().hex[:12]}")
+        code = await crud.generate_code(session, user.id)
+        rows = [
+            {"user_id": user.id, "barista_id": barista.id, "code_id": code.id, "receipt_number": f"EXP-{i}",
+             "total_sum": 100 + i, "drinks_count": 1, "sandwiches_count": 0}
+            for i in range(3)
+        ]
+        await crud.create_orders_batch(session, rows)
+        gift = await crud.create_gift(session, user.id, "drink", 1)
+
+    window = {"start": (started - timedelta(seconds=1)).isoformat(),
+              "end": (datetime.now(timezone.utc) + timedelta(seconds=1)).isoformat()}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        r = await ac.get("/export/orders", params=window)
+        assert r.status_code == 200 and r.headers["content-type"].startswith("text/csv")
+        table = list(csv.DictReader(io.StringIO(r.text)))
+        mine = [row for row in table if row["user_id"] == str(user.id)]
+        assert [row["receipt_number"] for row in mine] == ["EXP-0", "EXP-1", "EXP-2"]
+        assert mine[0]["total_sum"] == "100"
+
+        r = await ac.get("/export/gifts", params={"format": "jsonl", **window})
+        assert r.headers["content-type"].startswith("application/x-ndjson")
+        gifts = [json.loads(line) for line in r.text.splitlines()]
+        assert {"id": gift.id, "user_id": user.id, "type": "drink"}.items() <= next(
+            g for g in gifts if g["id"] == gift.id).items()
+
+        # Диапазон в прошлом - только заголовок
+        r = await ac.get("/export/orders", params={"end": "2000-01-01T00:00:00"})
+        assert r.text.strip().count("\n") == 0
+
+        r = await ac.get("/export/users", params={"format": "jsonl"})
+        exported = next(json.loads(line) for line in r.text.splitlines() if f'"id": {user.id},' in line)
+        assert exported["first_name"] == "Анна" and exported["loyalty_status"] == "Стандарт"
+
+        assert (await ac.get("/export/users", params={"start": window["start"]})).status_code == 400
+        assert (await ac.get("/export/codes")).status_code == 404
+        assert (await ac.get("/export/orders", params={"format": "xml"})).status_code == 422
@@ -0,0 +1,71 @@
+import pytest
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+
+from common.fsm_storage import KVStorage
+from common.kv import MemoryKV
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingKV(MemoryKV):
+    """MemoryKV, считающий обращения (пайплайн - одно обращение)"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.round_trips = 0
+
+    async def hget(self, name, key):
+        self.round_trips += 1
+        return await super().hget(name, key)
+
+    def pipeline(self, transaction=True):
+        self.round_trips += 1
+        return super().pipeline(transaction)
+
+
+class Order(StatesGroup):
+    code = State()
+
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+
+
+@pytest.mark.asyncio
+async def test_state_and_data_read_in_one_round_trip():
+    kv = CountingKV()
+    storage = KVStorage(kv)
+    await storage.set_state(KEY, Order.code)
+    await storage.set_data(KEY, {"code": "12345", "имя": "Иван"})
+
+    # Второй воркер с тем же KV видит сессию, начатую первым
+    worker = KVStorage(kv)
+    kv.round_trips = 0
+    assert await worker.get_state(KEY) == Order.code.state
+    assert await worker.get_data(KEY) == {"code": "12345", "имя": "Иван"}
+    assert kv.round_trips == 1
+
+
+@pytest.mark.asyncio
+async def test_clear_and_abandoned_sessions_expire():
+    clock = FakeClock()
+    kv = MemoryKV(clock=clock)
+    storage = KVStorage(kv, ttl=60)
+    await storage.set_state(KEY, Order.code)
+    await storage.update_data(KEY, {"code": "12345"})
+    assert await storage.get_data(KEY) == {"code": "12345"}
+
+    await storage.set_state(KEY, None)
+    await storage.set_data(KEY, {})
+    assert await kv.exists(storage._key(KEY)) == 0
+
+    await storage.set_state(KEY, Order.code)
+    clock.now += 61
+    assert await storage.get_state(KEY) is None
+    assert await storage.get_data(KEY) == {}
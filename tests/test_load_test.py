@@ -0,0 +1,46 @@
+import httpx
+import pytest
+from api.deps import AsyncSessionLocal
+from api.main import app
+from api.routes import users
+from benchmarks import load_test
+
+
+@pytest.mark.asyncio
+async def test_rush_smoke(monkeypatch):
+    # Весь трафик идет с одного адреса - лимиты slowapi выключены, как в load_test.start_api
+    monkeypatch.setattr(users.limiter, "enabled", False)
+    customers, barista_ids = await load_test.seed(AsyncSessionLocal, 4, 2)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        result = await load_test.run(client, customers, barista_ids, duration=1.0, think=0.1, admin_interval=0.5)
+
+    routes = result["routes"]
+    assert set(routes) == {"GET /users/{telegram_id}", "POST /codes/generate", "POST /codes/use",
+                           "POST /orders/", "GET /analytics/dashboard"}
+    assert result["total"]["errors"] == 0
+    # Каждый выданный код погашен и проведен заказом
+    assert routes["POST /codes/generate"]["requests"] == routes["POST /codes/use"]["requests"] \
+        == routes["POST /orders/"]["requests"] > 0
+    assert all(row["p50"] <= row["p95"] <= row["p99"] for row in routes.values())
+
+    assert load_test.regressions(result, result, max_regression=0.5, max_errors=0.01) == []
+    slower = {"routes": {"POST /orders/": {**routes["POST /orders/"], "p95": routes["POST /orders/"]["p95"] * 2}},
+              "total": {"requests": 10, "errors": 1}}
+    problems = load_test.regressions(slower, result, max_regression=0.5, max_errors=0.01)
+    assert len(problems) == 2 and problems[1].startswith("POST /orders/")
+    # По нескольким запросам p95 не сравнивается - остается только доля ошибок
+    few = routes["POST /orders/"]["requests"] + 1
+    assert load_test.regressions(slower, result, max_regression=0.5, max_errors=0.01, min_requests=few) \
+        == problems[:1]
+
+
+def test_combine_takes_medians_across_runs():
+    def report(p95, requests):
+        row = {"requests": requests, "errors": 0, "rps": requests / 10, "p50": p95 / 2, "p95": p95, "p99": p95 * 2}
+        return {"routes": {"POST /orders/": row}, "total": {"requests": requests, "errors": 0, "rps": requests / 10}}
+
+    combined = load_test.combine([report(100, 40), report(300, 50), report(120, 60)])
+    row = combined["routes"]["POST /orders/"]
+    # Выброс одного прогона не двигает медиану
+    assert row["p95"] == 120 and row["p95_runs"] == [100, 300, 120]
+    assert row["requests"] == combined["total"]["requests"] == 150 and combined["runs"] == 3
@@ -0,0 +1,50 @@
+import uuid
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.deps import AsyncSessionLocal, engine
+from common import crud, utils
+from common.models import LoyaltyLevelEnum, User
+
+
+@pytest.mark.asyncio
+async def test_recompute_applies_new_thresholds(monkeypatch):
+    async with AsyncSessionLocal() as session:
+        users = [
+            await crud.create_user(session, telegram_id=f"lvl-{uuid.uuid4().hex[:12]}", drinks_count=drinks,
+                                   loyalty_status=LoyaltyLevelEnum(utils.get_loyalty_level(drinks)))
+            for drinks in (0, 15, 25, 60)
+        ]
+        monkeypatch.setattr(utils, "LOYALTY_LEVELS", [("Стандарт", 0), ("Серебро", 10), ("Золото", 30), ("Платина", 60)])
+
+        moves = await crud.recompute_loyalty_levels(session, chunk_size=7)
+        assert moves[(LoyaltyLevelEnum.standard, LoyaltyLevelEnum.silver)] >= 1
+        assert moves[(LoyaltyLevelEnum.gold, LoyaltyLevelEnum.platinum)] >= 1
+
+        levels = dict((await session.execute(
+            select(User.drinks_count, User.loyalty_status).where(User.id.in_([u.id for u in users]))
+        )).all())
+        assert levels == {
+            0: LoyaltyLevelEnum.standard,
+            15: LoyaltyLevelEnum.silver,
+            25: LoyaltyLevelEnum.silver,
+            60: LoyaltyLevelEnum.platinum,
+        }
+        # Повторный пересчет по тем же порогам ничего не переписывает
+        assert await crud.recompute_loyalty_levels(session, chunk_size=0) == {}
+
+
+@pytest.mark.asyncio
+async def test_recompute_on_empty_table():
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        try:
+            # Пустая таблица только внутри транзакции, которую откатываем
+            await conn.execute(text("TRUNCATE users CASCADE"))
+            session = AsyncSession(bind=conn, join_transaction_mode="create_savepoint")
+            assert await crud.recompute_loyalty_levels(session, chunk_size=0) == {}
+            assert await crud.recompute_loyalty_levels(session, chunk_size=100) == {}
+        finally:
+            await trans.rollback()
@@ -0,0 +1,163 @@
+import uuid
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message, Update
+from aiohttp.test_utils import TestClient, TestServer
+from httpx import AsyncClient
+from api.deps import AsyncSessionLocal, engine
+from api.main import app
+from api.metrics import IN_FLIGHT, LATENCY, REQUESTS, MetricsMiddleware
+from benchmarks.utils import StatementCounter
+from common import crud
+from common.api_client import API_CALLS, ApiClient
+from common.bot_runner import HANDLER_CALLS, HANDLER_LATENCY, WebhookReceiver, create_webhook_app, install_metrics
+from common.metrics import Counter, Gauge, Histogram, Registry
+from common.profile_cache import ProfileCache
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    requests = registry.register(Counter("requests_total", "Запросы", ("route",)))
+    latency = registry.register(Histogram("latency_seconds", "Задержка", ("route",), buckets=(0.1, 1)))
+    registry.register(Gauge("pool_size", "Пул", function=lambda: 5))
+    registry.register(Gauge("cache_hit_ratio", "Кэш выключен", function=lambda: None))
+    registry.register(Counter("cache_hits_total", "Попадания", function=lambda: 7))
+    requests.inc('/a"b')
+    requests.inc('/a"b', amount=2)
+    for value in (0.05, 0.1, 3):
+        latency.observe(value, "/a")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{route="/a\\"b"} 3' in lines
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{route="/a"} 3' in lines
+    assert "pool_size 5" in lines
+    assert "# TYPE cache_hits_total counter" in lines and "cache_hits_total 7" in lines
+    assert not any("cache_hit_ratio" in line for line in lines)
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_counts_by_route_template():
+    async with AsyncSessionLocal() as session:
+        user = await crud.create_user(session, telegram_id=f"met-{uuid.uuid4().hex[:12]}")
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        for _ in range(2):
+            assert (await ac.get(f"/users/{user.telegram_id}")).status_code == 200
+        assert (await ac.get("/users/met-missing")).status_code == 404
+        assert (await ac.get(f"/no/such/{user.id}")).status_code == 404
+        r = await ac.get("/metrics")
+
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    values = {}
+    for line in r.text.splitlines():
+        if not line.startswith("#"):
+            key, value = line.rsplit(" ", 1)
+            values[key] = float(value)
+    assert values['http_requests_total{method="GET",route="/users/{telegram_id}",status="200"}'] >= 2
+    assert values['http_requests_total{method="GET",route="/users/{telegram_id}",status="404"}'] >= 1
+    assert values['http_requests_total{method="GET",route="<unmatched>",status="404"}'] >= 1
+    assert not any(user.telegram_id in key for key in values)
+    assert values['http_request_duration_seconds_count{method="GET",route="/users/{telegram_id}"}'] >= 3
+    # Сам запрос /metrics еще в работе
+    assert values["http_requests_in_flight"] == 1
+    assert values["db_pool_checked_out"] >= 0 and values["db_pool_size"] > 0
+
+
+@pytest.mark.asyncio
+async def test_bot_handler_and_api_call_metrics():
+    def handler(request):
+        return httpx.Response(200 if request.url.path == "/users/123" else 404, json={"id": 1})
+
+    api = ApiClient("http://api", transport=httpx.MockTransport(handler))
+    router = Router()
+
+    @router.message()
+    async def show_profile_metrics(msg: Message):
+        await api.get_user(123)
+        await api.get_user(456)
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    install_metrics(dp)
+    bot = Bot(token="42:TEST")
+    calls_before = HANDLER_CALLS.value("show_profile_metrics", "ok")
+    api_before = API_CALLS.value("GET", "/users/{id}", "200"), API_CALLS.value("GET", "/users/{id}", "404")
+    update = {"update_id": 1, "message": {"message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"},
+                                          "text": "Профиль"}}
+    await dp.feed_update(bot, Update.model_validate(update, context={"bot": bot}))
+
+    assert HANDLER_CALLS.value("show_profile_metrics", "ok") == calls_before + 1
+    assert HANDLER_LATENCY.count("show_profile_metrics") >= 1
+    assert API_CALLS.value("GET", "/users/{id}", "200") == api_before[0] + 1
+    assert API_CALLS.value("GET", "/users/{id}", "404") == api_before[1] + 1
+
+    client = TestClient(TestServer(create_webhook_app(WebhookReceiver(dp, bot), "/webhook")))
+    await client.start_server()
+    try:
+        text = await (await client.get("/metrics")).text()
+        assert 'bot_handler_calls_total{handler="show_profile_metrics",status="ok"}' in text
+        assert 'api_client_requests_total{method="GET",path="/users/{id}",status="404"}' in text
+    finally:
+        await client.close()
+        await bot.session.close()
+        await api.close()
+
+
+@pytest.mark.asyncio
+async def test_middleware_records_each_request_without_db_work():
+    async def bare(scope, receive, send):
+        await send({"type": "http.response.start", "status": 204, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def broken(scope, receive, send):
+        raise RuntimeError("упало до ответа")
+
+    async def noop_send(message):
+        pass
+
+    route = f"/det-{uuid.uuid4().hex[:8]}"
+    scope = {"type": "http", "method": "GET", "route": SimpleNamespace(path=route)}
+    in_flight = IN_FLIGHT.value()
+    counter = StatementCounter(engine)
+    try:
+        for _ in range(5):
+            await MetricsMiddleware(bare)(dict(scope), None, noop_send)
+        with pytest.raises(RuntimeError):
+            await MetricsMiddleware(broken)(dict(scope), None, noop_send)
+        statements_for_requests = counter.round_trips
+        # Отдача /metrics тоже не ходит в БД: пул и кэш читаются из памяти процесса
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            assert (await ac.get("/metrics")).status_code == 200
+    finally:
+        counter.close()
+
+    assert statements_for_requests == 0 and counter.round_trips == 0
+    assert REQUESTS.value("GET", route, "204") == 5
+    assert REQUESTS.value("GET", route, "500") == 1
+    assert LATENCY.count("GET", route) == 6
+    assert IN_FLIGHT.value() == in_flight
+
+
+@pytest.mark.asyncio
+async def test_profile_cache_totals_are_counters(monkeypatch):
+    cache = ProfileCache()
+    monkeypatch.setattr(crud, "profile_cache", cache)
+    await cache.put({"id": 1, "telegram_id": "tg-1"})
+    await cache.get(user_id=1)
+    await cache.get(user_id=1)
+    await cache.get(user_id=2)
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        lines = (await ac.get("/metrics")).text.splitlines()
+
+    assert "# TYPE profile_cache_hits_total counter" in lines
+    assert "profile_cache_hits_total 2" in lines
+    assert "profile_cache_kv_hits_total 0" in lines
+    assert "profile_cache_misses_total 1" in lines
+    assert "# TYPE profile_cache_hit_ratio gauge" in lines
+    assert not any(line.startswith(("profile_cache_hits ", "profile_cache_misses ")) for line in lines)
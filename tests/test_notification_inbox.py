@@ -0,0 +1,44 @@
+import uuid
+
+import pytest
+from httpx import AsyncClient
+from api.deps import AsyncSessionLocal
+from api.main import app
+from common import crud
+
+
+@pytest.mark.asyncio
+async def test_inbox_unread_counts_without_copying_broadcasts():
+    async with AsyncSessionLocal() as session:
+        await crud.create_notification(session, "Рассылка до регистрации")
+        user = await crud.create_user(session, telegram_id=f"inbox-{uuid.uuid4().hex[:12]}")
+        other = await crud.create_user(session, telegram_id=f"inbox-{uuid.uuid4().hex[:12]}")
+        assert await crud.get_unread_count(session, user.id) == 0
+
+        direct = await crud.create_notification(session, "Ваш подарок ждет", user_id=user.id)
+        await crud.create_notification(session, "Чужое уведомление", user_id=other.id)
+        broadcast = await crud.create_notification(session, "Новое меню")
+        assert await crud.get_unread_count(session, user.id) == 2
+        assert await crud.get_unread_count(session, other.id) == 2
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        r = await ac.get(f"/notifications/user/{user.id}", params={"limit": 3})
+        assert r.status_code == 200
+        inbox = r.json()
+        assert inbox["unread"] == 2
+        items = [(i["id"], i["is_broadcast"], i["is_read"]) for i in inbox["items"]]
+        assert items[:2] == [(broadcast.id, True, False), (direct.id, False, False)]
+        assert items[2][1:] == (True, True)
+
+        r = await ac.post(f"/notifications/user/{user.id}/read")
+        assert r.json() == {"unread": 2}
+        r = await ac.get(f"/notifications/user/{user.id}/unread")
+        assert r.json() == {"unread": 0}
+        r = await ac.get(f"/notifications/user/{user.id}", params={"limit": 2})
+        assert all(i["is_read"] for i in r.json()["items"])
+
+    async with AsyncSessionLocal() as session:
+        await crud.create_notification(session, "Еще одно", user_id=user.id)
+        assert await crud.get_unread_count(session, user.id) == 1
+        # Рассылка, прочитанная одним пользователем, остается непрочитанной у другого
+        assert await crud.get_unread_count(session, other.id) == 2
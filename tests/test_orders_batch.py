@@ -0,0 +1,135 @@
+import asyncio
+import uuid
+
+import pytest
+from httpx import AsyncClient
+from api.main import app
+from api.deps import AsyncSessionLocal
+from common import crud
+from common.models import LoyaltyLevelEnum
+
+@pytest.mark.asyncio
+async def test_orders_batch_reports_per_item_results():
+    async with AsyncSessionLocal() as session:
+        user = await crud.create_user(session, telegram_id=f"batch-{uuid.uuid4().hex[:12]}")
+        barista = await crud.create_barista(session, telegram_id=f"batch-b-{uuid.uuid4().hex[:12]}")
+        code = await crud.generate_code(session, user.id)
+        user_id, barista_id, code_id = user.id, barista.id, code.id
+
+    def order(receipt, **kwargs):
+        data = {
+            "user_id": user_id, "barista_id": barista_id, "code_id": code_id, "receipt_number": receipt,
+            "total_sum": 300, "drinks_count": 2, "sandwiches_count": 1,
+        }
+        data.update(kwargs)
+        return data
+
+    batch = [order(f"POS-{i}") for i in range(200)]
+    batch.append(order("POS-unknown-user", user_id=10**9))
+    batch.append({"user_id": user_id, "receipt_number": "POS-broken"})
+    batch.append(order("POS-redeem", use_points=True, used_points_amount=50))
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        r = await ac.post("/orders/batch", json=batch)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["created"] == 201
+    assert body["failed"] == 2
+    results = body["results"]
+    assert [item["index"] for item in results] == list(range(len(batch)))
+    assert not results[200]["ok"] and results[200]["error"]
+    assert not results[201]["ok"] and results[201]["error"]
+    assert results[202]["ok"] and results[202]["order_id"]
+
+    async with AsyncSessionLocal() as session:
+        user = await crud.get_user_by_id(session, user_id)
+    assert user.drinks_count == 201 * 2
+    assert user.sandwiches_count == 201
+    assert user.points == 200 * 3 - 50
+    assert user.loyalty_status.value == "Платина"
+
+
+@pytest.mark.asyncio
+async def test_orders_batch_applies_points_in_input_order():
+    async with AsyncSessionLocal() as session:
+        user = await crud.create_user(session, telegram_id=f"batch-{uuid.uuid4().hex[:12]}")
+        barista = await crud.create_barista(session, telegram_id=f"batch-b-{uuid.uuid4().hex[:12]}")
+        code = await crud.generate_code(session, user.id)
+        await crud.update_user(session, user.id, points=10)
+        user_id, barista_id, code_id = user.id, barista.id, code.id
+
+    def order(receipt, **kwargs):
+        return {"user_id": user_id, "barista_id": barista_id, "code_id": code_id, "receipt_number": receipt,
+                "total_sum": 500, "drinks_count": 1, "sandwiches_count": 0, **kwargs}
+
+    # Списание больше баланса обнуляет его, а начисление после - уже с нуля: 10 -> 0 -> 5.
+    # Сумма дельт дала бы greatest(0, 10 - 100 + 5) = 0
+    batch = [order("POS-redeem", use_points=True, used_points_amount=100), order("POS-earn"), 7]
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        r = await ac.post("/orders/batch", json=batch)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["created"] == 2
+    assert not body["results"][2]["ok"] and "dictionary" in body["results"][2]["error"]
+
+    async with AsyncSessionLocal() as session:
+        user = await crud.get_user_by_id(session, user_id)
+    assert user.points == 5
+    assert user.drinks_count == 2
+
+    # Тот же пакет в обратном порядке - как два заказа подряд: 0 + 5, затем списание до нуля
+    async with AsyncSessionLocal() as session:
+        await crud.update_user(session, user_id, points=10)
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        r = await ac.post("/orders/batch", json=[order("POS-earn-2"),
+                                                 order("POS-redeem-2", use_points=True, used_points_amount=100)])
+    assert r.json()["created"] == 2
+    async with AsyncSessionLocal() as session:
+        user = await crud.get_user_by_id(session, user_id)
+    assert user.points == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrent_batches_with_overlapping_users_do_not_deadlock():
+    async with AsyncSessionLocal() as session:
+        users = [(await crud.create_user(session, telegram_id=f"batch-{uuid.uuid4().hex[:12]}")).id for _ in range(20)]
+        barista = await crud.create_barista(session, telegram_id=f"batch-b-{uuid.uuid4().hex[:12]}")
+        barista_id = barista.id
+
+    def batch(user_ids):
+        return [{"user_id": user_id, "barista_id": barista_id, "code_id": None, "receipt_number": f"POS-{user_id}",
+                 "total_sum": 100, "drinks_count": 1, "sandwiches_count": 0} for user_id in user_ids]
+
+    async def ingest(user_ids):
+        async with AsyncSessionLocal() as session:
+            return await crud.create_orders_batch(session, batch(user_ids))
+
+    async def single(user_id):
+        async with AsyncSessionLocal() as session:
+            return await crud.process_order(session, **batch([user_id])[0])
+
+    # Пакеты с одними и теми же пользователями во встречном порядке и одиночные заказы вперемешку
+    rounds = 8
+    await asyncio.gather(*[ingest(users if i % 2 else users[::-1]) for i in range(rounds)],
+                         *[single(user_id) for user_id in users])
+
+    async with AsyncSessionLocal() as session:
+        for user_id in users:
+            user = await crud.get_user_by_id(session, user_id)
+            assert user.drinks_count == rounds + 1 and user.points == rounds + 1
+
+
+@pytest.mark.asyncio
+async def test_orders_batch_does_not_lower_stored_level():
+    async with AsyncSessionLocal() as session:
+        user = await crud.create_user(session, telegram_id=f"batch-{uuid.uuid4().hex[:12]}", drinks_count=10,
+                                      loyalty_status=LoyaltyLevelEnum.gold)
+        barista = await crud.create_barista(session, telegram_id=f"batch-b-{uuid.uuid4().hex[:12]}")
+        await crud.create_orders_batch(session, [{
+            "user_id": user.id, "barista_id": barista.id, "code_id": None, "receipt_number": "POS-gold",
+            "total_sum": 100, "drinks_count": 1, "sandwiches_count": 0,
+        }])
+    async with AsyncSessionLocal() as session:
+        user = await crud.get_user_by_id(session, user.id)
+    assert user.drinks_count == 11 and user.loyalty_status == LoyaltyLevelEnum.gold
+
@@ -0,0 +1,59 @@
+import uuid
+
+import pytest
+from httpx import AsyncClient
+from api.deps import AsyncSessionLocal
+from api.main import app
+from common import crud
+
+
+@pytest.mark.asyncio
+async def test_cursor_pages_have_no_gaps_or_duplicates_under_inserts():
+    async with AsyncSessionLocal() as session:
+        user = await crud.create_user(session, telegram_id=f"page-{uuid.uuid4().hex[:12]}")
+        barista = await crud.create_barista(session, telegram_id=f"page-b-{uuid.uuid4().hex[:12]}")
+        code = await crud.generate_code(session, user.id)
+        rows = [
+            {"user_id": user.id, "barista_id": barista.id, "code_id": code.id, "receipt_number": f"PG-{i}",
+             "total_sum": 100, "drinks_count": 1, "sandwiches_count": 0}
+            for i in range(25)
+        ]
+        # Одна транзакция - одинаковый date_created: порядок внутри держится на id
+        created = [order for order, _ in await crud.create_orders_batch(session, rows)]
+
+    seen = []
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        cursor = None
+        while True:
+            r = await ac.get(f"/orders/user/{user.id}", params={"limit": 10, **({"cursor": cursor} if cursor else {})})
+            assert r.status_code == 200
+            page = r.json()
+            seen += [item["id"] for item in page["items"]]
+            if len(seen) == 10:
+                # Новый заказ между страницами попадает в начало списка и не сдвигает следующие страницы
+                async with AsyncSessionLocal() as session:
+                    await crud.create_orders_batch(session, [dict(rows[0], receipt_number="PG-new")])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        assert seen == sorted((o.id for o in created), reverse=True)
+
+        r = await ac.get("/orders/", params={"limit": 5})
+        assert len(r.json()["items"]) == 5 and r.json()["next_cursor"]
+        r = await ac.get("/users/", params={"cursor": "не-курсор"})
+        assert r.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_non_positive_limit_is_rejected_not_500():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        for path in ("/users/", "/orders/", "/gifts/", "/feedback/", "/feedback/ideas", "/orders/user/1"):
+            for limit in (0, -5):
+                r = await ac.get(path, params={"limit": limit})
+                assert r.status_code == 422, (path, limit)
+
+    # Вызовы мимо роутов (бенчмарки, экспорт) тоже не доходят до LIMIT -n / IndexError
+    async with AsyncSessionLocal() as session:
+        assert await crud.get_users(session, 0) == ([], None)
+        assert await crud.get_all_orders(session, -5) == ([], None)
@@ -0,0 +1,134 @@
+import uuid
+
+import pytest
+from httpx import AsyncClient
+from api.deps import AsyncSessionLocal
+from api.main import app
+from common import crud
+from common.kv import MemoryKV
+from common.profile_cache import ProfileCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def profile(user_id):
+    return {"id": user_id, "telegram_id": f"tg-{user_id}", "points": user_id}
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_and_ttl():
+    clock = Clock()
+    cache = ProfileCache(max_size=2, ttl=10, clock=clock)
+    for user_id in (1, 2):
+        await cache.put(profile(user_id))
+    assert (await cache.get(telegram_id="tg-1"))["id"] == 1  # 1 стал самым свежим
+    await cache.put(profile(3))
+    assert await cache.get(user_id=2) is None
+    assert await cache.get(telegram_id="tg-2") is None
+    assert (await cache.get(user_id=1))["points"] == 1
+
+    clock.now = 11
+    assert await cache.get(user_id=1) is None
+    assert cache.stats() == {"size": 1, "hits": 2, "kv_hits": 0, "misses": 3, "hit_ratio": 0.4}
+
+
+@pytest.mark.asyncio
+async def test_profile_read_after_reset_does_not_overwrite_newer_value():
+    cache = ProfileCache()
+    snapshot = await cache.snapshot()
+    await cache.invalidate(1)  # запись закоммичена, пока профиль читался из БД
+    await cache.put(profile(1), snapshot)
+    assert await cache.get(user_id=1) is None
+
+
+@pytest.mark.asyncio
+async def test_invalidation_from_another_process_via_kv():
+    kv = MemoryKV()
+    reader, writer = ProfileCache(kv=kv), ProfileCache(kv=kv)
+
+    # Профиль в локальном уровне читателя: сброс в другом процессе действует сразу, а не через TTL
+    await reader.put(profile(1))
+    assert (await reader.get(user_id=1))["points"] == 1
+    await writer.invalidate(1)
+    assert await reader.get(user_id=1) is None
+    assert await writer.get(telegram_id="tg-1") is None
+
+    # Читатель прочитал БД до записи в другом процессе и кладет старый профиль уже после сброса:
+    # ни в общий уровень, ни в свой локальный он не попадает
+    snapshot = await reader.snapshot()
+    await writer.invalidate(1)
+    await reader.put(profile(1), snapshot)
+    assert await reader.get(user_id=1) is None
+    assert await writer.get(user_id=1) is None
+
+    # Свежее чтение после сброса кэшируется как обычно
+    await reader.put(profile(1), await reader.snapshot())
+    assert (await writer.get(user_id=1))["points"] == 1
+    await writer.clear()
+    assert await reader.get(telegram_id="tg-1") is None
+
+
+@pytest.mark.asyncio
+async def test_local_layer_ttl_is_short_with_kv():
+    clock = Clock()
+    kv = MemoryKV(clock=clock)
+    cache = ProfileCache(ttl=30, local_ttl=5, kv=kv, clock=clock)
+    await cache.put(profile(1))
+    clock.now = 6
+    assert (await cache.get(user_id=1))["points"] == 1
+    assert (cache.hits, cache.kv_hits) == (0, 1)
+
+
+@pytest.mark.asyncio
+async def test_user_endpoint_is_cached_and_writes_invalidate(monkeypatch):
+    kv = MemoryKV()
+    cache = ProfileCache(kv=kv)
+    monkeypatch.setattr(crud, "profile_cache", cache)
+    telegram_id = f"prof-{uuid.uuid4().hex[:12]}"
+    async with AsyncSessionLocal() as session:
+        user = await crud.create_user(session, telegram_id=telegram_id)
+        barista = await crud.create_barista(session, telegram_id=f"prof-b-{uuid.uuid4().hex[:12]}")
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        async def fetch():
+            r = await ac.get(f"/users/{telegram_id}")
+            assert r.status_code == 200
+            return r.json()
+
+        assert (await fetch())["drinks_count"] == 0
+        assert (await fetch())["drinks_count"] == 0
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        # Запись в другом процессе API с тем же KV: этот процесс сразу видит новый профиль
+        async with AsyncSessionLocal() as session:
+            monkeypatch.setattr(crud, "profile_cache", ProfileCache(kv=kv))
+            await crud.update_user(session, user.id, first_name="Другой процесс")
+            monkeypatch.setattr(crud, "profile_cache", cache)
+        assert (await fetch())["first_name"] == "Другой процесс"
+
+        async with AsyncSessionLocal() as session:
+            await crud.process_order(session, user.id, barista.id, None, "PC-1", 300, 2, 0)
+        assert (await fetch())["drinks_count"] == 2
+
+        async with AsyncSessionLocal() as session:
+            await crud.issue_gift(session, user.id, "drink", 1, barista.id)
+        assert (await fetch())["gift_drinks"] == 1
+
+        async with AsyncSessionLocal() as session:
+            await crud.update_user(session, user.id, phone="+70000000000")
+        assert (await fetch())["phone"] == "+70000000000"
+
+        # Другой процесс API с тем же общим уровнем берет профиль из KV, не из БД
+        other = ProfileCache(kv=kv)
+        monkeypatch.setattr(crud, "profile_cache", other)
+        assert (await fetch())["phone"] == "+70000000000"
+        assert other.kv_hits == 1 and other.misses == 0
+
+        r = await ac.get("/users/cache/stats")
+        assert r.json()["kv_hits"] == 1
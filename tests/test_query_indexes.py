@@ -0,0 +1,93 @@
+import json
+import uuid
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event, func, insert, literal, literal_column, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.deps import engine
+from common import crud
+from common.models import Feedback, Gift, Notification, Order, User
+
+USERS = 500
+ROWS = 20000
+
+
+async def _seed(session: AsyncSession):
+    """Данные в объеме, на котором планировщик уже выбирает между seq scan и индексом"""
+    prefix = f"idx-{uuid.uuid4().hex[:12]}"
+    await session.execute(insert(User), [
+        {"telegram_id": f"{prefix}-{i}", "birth_date": date(1990, 1, 1) + timedelta(days=i * 37)} for i in range(USERS)
+    ])
+    ids = (await session.scalars(select(User.id).where(User.telegram_id.like(f"{prefix}-%")))).all()
+    first = min(ids)
+    n = func.generate_series(1, ROWS).column_valued("n")
+    user_id = literal(first) + n % USERS
+    created = func.now() - func.make_interval(0, 0, 0, 0, 0, n)
+    await session.execute(insert(Order).from_select(
+        ["user_id", "receipt_number", "total_sum", "drinks_count", "sandwiches_count", "date_created"],
+        select(user_id, literal("IDX"), literal(100), literal(1), literal(0), created),
+    ))
+    await session.execute(insert(Gift).from_select(
+        ["user_id", "type", "amount", "is_written_off", "date_created"],
+        select(user_id, literal_column("(array['drink', 'sandwich', 'birthday_drink'])[n % 3 + 1]"),
+               literal(1), n % 4 != 0, created),
+    ))
+    await session.execute(insert(Notification).from_select(
+        ["user_id", "text", "is_read", "date_sent"],
+        select(user_id, literal("idx"), literal(True), created),
+    ))
+    await session.execute(insert(Feedback).from_select(
+        ["user_id", "score", "created_at"], select(user_id, literal(5), created),
+    ))
+    for table in ("users", "orders", "gifts", "notifications", "feedbacks"):
+        await session.execute(text(f"ANALYZE {table}"))
+    return first
+
+
+# (запрос crud, индекс, который должен быть в плане)
+QUERIES = [
+    (lambda s, uid: crud.get_orders_by_user(s, uid), "ix_orders_user_id_date_created_id"),
+    (lambda s, uid: crud.get_all_orders(s), "ix_orders_date_created_id"),
+    (lambda s, uid: crud.get_gifts_by_user(s, uid, active_only=True), "ix_gifts_user_id_active"),
+    (lambda s, uid: crud.get_gifts_by_user(s, uid, active_only=False), "ix_gifts_user_id_date_created"),
+    (lambda s, uid: crud.give_birthday_gifts(s), "ix_users_birth_month_day"),
+    (lambda s, uid: crud.give_birthday_gifts(s), "ix_gifts_birthday"),
+    (lambda s, uid: crud.get_notifications_for_user(s, uid), "ix_notifications_user_id_date_sent"),
+    (lambda s, uid: crud.get_feedbacks(s), "ix_feedbacks_created_at_id"),
+]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("query, index", QUERIES, ids=[index for _, index in QUERIES])
+async def test_crud_query_uses_index(query, index):
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        try:
+            # Сессия внутри внешней транзакции: commit в crud - это savepoint, в конце все откатываем
+            session = AsyncSession(bind=conn, join_transaction_mode="create_savepoint")
+            user_id = await _seed(session)
+
+            statements = []
+
+            def capture(_conn, _cursor, statement, parameters, _context, _executemany):
+                statements.append((statement, parameters))
+
+            event.listen(conn.sync_connection, "before_cursor_execute", capture)
+            try:
+                await query(session, user_id)
+            finally:
+                event.remove(conn.sync_connection, "before_cursor_execute", capture)
+
+            # Проверяем, что индекс подходит запросу, а не выбор по оценкам стоимости: на общей
+            # тестовой БД статистика зависит от строк других тестов, и seq scan иногда дешевле
+            await conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            plans = []
+            for statement, parameters in statements:
+                if statement.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "WITH")):
+                    plan = await conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters)
+                    plans.append(json.dumps(plan.scalar()))
+            assert any(f'"Index Name": "{index}"' in plan for plan in plans), plans
+        finally:
+            await trans.rollback()
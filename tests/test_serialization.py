@@ -0,0 +1,75 @@
+import json
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from httpx import AsyncClient
+from api.deps import AsyncSessionLocal
+from api.main import app
+from api.serialization import adapter, list_response, page_response
+from common import crud
+from common.models import Order
+from common.schemas import OrderOut, Page
+
+
+def test_json_response_matches_model_path():
+    orders = [
+        Order(id=i, user_id=1, barista_id=None if i % 2 else 2, code_id=None, receipt_number=f"R-{i}",
+              total_sum=100 * i, drinks_count=i, sandwiches_count=0, use_points=False, used_points_amount=0,
+              date_created=datetime(2026, 1, 1, 12, i, tzinfo=timezone.utc))
+        for i in range(5)
+    ]
+    expected = Page[OrderOut](items=[OrderOut.model_validate(o) for o in orders], next_cursor="abc").model_dump(mode="json")
+    response = page_response(OrderOut, orders, "abc")
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == expected
+    assert json.loads(list_response(OrderOut, orders).body) == expected["items"]
+    # Адаптер строится один раз на тип
+    assert adapter(Page[OrderOut]) is adapter(Page[OrderOut])
+
+
+@pytest.mark.asyncio
+async def test_rows_with_unloaded_columns_fall_back_to_attributes():
+    async with AsyncSessionLocal() as session:
+        user = await crud.create_user(session, telegram_id=f"ser-{uuid.uuid4().hex[:12]}")
+        order = Order(user_id=user.id, receipt_number="SER-F", total_sum=300, drinks_count=1, sandwiches_count=0)
+        session.add(order)
+        await session.flush()
+        # Строку изменили и сбросили в той же сессии, часть столбцов истекла
+        order.total_sum = 350
+        await session.flush()
+        session.expire(order, ["date_created", "total_sum"])
+        assert "date_created" not in order.__dict__ and "total_sum" not in order.__dict__
+
+        # Ленивая загрузка в async-сессии возможна только внутри run_sync
+        body = await session.run_sync(lambda _: list_response(OrderOut, [order]).body)
+        item, = json.loads(body)
+        assert item["total_sum"] == 350 and item["receipt_number"] == "SER-F"
+        assert item == OrderOut.model_validate(order).model_dump(mode="json")
+        await session.rollback()
+
+
+@pytest.mark.asyncio
+async def test_list_endpoints_use_fast_path():
+    async with AsyncSessionLocal() as session:
+        user = await crud.create_user(session, telegram_id=f"ser-{uuid.uuid4().hex[:12]}", first_name="Анна")
+        barista = await crud.create_barista(session, telegram_id=f"ser-b-{uuid.uuid4().hex[:12]}")
+        code = await crud.generate_code(session, user.id)
+        await crud.create_orders_batch(session, [
+            {"user_id": user.id, "barista_id": barista.id, "code_id": code.id, "receipt_number": f"SER-{i}",
+             "total_sum": 100 + i, "drinks_count": 1, "sandwiches_count": 0}
+            for i in range(3)
+        ])
+        await crud.create_gift(session, user.id, "drink", 1)
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        r = await ac.get(f"/orders/user/{user.id}", params={"limit": 2})
+        assert r.status_code == 200 and r.headers["content-type"] == "application/json"
+        page = r.json()
+        assert [o["receipt_number"] for o in page["items"]] == ["SER-2", "SER-1"]
+        assert page["next_cursor"]
+        r = await ac.get(f"/orders/user/{user.id}", params={"limit": 2, "cursor": page["next_cursor"]})
+        assert [o["receipt_number"] for o in r.json()["items"]] == ["SER-0"] and r.json()["next_cursor"] is None
+
+        gifts = (await ac.get(f"/gifts/user/{user.id}")).json()
+        assert [(g["type"], g["user_id"]) for g in gifts] == [("drink", user.id)]
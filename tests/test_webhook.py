@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+from aiohttp.test_utils import TestClient, TestServer
+
+from common.bot_runner import SECRET_HEADER, WebhookReceiver, create_webhook_app
+
+
+def make_update(update_id):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": update_id, "type": "private"},
+            "text": "Профиль",
+        },
+    }
+
+
+@pytest.mark.asyncio
+async def test_webhook_acks_immediately_and_processes_in_pool():
+    router = Router()
+    release = asyncio.Event()
+    handled = []
+
+    @router.message()
+    async def handler(msg: Message):
+        await release.wait()
+        handled.append(msg.message_id)
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot(token="42:TEST")
+    receiver = WebhookReceiver(dp, bot, workers=2, queue_size=3, secret_token="s3cret")
+    client = TestClient(TestServer(create_webhook_app(receiver, "/webhook")))
+    await client.start_server()
+    try:
+        headers = {SECRET_HEADER: "s3cret"}
+        assert (await client.post("/webhook", json=make_update(1))).status == 401
+        # Хендлеры заблокированы, но Telegram получает ответ сразу
+        statuses = [(await client.post("/webhook", json=make_update(i), headers=headers)).status
+                    for i in range(1, 7)]
+        # 2 апдейта у воркеров, 3 в очереди, остальное - 503 (Telegram повторит)
+        assert statuses == [200] * 5 + [503]
+        assert (await client.post("/webhook", data="not json", headers=headers)).status == 400
+
+        release.set()
+        await asyncio.wait_for(receiver.queue.join(), timeout=5)
+        assert sorted(handled) == [1, 2, 3, 4, 5]
+    finally:
+        await client.close()
+        await bot.session.close()